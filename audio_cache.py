@@ -0,0 +1,135 @@
+import asyncio
+import hashlib
+from typing import Dict, Optional
+
+from telegram import Bot, Message
+from telegram.error import BadRequest, RetryAfter, TelegramError
+
+import metrics
+from logger import logger
+from broadcast import PerChatLimiter
+from snapshot import DataSnapshot
+from storage import Storage, StorageError, storage
+from config import AUDIO_CACHE_CHAT_ID, BROADCAST_PER_CHAT_INTERVAL
+
+def practice_audio_url(practice: dict) -> Optional[str]:
+    audio = practice.get("audio")
+    return audio.get("url") if audio else None
+
+class AudioCache:
+    """Telegram file_ids of practice audio, so Telegram downloads each file only once.
+
+    The first successful send by URL stores the returned file_id; later sends
+    reuse it. Keys combine the practice id with a hash of the URL, so replacing
+    a practice's audio misses the cache instead of sending the old file.
+    """
+
+    def __init__(self, storage: Storage, prewarm_chat_id: Optional[int] = None):
+        self.storage = storage
+        self.prewarm_chat_id = prewarm_chat_id
+        self._file_ids: Optional[Dict[str, str]] = None
+        self._load_lock = asyncio.Lock()
+        self._limiter = PerChatLimiter(BROADCAST_PER_CHAT_INTERVAL)
+        self._prewarm_snapshot: Optional[DataSnapshot] = None
+        self._prewarm_task: Optional[asyncio.Task] = None
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0, "prewarmed": 0}
+
+    @staticmethod
+    def cache_key(practice_id: int, url: str) -> str:
+        return f"{practice_id}:{hashlib.sha256(url.encode()).hexdigest()[:16]}"
+
+    async def _load(self) -> Dict[str, str]:
+        if self._file_ids is None:
+            async with self._load_lock:
+                if self._file_ids is None:
+                    self._file_ids = await self.storage.get_file_ids()
+                    logger.info("Loaded %s cached audio file_ids", len(self._file_ids))
+        return self._file_ids
+
+    async def _remember(self, key: str, message: Message) -> None:
+        attachment = message.audio or message.voice or message.document
+        if attachment is None:
+            return
+        self._file_ids[key] = attachment.file_id
+        try:
+            await self.storage.set_file_id(key, attachment.file_id)
+        except StorageError as e:
+            logger.error(f"Could not store audio file_id for {key}: {str(e)}")
+
+    async def send(self, bot: Bot, chat_id: int, practice_id: int, url: str) -> Message:
+        """Send a practice's audio, by cached file_id when available"""
+        key = self.cache_key(practice_id, url)
+        file_ids = await self._load()
+        file_id = file_ids.get(key)
+        if file_id:
+            try:
+                message = await bot.send_audio(chat_id=chat_id, audio=file_id)
+                self.stats["hits"] += 1
+                return message
+            except BadRequest as e:
+                # file_ids are only valid for the bot that uploaded the file; fall back to the URL
+                logger.warning("Cached file_id for practice %s was rejected: %s", practice_id, e)
+                self.stats["invalidations"] += 1
+                file_ids.pop(key, None)
+                try:
+                    await self.storage.delete_file_id(key)
+                except StorageError:
+                    pass
+        self.stats["misses"] += 1
+        message = await bot.send_audio(chat_id=chat_id, audio=url)
+        await self._remember(key, message)
+        return message
+
+    async def prewarm(self, bot: Bot, snapshot: DataSnapshot) -> None:
+        """Upload the audio of every practice not cached yet to the pre-warm chat"""
+        file_ids = await self._load()
+        for practice in snapshot.practices:
+            url = practice_audio_url(practice)
+            if not url or self.cache_key(practice.get("id"), url) in file_ids:
+                continue
+            while True:
+                await self._limiter.wait(self.prewarm_chat_id)
+                try:
+                    message = await bot.send_audio(chat_id=self.prewarm_chat_id, audio=url, disable_notification=True)
+                except RetryAfter as e:
+                    retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, "total_seconds") else e.retry_after
+                    await asyncio.sleep(retry_after)
+                    continue
+                except TelegramError as e:
+                    logger.warning("Could not pre-warm audio of practice %s: %s", practice.get('id'), e)
+                    break
+                await self._remember(self.cache_key(practice.get("id"), url), message)
+                self.stats["prewarmed"] += 1
+                try:
+                    await bot.delete_message(chat_id=self.prewarm_chat_id, message_id=message.message_id)
+                except TelegramError:
+                    pass
+                break
+
+    async def _prewarm_loop(self, bot: Bot) -> None:
+        # Snapshots arriving during a run are handled by one more run over the latest
+        while self._prewarm_snapshot is not None:
+            snapshot, self._prewarm_snapshot = self._prewarm_snapshot, None
+            try:
+                await self.prewarm(bot, snapshot)
+            except Exception as e:
+                logger.error(f"Audio pre-warm failed: {str(e)}", exc_info=True)
+
+    async def on_snapshot(self, bot: Bot, snapshot: DataSnapshot) -> None:
+        """Snapshot listener: pre-warm audio of newly added practices in the background"""
+        if self.prewarm_chat_id is None:
+            return
+        self._prewarm_snapshot = snapshot
+        if self._prewarm_task is None or self._prewarm_task.done():
+            self._prewarm_task = asyncio.create_task(self._prewarm_loop(bot))
+
+    def get_stats(self) -> dict:
+        stats = dict(self.stats)
+        sends = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / sends if sends else 0.0
+        stats["entries"] = len(self._file_ids or ())
+        return stats
+
+audio_cache = AudioCache(storage, int(AUDIO_CACHE_CHAT_ID) if AUDIO_CACHE_CHAT_ID else None)
+metrics.registry.gauge("bot_audio_cache_hit_ratio", "Share of practice audio sends that reused a file_id",
+                       function=lambda: audio_cache.get_stats()["hit_ratio"])
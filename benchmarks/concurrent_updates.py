@@ -0,0 +1,119 @@
+"""Benchmark: update throughput against the number of active chats.
+
+The real Application from bot.py is started (update fetcher and update
+processor included) against the fake Bot API with a per-send latency, and
+every active chat's journey updates (start -> practices -> category ->
+inline practice button -> back -> main menu) are queued at once,
+interleaved across chats, as a burst of polling results would be.
+
+For each UPDATE_CONCURRENCY in --concurrency (1 processes one update at a
+time, as before ChatOrderedUpdateProcessor) and each number of chats in
+--chats it reports updates/s, queue-to-done latency and two checks of the
+per-chat ordering guarantee: updates of a chat that started before an
+earlier one of the same chat finished, and replies that only appear when a
+chat's updates are handled out of order (fallbacks, "select an option").
+
+Usage: python benchmarks/concurrent_updates.py [--chats 1,10,50,100] [--concurrency 1,32] [--journeys 1] [--latency 0.05]
+"""
+import argparse
+import asyncio
+import logging
+import statistics
+import tempfile
+import time
+from collections import defaultdict
+
+from telegram import Update
+from telegram.ext import Application, TypeHandler
+
+from fake_npoint import make_document
+from fake_telegram import FakeBotAPI, Faults
+from fixtures import TOKEN, Recorder, journey, percentile, started_application, write_env
+
+async def run_burst(application: Application, recorder: Recorder, updates_by_chat):
+    """Queue every chat's updates round-robin and wait until all are processed"""
+    order = []
+    for step in range(max(len(raws) for raws in updates_by_chat.values())):
+        for raws in updates_by_chat.values():
+            if step < len(raws):
+                order.append(raws[step])
+    started = time.perf_counter()
+    for raw in order:
+        recorder.queued[raw["update_id"]] = time.perf_counter()
+        await application.update_queue.put(Update.de_json(raw, application.bot))
+    await application.update_queue.join()
+    return time.perf_counter() - started
+
+def overlaps(recorder: Recorder, updates_by_chat) -> int:
+    """Updates that started before the previous update of their chat finished"""
+    count = 0
+    for raws in updates_by_chat.values():
+        ids = [raw["update_id"] for raw in raws]
+        for previous, current in zip(ids, ids[1:]):
+            if recorder.started[current] < recorder.finished[previous]:
+                count += 1
+    return count
+
+async def run(args):
+    document = make_document(args.practices, args.categories)
+    write_env(tempfile.mkdtemp(), document)
+
+    import bot
+    from language import textjson
+    # logger.py configures the root logger at INFO on import
+    logging.getLogger().setLevel(args.log_level)
+    # Simulated users send their journeys far faster than a person, so flood control would drop them
+    from flood import flood_control
+    flood_control.rate = 0
+
+    out_of_order_texts = {textjson.common.select_option, textjson.common.fallback, textjson.common.unknown_state,
+                          textjson.common.error_generic}
+    fake = FakeBotAPI(TOKEN, faults=Faults(latency=args.latency, jitter=args.jitter))
+    await fake.start()
+    print(f"journeys of 6 updates x {args.journeys} per chat, Bot API latency {args.latency * 1000:.0f} ms "
+          f"+ up to {args.jitter * 1000:.0f} ms")
+    print(f"{'concurrency':>11}{'chats':>7}{'updates':>9}{'upd/s':>9}{'p50 ms':>9}{'p95 ms':>9}"
+          f"{'max ms':>9}{'overlaps':>10}{'bad replies':>13}")
+    next_chat, next_update = 1000, 1
+    try:
+        for concurrency in args.concurrency:
+            bot.UPDATE_CONCURRENCY = concurrency
+            async with started_application(bot, fake.base_url) as application:
+                recorder = Recorder()
+                application.add_handler(TypeHandler(Update, recorder.on_start), group=-10)
+                application.add_handler(TypeHandler(Update, recorder.on_finish), group=10)
+                for chats in args.chats:
+                    updates_by_chat = defaultdict(list)
+                    for chat_id in range(next_chat, next_chat + chats):
+                        for _ in range(args.journeys):
+                            raws = journey(textjson, document, chat_id, next_update)
+                            next_update += len(raws)
+                            updates_by_chat[chat_id].extend(raws)
+                    next_chat += chats
+                    fake.sent.clear()
+                    elapsed = await run_burst(application, recorder, updates_by_chat)
+                    latencies = [recorder.finished[raw["update_id"]] - recorder.queued[raw["update_id"]]
+                                 for raws in updates_by_chat.values() for raw in raws]
+                    bad = sum(1 for _, params in fake.sent if params.get("text") in out_of_order_texts)
+                    print(f"{concurrency:>11}{chats:>7}{len(latencies):>9}{len(latencies) / elapsed:>9.0f}"
+                          f"{statistics.median(latencies) * 1000:>9.0f}{percentile(latencies, 95) * 1000:>9.0f}"
+                          f"{max(latencies) * 1000:>9.0f}{overlaps(recorder, updates_by_chat):>10}{bad:>13}")
+    finally:
+        await fake.stop()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chats", type=lambda s: [int(n) for n in s.split(",")], default=[1, 10, 50, 100],
+                        help="comma-separated numbers of active chats")
+    parser.add_argument("--concurrency", type=lambda s: [int(n) for n in s.split(",")], default=[1, 32],
+                        help="comma-separated UPDATE_CONCURRENCY values")
+    parser.add_argument("--journeys", type=int, default=1, help="journeys per chat")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per Bot API send")
+    parser.add_argument("--jitter", type=float, default=0.02, help="extra random latency per send, up to seconds")
+    parser.add_argument("--practices", type=int, default=200)
+    parser.add_argument("--categories", type=int, default=10)
+    parser.add_argument("--log-level", default="WARNING", help="handlers log every update at INFO")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Benchmark: full-text search index builds and query latency.
+
+Builds ContentSearchIndex from a snapshot of --practices practices with
+generated Russian and Kazakh content (plus universities and events), then
+syncs copies of it with new snapshots as a content refresh would produce
+them: the same content, --changed practices edited, some added and some
+removed. Each sync is compared with building a fresh index from the same
+snapshot. Query latency is measured over single words and phrases of the
+vocabulary. Last, the longest event loop stall while the bot's first build
+runs (text_search.sync) is compared with building in the event loop.
+
+Usage: python benchmarks/content_search.py [--practices 10000] [--changed 100] [--queries 1000]
+"""
+import argparse
+import asyncio
+import copy
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from snapshot import DataSnapshot
+import text_search
+from text_search import ContentSearchIndex, snapshot_documents
+
+WORDS = ("дыхание дыхания дыханием тревога тревогу тревоги сон сна сном стресс стресса тело тела внимание "
+         "медитация медитации экзамен экзамены экзаменами студент студенты студентов расслабление отдых "
+         "балалар балаларға студенттер студенттерге денсаулық тыныс алу жаттығу ұйқы мазасыздық").split()
+
+def make_text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+def make_document(rng: random.Random, practices: int, universities: int) -> dict:
+    return {"bot_info": {
+        "practices": [{"id": i, "name": f"Практика {i}", "category": f"Категория {i % 20}",
+                       "content": make_text(rng, 120)} for i in range(practices)],
+        "universities": [{"id": i, "name": f"Проект {i}", "description": make_text(rng, 60)}
+                         for i in range(universities)],
+        "events": [{"id": i, "universityId": i % universities, "title": f"Событие {i}",
+                    "description": make_text(rng, 40)} for i in range(universities * 5)],
+    }}
+
+def edited(rng: random.Random, document: dict, changed: int, version: int) -> dict:
+    """A copy of `document` with `changed` practices rewritten, one in ten of them removed and as many added"""
+    document = copy.deepcopy(document)
+    practices = document["bot_info"]["practices"]
+    for practice in rng.sample(practices, changed):
+        practice["content"] = make_text(rng, 120)
+    del practices[:changed // 10]
+    next_id = max(p["id"] for p in practices) + 1
+    practices.extend({"id": next_id + i, "name": f"Новая практика {version}.{i}", "category": "Новое",
+                      "content": make_text(rng, 120)} for i in range(changed // 10))
+    return document
+
+def timed(func):
+    started = time.perf_counter()
+    result = func()
+    return time.perf_counter() - started, result
+
+async def longest_stall(build) -> float:
+    """Longest gap between ticks of a 1 ms timer while `build` runs"""
+    done = asyncio.Event()
+    longest = 0.0
+
+    async def ticker():
+        nonlocal longest
+        last = time.perf_counter()
+        while not done.is_set():
+            await asyncio.sleep(0.001)
+            now = time.perf_counter()
+            longest = max(longest, now - last)
+            last = now
+
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(0.01)
+    await build()
+    done.set()
+    await task
+    return longest
+
+async def stalls(snapshot: DataSnapshot) -> None:
+    async def in_loop():
+        ContentSearchIndex().update(snapshot_documents(snapshot))
+    async def in_thread():
+        await text_search.sync(snapshot)
+    for label, build in (("built in the event loop", in_loop), ("text_search.sync", in_thread)):
+        print(f"first build, {label}: longest event loop stall {await longest_stall(build) * 1000:.0f} ms")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--practices", type=int, default=10_000)
+    parser.add_argument("--universities", type=int, default=100)
+    parser.add_argument("--changed", type=int, default=100, help="practices edited per refresh")
+    parser.add_argument("--queries", type=int, default=1000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    document = make_document(rng, args.practices, args.universities)
+    snapshot = DataSnapshot(document, version=1)
+    index = ContentSearchIndex()
+    seconds, stats = timed(lambda: index.update(snapshot_documents(snapshot)))
+    print(f"{len(index)} documents; first build {seconds * 1000:.0f} ms {stats}")
+
+    print(f"{'refresh':<28}{'sync ms':>10}{'rebuild ms':>12}  changes")
+    refreshes = [("same content", document)]
+    for version in range(2, 5):
+        document = edited(rng, document, args.changed, version)
+        refreshes.append((f"{args.changed} practices edited", document))
+    for version, (label, refreshed) in enumerate(refreshes, start=2):
+        snapshot = DataSnapshot(copy.deepcopy(refreshed), version=version)
+        sync, (index, stats) = timed(lambda: index.synced(snapshot_documents(snapshot)))
+        rebuild, _ = timed(lambda: ContentSearchIndex().update(snapshot_documents(snapshot)))
+        print(f"{label:<28}{sync * 1000:>10.0f}{rebuild * 1000:>12.0f}  {stats}")
+
+    queries = [" ".join(rng.sample(WORDS, rng.randint(1, 3))) for _ in range(args.queries)]
+    latencies = [timed(lambda: index.search(query, 8))[0] for query in queries]
+    latencies.sort()
+    print(f"search, {len(queries)} queries of 1-3 words: p50 {statistics.median(latencies) * 1000:.2f} ms, "
+          f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:.2f} ms, max {latencies[-1] * 1000:.2f} ms")
+    asyncio.run(stalls(snapshot))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""End-to-end handler benchmark: the real Application from bot.py against a fake Bot API.
+
+Each simulated user replays the journey start -> practices -> category ->
+inline practice button -> back -> main menu through Application.process_update,
+so updates go through the persistence preload, the ConversationHandler, the
+state routers and the handlers, and every reply is a real HTTP call to the
+in-process fake Bot API. Content comes from a generated local file, so no
+network access is needed.
+
+Reported per handler: latency percentiles over all users, then overall
+updates/sec and replies that were error messages. A second, single-user
+pass under tracemalloc reports per-handler allocations (peak bytes above the
+pre-update level, and bytes still held afterwards); it covers the whole
+process, including the fake API serving the reply.
+
+Usage: python benchmarks/conversation_journeys.py [--users 50] [--journeys 5] [--categories 20] [--practices 500]
+"""
+import argparse
+import asyncio
+import logging
+import statistics
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+
+from telegram import Update
+from telegram.ext import Application
+
+from fake_npoint import make_document
+from fake_telegram import FakeBotAPI
+from fixtures import TOKEN, journey, percentile, started_application, write_env
+
+# Steps of one journey, named after the handler that serves them
+STEPS = ("start", "handle_practices", "practices_menu_handler", "button_handler", "go_back", "return_to_main_menu")
+
+class Journeys:
+    def __init__(self, application: Application, document: dict):
+        from language import textjson
+        self.application = application
+        self.textjson = textjson
+        self.document = document
+        self.update_id = 0
+
+    def updates(self, chat_id: int):
+        """Raw updates of one journey, paired with the handler name"""
+        raws = journey(self.textjson, self.document, chat_id, self.update_id + 1)
+        self.update_id += len(raws)
+        return list(zip(STEPS, raws))
+
+    async def process(self, raw: dict) -> None:
+        await self.application.process_update(Update.de_json(raw, self.application.bot))
+
+async def run_user(journeys: Journeys, chat_id: int, count: int, latencies) -> None:
+    for _ in range(count):
+        for step, raw in journeys.updates(chat_id):
+            started = time.perf_counter()
+            await journeys.process(raw)
+            latencies[step].append(time.perf_counter() - started)
+
+async def measure_allocations(journeys: Journeys, chat_id: int, count: int):
+    peaks, retained = defaultdict(list), defaultdict(list)
+    tracemalloc.start()
+    try:
+        for _ in range(count):
+            for step, raw in journeys.updates(chat_id):
+                before = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                await journeys.process(raw)
+                current, peak = tracemalloc.get_traced_memory()
+                peaks[step].append(peak - before)
+                retained[step].append(current - before)
+    finally:
+        tracemalloc.stop()
+    return peaks, retained
+
+async def run(args):
+    document = make_document(args.practices, args.categories)
+    write_env(tempfile.mkdtemp(), document)
+
+    import bot
+    # logger.py configures the root logger at INFO on import
+    logging.getLogger().setLevel(args.log_level)
+    # Simulated users send their journeys far faster than a person, so flood control would drop them
+    from flood import flood_control
+    flood_control.rate = 0
+
+    fake = FakeBotAPI(TOKEN)
+    await fake.start()
+    try:
+        # Job queue and update fetching stay off; only the warm-up of run_polling is needed
+        async with started_application(bot, fake.base_url, start=False) as application:
+            journeys = Journeys(application, document)
+            # One untimed journey so imports and first-use caches do not count
+            await run_user(journeys, 1, 1, defaultdict(list))
+            fake.sent.clear()
+
+            latencies = defaultdict(list)
+            started = time.perf_counter()
+            await asyncio.gather(*(run_user(journeys, chat_id, args.journeys, latencies)
+                                   for chat_id in range(2, args.users + 2)))
+            elapsed = time.perf_counter() - started
+
+            peaks, retained = await measure_allocations(journeys, args.users + 2, args.alloc_journeys)
+    finally:
+        await fake.stop()
+
+    error_text = journeys.textjson.common.error_generic
+    errors = sum(1 for _, params in fake.sent if params.get("text") == error_text)
+    updates = sum(len(values) for values in latencies.values())
+
+    print(f"{args.users} users x {args.journeys} journeys, {args.categories} categories, {args.practices} practices")
+    print(f"{'handler':<24}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}{'peak KiB':>11}{'kept KiB':>11}")
+    for step in STEPS:
+        values = latencies[step]
+        print(f"{step:<24}{statistics.median(values) * 1000:9.2f}{percentile(values, 95) * 1000:9.2f}"
+              f"{percentile(values, 99) * 1000:9.2f}{max(values) * 1000:9.2f}"
+              f"{statistics.mean(peaks[step]) / 1024:11.1f}{statistics.mean(retained[step]) / 1024:11.1f}")
+    print(f"{updates} updates in {elapsed:.2f} s: {updates / elapsed:.0f} updates/s, "
+          f"{len(fake.sent)} replies, {errors} error replies")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=50, help="concurrent simulated users")
+    parser.add_argument("--journeys", type=int, default=5, help="journeys per user")
+    parser.add_argument("--categories", type=int, default=20)
+    parser.add_argument("--practices", type=int, default=500)
+    parser.add_argument("--alloc-journeys", type=int, default=10, help="journeys in the tracemalloc pass")
+    parser.add_argument("--log-level", default="WARNING", help="handlers log every update at INFO")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
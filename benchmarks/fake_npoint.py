@@ -0,0 +1,129 @@
+"""Stand-in for the npoint document endpoint, for benchmarks and load tests.
+
+GET returns the document with an ETag and answers If-None-Match with 304 like
+npoint; POST replaces it. Latency and a 5xx error rate are configurable, and
+requests are counted in `stats`. Run standalone and set NPOINT_URL to the
+printed URL:
+
+    python benchmarks/fake_npoint.py --port 8082 --practices 200 --latency 0.3
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import sys
+from collections import Counter
+from typing import Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from http_server import HTTPServer, Request, Response
+
+def make_document(practices: int = 50, categories: int = 5, users: int = 0) -> dict:
+    """Document with generated practices; `users` fills the legacy users array"""
+    return {
+        "users": list(range(1, users + 1)),
+        "admin_ids": [1],
+        "bot_info": {
+            "start_text": "Привет!",
+            "practices": [
+                {"id": i, "name": f"Practice {i}", "category": f"Category {i % categories}",
+                 "description": "Short description", "content": "Practice text. " * 40, "author": "Author"}
+                for i in range(1, practices + 1)
+            ],
+            "universities": [], "psychologists": [], "contacts": [], "events": [], "partners": [],
+        },
+    }
+
+class FakeNpoint:
+    def __init__(self, document: dict, host: str = "127.0.0.1", port: int = 0, path: str = "/bench",
+                 latency: float = 0.0, error_rate: float = 0.0, seed: int = 1):
+        self.http = HTTPServer(host, port)
+        self.path = path
+        self.latency = latency
+        self.error_rate = error_rate
+        self.stats: Counter = Counter()
+        self._random = random.Random(seed)
+        self.set_document(document)
+        self.http.route("GET", path, self.get)
+        self.http.route("POST", path, self.post)
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.http.host}:{self.http.port}{self.path}"
+
+    async def start(self) -> None:
+        await self.http.start()
+
+    async def stop(self) -> None:
+        await self.http.stop()
+
+    def set_document(self, document: dict) -> None:
+        self.document = document
+        self._body = json.dumps(document, ensure_ascii=False).encode("utf-8")
+        self._etag = '"' + hashlib.sha256(self._body).hexdigest()[:16] + '"'
+
+    def add_practice(self, category: Optional[str] = None) -> dict:
+        """Publish a new practice, as an editor would; returns it"""
+        practices = self.document["bot_info"]["practices"]
+        practice_id = max((p["id"] for p in practices), default=0) + 1
+        practice = {"id": practice_id, "name": f"Practice {practice_id}",
+                    "category": category or (practices[0]["category"] if practices else "Category 0"),
+                    "description": "New practice", "content": "Practice text. " * 40, "author": "Author"}
+        practices.append(practice)
+        self.set_document(self.document)
+        return practice
+
+    async def _delay_or_fail(self) -> Optional[Response]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.stats["errors"] += 1
+            return Response(503, b"Service Unavailable")
+        return None
+
+    async def get(self, request: Request) -> Response:
+        self.stats["get"] += 1
+        failure = await self._delay_or_fail()
+        if failure is not None:
+            return failure
+        if request.headers.get("if-none-match") == self._etag:
+            self.stats["not_modified"] += 1
+            return Response(304, b"", headers={"ETag": self._etag})
+        return Response(200, self._body, "application/json", {"ETag": self._etag})
+
+    async def post(self, request: Request) -> Response:
+        self.stats["post"] += 1
+        failure = await self._delay_or_fail()
+        if failure is not None:
+            return failure
+        self.set_document(json.loads(request.body))
+        return Response(200, self._body, "application/json", {"ETag": self._etag})
+
+async def serve(args: argparse.Namespace) -> None:
+    fake = FakeNpoint(make_document(args.practices, args.categories, args.users), args.host, args.port,
+                      latency=args.latency, error_rate=args.error_rate)
+    await fake.start()
+    print(f"Fake npoint on {fake.url}", flush=True)
+    while True:
+        await asyncio.sleep(10)
+        print(f"requests: {dict(fake.stats)}", flush=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Standalone fake npoint document")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8082)
+    parser.add_argument("--practices", type=int, default=50)
+    parser.add_argument("--categories", type=int, default=5)
+    parser.add_argument("--users", type=int, default=0, help="chat IDs in the legacy users array")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests failing with 503")
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+"""In-process stand-in for the Telegram Bot API, for benchmarks and load tests.
+
+Point a bot at it with Application.builder().base_url(fake.base_url), or set
+BOT_API_URL in env.json when it runs standalone:
+
+    python benchmarks/fake_telegram.py --port 8081 --latency 0.05 --rate-limit 30
+
+Updates are injected with push_update() and served through getUpdates long
+polling; every successful send is timestamped so callers can measure
+update-to-reply time. `Faults` makes send methods slow, failing, timing out
+or rate limited the way Telegram is under load; outcomes are counted in
+`stats`.
+"""
+import argparse
+import asyncio
+import email.parser
+import email.policy
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter, deque
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+from urllib.parse import parse_qsl
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from http_server import HTTPServer, Request, Response
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot",
+            "can_join_groups": False, "can_read_all_group_messages": False, "supports_inline_queries": False}
+
+def make_message_update(update_id: int, chat_id: int, text: str) -> dict:
+    update = {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private", "first_name": "User"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "User"},
+            "text": text,
+        },
+    }
+    if text.startswith("/"):
+        # Telegram marks commands with an entity, which filters.COMMAND checks
+        update["message"]["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return update
+
+def make_callback_update(update_id: int, chat_id: int, message_id: int, data: str) -> dict:
+    """Inline button press on the bot message `message_id`"""
+    user = {"id": chat_id, "is_bot": False, "first_name": "User"}
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": user,
+            "chat_instance": str(chat_id),
+            "data": data,
+            "message": {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private", "first_name": "User"},
+                "from": BOT_USER,
+                "text": "",
+            },
+        },
+    }
+
+def make_inline_query_update(update_id: int, user_id: int, query: str, offset: str = "") -> dict:
+    """"@bot <query>" typed by `user_id` in some chat"""
+    return {
+        "update_id": update_id,
+        "inline_query": {
+            "id": str(update_id),
+            "from": {"id": user_id, "is_bot": False, "first_name": "User"},
+            "query": query,
+            "offset": offset,
+        },
+    }
+
+# Methods that deliver something to a chat; only these are subject to faults
+SEND_METHODS = ("sendMessage", "sendAudio", "sendDocument", "editMessageText")
+
+@dataclass
+class Faults:
+    latency: float = 0.0  # seconds added to every send
+    jitter: float = 0.0  # extra uniform random latency, up to this many seconds
+    error_rate: float = 0.0  # fraction of sends answered with 502 Bad Gateway
+    timeout_rate: float = 0.0  # fraction of sends answered only after timeout_delay
+    timeout_delay: float = 10.0  # longer than the bot's default 5 s read timeout
+    blocked_rate: float = 0.0  # fraction of chats that blocked the bot (403 Forbidden)
+    rate_limit: float = 0.0  # sends per second over all chats before 429; 0 disables
+    per_chat_interval: float = 0.0  # minimum seconds between sends to one chat before 429; 0 disables
+    retry_after: int = 1  # seconds announced in 429 responses
+
+def error_body(code: int, description: str, retry_after: Optional[int] = None) -> bytes:
+    body = {"ok": False, "error_code": code, "description": description}
+    if retry_after is not None:
+        body["parameters"] = {"retry_after": retry_after}
+    return json.dumps(body).encode()
+
+class FakeBotAPI:
+    def __init__(self, token: str, host: str = "127.0.0.1", port: int = 0, faults: Optional[Faults] = None,
+                 seed: int = 1):
+        self.token = token
+        self.http = HTTPServer(host, port)
+        self.faults = faults or Faults()
+        self.stats: Counter = Counter()
+        self._random = random.Random(seed)
+        self._recent_sends: deque = deque()
+        self._last_send_to_chat: Dict[int, float] = {}
+        self.updates: List[dict] = []
+        self.sent: List[tuple] = []  # (perf_counter, method, params)
+        self.inline_answers: List[tuple] = []  # (perf_counter, params)
+        self.webhook_url: Optional[str] = None
+        self.on_send: Optional[Callable[[float, dict], None]] = None
+        self.polling = asyncio.Event()
+        self.webhook_set = asyncio.Event()
+        self._new_updates = asyncio.Condition()
+        self._message_id = 0
+        methods = {
+            "getMe": self.get_me,
+            "getUpdates": self.get_updates,
+            "deleteWebhook": self.delete_webhook,
+            "setWebhook": self.set_webhook,
+            "sendMessage": self.send_message,
+            "editMessageText": self.send_message,
+            "sendAudio": self.send_message,
+            "sendDocument": self.send_message,
+            "answerCallbackQuery": self.answer,
+            "answerInlineQuery": self.answer_inline_query,
+        }
+        for name, handler in methods.items():
+            self.http.route("POST", f"/bot{token}/{name}", self._wrap(name, handler))
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.http.host}:{self.http.port}/bot"
+
+    async def start(self) -> None:
+        await self.http.start()
+
+    async def stop(self) -> None:
+        async with self._new_updates:
+            self._new_updates.notify_all()
+        await self.http.stop()
+
+    def _wrap(self, name: str, handler):
+        async def route(request: Request) -> Response:
+            params = self._parse(request)
+            if name in SEND_METHODS:
+                self.stats["requests"] += 1
+                failure = await self._inject_faults(params)
+                if failure is not None:
+                    return failure
+            result = await handler(params)
+            body = json.dumps({"ok": True, "result": result}).encode()
+            return Response(200, body, "application/json")
+        return route
+
+    def is_blocked(self, chat_id: int) -> bool:
+        """Whether a chat blocked the bot; fixed per chat so repeated runs agree"""
+        return random.Random(chat_id).random() < self.faults.blocked_rate
+
+    def _throttled(self, chat_id: int) -> bool:
+        faults = self.faults
+        now = time.monotonic()
+        if faults.per_chat_interval and now - self._last_send_to_chat.get(chat_id, -faults.per_chat_interval) < faults.per_chat_interval:
+            return True
+        if faults.rate_limit:
+            while self._recent_sends and now - self._recent_sends[0] >= 1.0:
+                self._recent_sends.popleft()
+            if len(self._recent_sends) >= faults.rate_limit:
+                return True
+            self._recent_sends.append(now)
+        self._last_send_to_chat[chat_id] = now
+        return False
+
+    async def _inject_faults(self, params) -> Optional[Response]:
+        """Return an error response for this send, or None to let it through"""
+        faults = self.faults
+        chat_id = int(params.get("chat_id", 0) or 0)
+        delay = faults.latency + (self._random.uniform(0, faults.jitter) if faults.jitter else 0.0)
+        if faults.timeout_rate and self._random.random() < faults.timeout_rate:
+            self.stats["timeouts"] += 1
+            delay = faults.timeout_delay
+        if delay:
+            await asyncio.sleep(delay)
+        if self._throttled(chat_id):
+            self.stats["throttled"] += 1
+            return Response(429, error_body(429, f"Too Many Requests: retry after {faults.retry_after}",
+                                            faults.retry_after), "application/json")
+        if faults.blocked_rate and self.is_blocked(chat_id):
+            self.stats["blocked"] += 1
+            return Response(403, error_body(403, "Forbidden: bot was blocked by the user"), "application/json")
+        if faults.error_rate and self._random.random() < faults.error_rate:
+            self.stats["errors"] += 1
+            return Response(502, error_body(502, "Bad Gateway"), "application/json")
+        self.stats["ok"] += 1
+        return None
+
+    @staticmethod
+    def _parse(request: Request) -> Dict:
+        if not request.body:
+            return {}
+        content_type = request.headers.get("content-type", "")
+        if content_type.startswith("application/json"):
+            return json.loads(request.body)
+        if content_type.startswith("multipart/form-data"):
+            # File uploads; fields are kept as text and files as bytes
+            message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+                f"Content-Type: {content_type}\r\n\r\n".encode() + request.body)
+            params = {}
+            for part in message.iter_parts():
+                value = part.get_payload(decode=True)
+                params[part.get_param("name", header="content-disposition")] = (
+                    value if part.get_filename() else value.decode())
+            return params
+        params = {}
+        for name, value in parse_qsl(request.body.decode()):
+            try:
+                params[name] = json.loads(value)
+            except ValueError:
+                params[name] = value
+        return params
+
+    async def push_update(self, update: dict) -> None:
+        async with self._new_updates:
+            self.updates.append(update)
+            self._new_updates.notify_all()
+
+    async def get_me(self, params):
+        return BOT_USER
+
+    async def get_updates(self, params):
+        self.polling.set()
+        offset = int(params.get("offset", 0) or 0)
+        timeout = float(params.get("timeout", 0) or 0)
+        async with self._new_updates:
+            self.updates = [u for u in self.updates if u["update_id"] >= offset]
+            if not self.updates and timeout:
+                try:
+                    await asyncio.wait_for(self._new_updates.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+            return list(self.updates[:int(params.get("limit", 100) or 100)])
+
+    async def delete_webhook(self, params):
+        self.webhook_url = None
+        return True
+
+    async def set_webhook(self, params):
+        self.webhook_url = params.get("url")
+        self.webhook_set.set()
+        return True
+
+    async def send_message(self, params):
+        now = time.perf_counter()
+        self.sent.append((now, params))
+        if self.on_send:
+            self.on_send(now, params)
+        self._message_id += 1
+        chat_id = int(params.get("chat_id", 0))
+        return {"message_id": self._message_id, "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"}, "text": str(params.get("text", ""))}
+
+    async def answer(self, params):
+        return True
+
+    async def answer_inline_query(self, params):
+        now = time.perf_counter()
+        self.inline_answers.append((now, params))
+        return True
+
+def add_fault_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every send")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random latency per send, up to seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of sends failing with 502")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="fraction of sends answered after --timeout-delay")
+    parser.add_argument("--timeout-delay", type=float, default=10.0)
+    parser.add_argument("--blocked-rate", type=float, default=0.0, help="fraction of chats that blocked the bot")
+    parser.add_argument("--rate-limit", type=float, default=30.0, help="sends/second before 429, 0 disables")
+    parser.add_argument("--per-chat-interval", type=float, default=1.0, help="seconds between sends to a chat before 429")
+    parser.add_argument("--retry-after", type=int, default=1)
+
+def faults_from_args(args: argparse.Namespace) -> Faults:
+    return Faults(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, timeout_rate=args.timeout_rate,
+                  timeout_delay=args.timeout_delay, blocked_rate=args.blocked_rate, rate_limit=args.rate_limit,
+                  per_chat_interval=args.per_chat_interval, retry_after=args.retry_after)
+
+async def serve(args: argparse.Namespace) -> None:
+    fake = FakeBotAPI(args.token, args.host, args.port, faults_from_args(args))
+    await fake.start()
+    print(f"Fake Bot API on {fake.base_url} (token {args.token})", flush=True)
+    while True:
+        await asyncio.sleep(10)
+        print(f"sends: {dict(fake.stats)}", flush=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Standalone fake Telegram Bot API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--token", default="0:bench", help="must match TOKEN in the bot's env.json")
+    add_fault_arguments(parser)
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
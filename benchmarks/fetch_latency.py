@@ -0,0 +1,103 @@
+"""Handler latency with a slow npoint stand-in: blocking requests.get vs the async data layer.
+
+Needs requests from the dev dependency group (uv sync installs it; the bot itself does not).
+
+Usage: python benchmarks/fetch_latency.py [--delay 0.3] [--handlers 20] [--rounds 5]
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from fixtures import percentile, write_env
+
+DOCUMENT = json.dumps({
+    "users": list(range(1000)),
+    "admin_ids": [1],
+    "bot_info": {"start_text": "Hi", "practices": [{"id": i, "name": f"P{i}", "category": f"C{i % 10}"} for i in range(200)]},
+}).encode()
+
+def start_slow_server(delay: float) -> ThreadingHTTPServer:
+    class SlowHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            time.sleep(delay)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(DOCUMENT)))
+            self.end_headers()
+            self.wfile.write(DOCUMENT)
+
+        def log_message(self, *args):
+            pass
+
+    ThreadingHTTPServer.request_queue_size = 128
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+async def run(fetch, handlers: int, rounds: int):
+    latencies = []
+
+    async def handler(arrived: float):
+        await fetch()
+        latencies.append(time.perf_counter() - arrived)
+
+    for _ in range(rounds):
+        # All updates of a round arrive at once; latency is measured from arrival to reply
+        arrived = time.perf_counter()
+        await asyncio.gather(*(handler(arrived) for _ in range(handlers)))
+    return latencies
+
+def report(name, latencies):
+    print(f"{name:<8} p50={statistics.median(latencies) * 1000:8.1f} ms  "
+          f"p99={percentile(latencies, 99) * 1000:8.1f} ms  max={max(latencies) * 1000:8.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--delay", type=float, default=0.3, help="server response delay in seconds")
+    parser.add_argument("--handlers", type=int, default=20, help="concurrent handlers per round")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    server = start_slow_server(args.delay)
+    url = f"http://127.0.0.1:{server.server_address[1]}/"
+
+    # db.py reads env.json from the working directory at import time
+    write_env(tempfile.mkdtemp(), NPOINT_URL=url)
+    import db
+
+    async def blocking_fetch():
+        # Previous implementation: synchronous requests.get on the event loop
+        response = requests.get(url)
+        response.raise_for_status()
+        return response.json()
+
+    async def main_async():
+        before = await run(blocking_fetch, args.handlers, args.rounds)
+        # Force a backend round-trip on every call to compare the transports directly
+        after = await run(db._refresh, args.handlers, args.rounds)
+        # Regular handler path: warm snapshot cache, refreshes happen in the background
+        db._cache_ttl = 0
+        cached = await run(db.fetch_db, args.handlers, args.rounds)
+        if db._refresh_task is not None:
+            await asyncio.gather(db._refresh_task, return_exceptions=True)
+        await db.close_client()
+        return before, after, cached
+
+    before, after, cached = asyncio.run(main_async())
+    print(f"{args.handlers} concurrent handlers x {args.rounds} rounds, backend delay {args.delay * 1000:.0f} ms")
+    report("before", before)
+    report("after", after)
+    report("cached", cached)
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Fixtures shared by the benchmarks.
+
+bot.py and the modules it imports read env.json and language.json from the
+working directory at import time, so a benchmark calls write_env before it
+imports any of them. started_application runs the Application from bot.py
+against the fake Bot API (see fake_telegram.py), and journey/Recorder are
+the user journey the end-to-end benchmarks replay and the hooks that time it.
+"""
+import json
+import os
+import sys
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from telegram import Update
+from telegram.ext import Application
+
+from fake_telegram import make_callback_update, make_message_update
+
+TOKEN = "0:bench"
+
+def percentile(values, pct):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+def write_env(workdir: str, document: Optional[dict] = None, **settings) -> None:
+    """Make `workdir` the working directory with env.json and language.json for the bot's modules.
+
+    With `document`, content is read from a local file instead of npoint.
+    `settings` override env.json entries, e.g. NPOINT_URL or BOT_API_URL.
+    """
+    env = {
+        "TOKEN": TOKEN,
+        "NPOINT_URL": "http://127.0.0.1:1/",
+        "STORAGE_URL": "sqlite:" + os.path.join(workdir, "bot.sqlite3"),
+        "USERS_JOURNAL": os.path.join(workdir, "users.journal"),
+        "METRICS_PORT": None,
+    }
+    if document is not None:
+        with open(os.path.join(workdir, "content.json"), "w", encoding="utf-8") as f:
+            json.dump(document, f, ensure_ascii=False)
+        env["CONTENT_SOURCE"] = "file:" + os.path.join(workdir, "content.json")
+    env.update(settings)
+    with open(os.path.join(workdir, "env.json"), "w") as f:
+        json.dump(env, f)
+    os.symlink(os.path.join(ROOT, "language.json"), os.path.join(workdir, "language.json"))
+    os.chdir(workdir)
+
+@asynccontextmanager
+async def started_application(bot, base_url: Optional[str] = None, start: bool = True) -> AsyncIterator[Application]:
+    """The Application from `bot`, initialized and warmed up as run_polling would, then shut down.
+
+    `base_url` points it at a fake Bot API; without it BOT_API_URL from
+    env.json applies. With `start`, the update fetcher and processor run too;
+    otherwise updates go through process_update and the job queue stays off.
+    """
+    builder = Application.builder().token(TOKEN).base_url(base_url) if base_url else None
+    application = bot.build_application(builder)
+    await application.initialize()
+    await application.post_init(application)
+    if start:
+        await application.start()
+    try:
+        yield application
+    finally:
+        if start:
+            await application.stop()
+        await application.shutdown()
+        await application.post_shutdown(application)
+
+def journey(textjson, document: dict, chat_id: int, first_update_id: int):
+    """Raw updates of one journey of `chat_id`: start -> practices -> category -> practice -> back -> main menu"""
+    practices = document["bot_info"]["practices"]
+    practice = practices[chat_id % len(practices)]
+    raws = []
+    for text in ("/start", textjson.main_menu.practices, practice["category"] + textjson.practices.category_suffix):
+        raws.append(make_message_update(first_update_id + len(raws), chat_id, text))
+    raws.append(make_callback_update(first_update_id + len(raws), chat_id, first_update_id,
+                                     f"show_practice_{practice['id']}"))
+    for text in (textjson.common.back_button, textjson.common.main_menu_button):
+        raws.append(make_message_update(first_update_id + len(raws), chat_id, text))
+    return raws
+
+class Recorder:
+    """Notes when each update's handlers start and finish, from handler groups around the conversation"""
+
+    def __init__(self):
+        self.queued = {}
+        self.started = {}
+        self.finished = {}
+
+    async def on_start(self, update: Update, context) -> None:
+        self.started[update.update_id] = time.perf_counter()
+
+    async def on_finish(self, update: Update, context) -> None:
+        self.finished[update.update_id] = time.perf_counter()
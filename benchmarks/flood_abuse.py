@@ -0,0 +1,134 @@
+"""Benchmark: latency of regular users while a few chats flood the bot.
+
+The started Application from bot.py (update fetcher, chat-ordered update
+processor, flood control) runs against the fake Bot API. --users regular
+chats go through practice journeys at a human pace (a pause of up to
+--think seconds between updates) while --abusers chats each send
+--spam-rate text messages per second, cycling through a few texts so most
+are not mere duplicates. The run is repeated with flood control off and on.
+
+Reported per run: regular users' queue-to-done latency, regular updates
+that were dropped, Bot API sends to abusers and flood control verdicts.
+
+Usage: python benchmarks/flood_abuse.py [--users 30] [--abusers 3] [--spam-rate 200] [--journeys 2] [--latency 0.05]
+"""
+import argparse
+import asyncio
+import logging
+import random
+import statistics
+import tempfile
+import time
+
+from telegram import Update
+from telegram.ext import Application, TypeHandler
+
+from fake_npoint import make_document
+from fake_telegram import FakeBotAPI, Faults, make_message_update
+from fixtures import TOKEN, Recorder, journey, percentile, started_application, write_env
+
+class UpdateIds:
+    def __init__(self):
+        self.next = 1
+
+    def take(self, count: int = 1) -> int:
+        first = self.next
+        self.next += count
+        return first
+
+async def regular_user(application: Application, recorder: Recorder, textjson, document: dict, chat_id: int,
+                       journeys: int, think: float, ids: UpdateIds, rng: random.Random, sent_ids: list) -> None:
+    for _ in range(journeys):
+        for raw in journey(textjson, document, chat_id, ids.take(6)):
+            await asyncio.sleep(rng.uniform(0, think))
+            recorder.queued[raw["update_id"]] = time.perf_counter()
+            sent_ids.append(raw["update_id"])
+            await application.update_queue.put(Update.de_json(raw, application.bot))
+
+async def abuser(application: Application, chat_id: int, rate: float, ids: UpdateIds, stop: asyncio.Event) -> int:
+    texts = ("/start", "hello", "spam spam", "Практики 🧘", "???")
+    sent = 0
+    started = time.perf_counter()
+    while not stop.is_set():
+        raw = make_message_update(ids.take(), chat_id, texts[sent % len(texts)])
+        await application.update_queue.put(Update.de_json(raw, application.bot))
+        sent += 1
+        # Keep the average rate without one sleep per message
+        delay = started + sent / rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        elif sent % 50 == 0:
+            await asyncio.sleep(0)
+    return sent
+
+async def run(args):
+    document = make_document(args.practices, args.categories)
+    write_env(tempfile.mkdtemp(), document)
+
+    import bot
+    import flood
+    VERDICTS = (flood.ALLOWED, flood.DUPLICATE, flood.THROTTLED, flood.MUTED)
+    from language import textjson
+    # logger.py configures the root logger at INFO on import
+    logging.getLogger().setLevel(args.log_level)
+
+    fake = FakeBotAPI(TOKEN, faults=Faults(latency=args.latency))
+    await fake.start()
+    rng = random.Random(args.seed)
+    ids = UpdateIds()
+    rate = flood.flood_control.rate
+    next_chat = 1000
+    print(f"{args.users} users x {args.journeys} journeys (pause up to {args.think:g} s), "
+          f"{args.abusers} abusers at {args.spam_rate:g} msg/s, Bot API latency {args.latency * 1000:.0f} ms")
+    try:
+        async with started_application(bot, fake.base_url) as application:
+            recorder = Recorder()
+            application.add_handler(TypeHandler(Update, recorder.on_finish), group=10)
+            for enabled in (False, True):
+                flood.flood_control.rate = rate if enabled else 0
+                verdicts_before = {verdict: flood.flood_updates_total.get(verdict=verdict) for verdict in VERDICTS}
+                users = list(range(next_chat, next_chat + args.users))
+                abusers = list(range(next_chat + args.users, next_chat + args.users + args.abusers))
+                next_chat += args.users + args.abusers
+                fake.sent.clear()
+                stop = asyncio.Event()
+                spam = [asyncio.create_task(abuser(application, chat_id, args.spam_rate, ids, stop))
+                        for chat_id in abusers]
+                sent_ids = []
+                started = time.perf_counter()
+                await asyncio.gather(*(regular_user(application, recorder, textjson, document, chat_id, args.journeys,
+                                                    args.think, ids, rng, sent_ids) for chat_id in users))
+                stop.set()
+                spammed = sum(await asyncio.gather(*spam))
+                await application.update_queue.join()
+                elapsed = time.perf_counter() - started
+
+                latencies = [recorder.finished[i] - recorder.queued[i] for i in sent_ids if i in recorder.finished]
+                abuser_set = set(abusers)
+                to_abusers = sum(1 for _, params in fake.sent if int(params.get("chat_id", 0)) in abuser_set)
+                verdicts = {verdict: int(flood.flood_updates_total.get(verdict=verdict) - verdicts_before[verdict])
+                            for verdict in VERDICTS}
+                print(f"flood control {'on' if enabled else 'off'}: {elapsed:.1f} s, {spammed} spam updates")
+                print(f"  regular users: p50={statistics.median(latencies) * 1000:.0f} ms  "
+                      f"p95={percentile(latencies, 95) * 1000:.0f} ms  max={max(latencies) * 1000:.0f} ms  "
+                      f"dropped {len(sent_ids) - len(latencies)} of {len(sent_ids)}")
+                print(f"  Bot API sends to abusers: {to_abusers}  verdicts: {verdicts}")
+    finally:
+        await fake.stop()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=30)
+    parser.add_argument("--abusers", type=int, default=3)
+    parser.add_argument("--spam-rate", type=float, default=200, help="messages/second per abuser")
+    parser.add_argument("--journeys", type=int, default=2, help="journeys per regular user")
+    parser.add_argument("--think", type=float, default=1.0, help="longest pause of a regular user between updates")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per Bot API send")
+    parser.add_argument("--practices", type=int, default=200)
+    parser.add_argument("--categories", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--log-level", default="ERROR", help="flood control logs every mute at WARNING")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
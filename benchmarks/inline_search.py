@@ -0,0 +1,160 @@
+"""Benchmark: inline practice search latency at 10k practices.
+
+Practices get generated names, categories and descriptions over a vocabulary
+of --words words. For a mix of queries as typed in "@bot <query>" (short
+prefixes, whole words, two words, infixes, misses) it reports per query
+kind the latency of a naive scan over every practice, of the per-snapshot
+index (PracticeSearchIndex plus building the result articles) and of a
+repeated query answered from the inline result cache.
+
+The end-to-end section then runs the real Application from bot.py against
+the fake Bot API and measures queue-to-answerInlineQuery time of --e2e
+queries sent one at a time, then of the same queries again.
+
+Usage: python benchmarks/inline_search.py [--practices 10000] [--words 2000] [--queries 2000]
+"""
+import argparse
+import asyncio
+import logging
+import random
+import statistics
+import tempfile
+import time
+
+from fake_telegram import FakeBotAPI, make_inline_query_update
+from fixtures import TOKEN, percentile, started_application, write_env
+
+SYLLABLES = ["ды", "ха", "ни", "е", "сон", "ме", "ди", "та", "ци", "я", "тре", "во", "га", "ра", "слаб", "ле",
+             "йо", "ут", "ро", "ве", "чер", "кон", "цен", "тело", "ё", "breath", "calm", "fo", "cus", "re", "lax"]
+
+def make_vocabulary(rng: random.Random, words: int):
+    vocabulary = set()
+    while len(vocabulary) < words:
+        vocabulary.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(vocabulary)
+
+def make_practices(rng: random.Random, vocabulary, practices: int, categories: int):
+    return [
+        {"id": i, "name": " ".join(rng.sample(vocabulary, 3)).capitalize(),
+         "category": f"{vocabulary[i % categories].capitalize()} {i % categories}",
+         "description": " ".join(rng.sample(vocabulary, 12)).capitalize() + ".",
+         "content": "Practice text. " * 40, "author": "Author"}
+        for i in range(1, practices + 1)
+    ]
+
+def make_queries(rng: random.Random, vocabulary, count: int):
+    """(kind, query) pairs in the proportions people type them"""
+    kinds = [
+        ("prefix 1-2", lambda: rng.choice(vocabulary)[:rng.randint(1, 2)]),
+        ("prefix 3-5", lambda: rng.choice(vocabulary)[:rng.randint(3, 5)]),
+        ("word", lambda: rng.choice(vocabulary)),
+        ("two words", lambda: f"{rng.choice(vocabulary)} {rng.choice(vocabulary)[:4]}"),
+        ("infix", lambda: (lambda w: w[1:4] if len(w) > 4 else w)(rng.choice(vocabulary))),
+        ("miss", lambda: "zzq" + rng.choice(vocabulary)),
+    ]
+    return [(kind, make()) for kind, make in (rng.choice(kinds) for _ in range(count))]
+
+def scan(practices, normalize, query):
+    """What a search without an index does: normalize and test every practice on every query"""
+    words = normalize(query).split()
+    found = []
+    for practice in practices:
+        text = " ".join(normalize(practice.get(field)) for field in ("name", "category", "description"))
+        if all(word in text for word in words):
+            found.append(practice)
+    return found
+
+def report(label, samples):
+    print(f"  {label:<12}{len(samples):>7}{statistics.median(samples) * 1e6:>12.0f}"
+          f"{percentile(samples, 95) * 1e6:>12.0f}{percentile(samples, 99) * 1e6:>12.0f}{max(samples) * 1e6:>12.0f}")
+
+def timed_by_kind(queries, func):
+    by_kind = {}
+    for kind, query in queries:
+        started = time.perf_counter()
+        func(query)
+        by_kind.setdefault(kind, []).append(time.perf_counter() - started)
+    return by_kind
+
+def print_table(title, by_kind):
+    print(title)
+    print(f"  {'query':<12}{'count':>7}{'p50 µs':>12}{'p95 µs':>12}{'p99 µs':>12}{'max µs':>12}")
+    for kind, samples in by_kind.items():
+        report(kind, samples)
+    report("all", [s for samples in by_kind.values() for s in samples])
+
+async def end_to_end(args, bot, queries):
+    fake = FakeBotAPI(TOKEN)
+    await fake.start()
+    from telegram import Update
+    try:
+        async with started_application(bot, fake.base_url) as application:
+            # One query at a time, so each latency is a round trip rather than time spent queued behind others
+            fresh = [query for _, query in queries[:args.e2e]]
+            latencies = {"first": [], "repeat": []}
+            for update_id, (kind, query) in enumerate([("first", q) for q in fresh] + [("repeat", q) for q in fresh],
+                                                      start=1):
+                answered = len(fake.inline_answers)
+                started = time.perf_counter()
+                raw = make_inline_query_update(update_id, 1000 + update_id % 50, query)
+                await application.update_queue.put(Update.de_json(raw, application.bot))
+                while len(fake.inline_answers) == answered:
+                    await asyncio.sleep(0)
+                latencies[kind].append(fake.inline_answers[-1][0] - started)
+            print(f"end to end: update queued to answerInlineQuery received, {len(fresh)} queries, one at a time")
+            for kind, samples in latencies.items():
+                print(f"  {kind:<8} p50 {statistics.median(samples) * 1000:.2f} ms, "
+                      f"p95 {percentile(samples, 95) * 1000:.2f} ms, max {max(samples) * 1000:.2f} ms")
+    finally:
+        await fake.stop()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--practices", type=int, default=10_000)
+    parser.add_argument("--categories", type=int, default=50)
+    parser.add_argument("--words", type=int, default=2000, help="vocabulary size")
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--scan-queries", type=int, default=200, help="queries for the slow naive scan")
+    parser.add_argument("--e2e", type=int, default=300, help="queries end to end; 0 skips")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    vocabulary = make_vocabulary(rng, args.words)
+    document = {"users": [], "admin_ids": [1], "bot_info": {
+        "start_text": "Привет!", "practices": make_practices(rng, vocabulary, args.practices, args.categories),
+        "universities": [], "psychologists": [], "contacts": [], "events": [], "partners": []}}
+    queries = make_queries(rng, vocabulary, args.queries)
+    write_env(tempfile.mkdtemp(), document)
+
+    import bot
+    logging.getLogger().setLevel(logging.WARNING)
+    from commands.inline import inline_cache, render_results
+    from practice_search import PracticeSearchIndex, index_for, normalize
+    from snapshot import DataSnapshot
+
+    # A version the bot never uses, so the end-to-end section starts with an empty inline cache
+    snapshot = DataSnapshot(document, version=-1)
+    started = time.perf_counter()
+    index = PracticeSearchIndex(snapshot.practices)
+    print(f"{args.practices} practices, vocabulary {args.words} words; index build "
+          f"{(time.perf_counter() - started) * 1000:.0f} ms")
+
+    print_table("naive scan", timed_by_kind(queries[:args.scan_queries],
+                                            lambda query: scan(snapshot.practices, normalize, query)))
+
+    print_table("index search", timed_by_kind(queries, index.search))
+    index_for(snapshot)
+    print_table("index search + articles",
+                timed_by_kind(queries, lambda query: render_results(snapshot, query, 0)))
+
+    for _, query in queries:
+        inline_cache.get_or_render("inline_practices", (normalize(query), 0), snapshot.version,
+                                   lambda: render_results(snapshot, query, 0))
+    print_table("cached", timed_by_kind(queries, lambda query: inline_cache.get_or_render(
+        "inline_practices", (normalize(query), 0), snapshot.version, lambda: render_results(snapshot, query, 0))))
+
+    if args.e2e:
+        asyncio.run(end_to_end(args, bot, queries))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""Load test: the real bot against local Telegram Bot API and npoint stand-ins.
+
+The bot from bot.py runs in-process with BOT_API_URL and NPOINT_URL pointing
+at fake servers (see fake_telegram.py and fake_npoint.py) that add latency,
+errors, timeouts, blocked chats and Telegram-style 429 rate limits. Two
+phases run against the same synthetic user base:
+
+signup     every user sends /start, arriving as a Poisson process at --rate;
+           exercises the start handler, the user registry write path and
+           error_handler when replies fail. Reports per-update latency,
+           replies by kind and the time to flush the registry to storage.
+broadcast  a new practice is published to the npoint stand-in and
+           check_new_practices_job announces it to every user through the
+           outbox. Reports duration, delivery outcomes and throttling.
+
+At Telegram's real limits (--rate-limit 30) a broadcast to 10k users takes
+several minutes; raise --rate-limit and --broadcast-rate together for a
+quicker run.
+
+Usage: python benchmarks/loadtest.py [--users 10000] [--rate 200] [--latency 0.05] [--error-rate 0.01]
+       [--timeout-rate 0.001] [--blocked-rate 0.02] [--rate-limit 30] [--broadcast-rate 25]
+"""
+import argparse
+import asyncio
+import logging
+import random
+import statistics
+import tempfile
+import time
+from collections import Counter
+
+from telegram import Update
+from telegram.ext import CallbackContext
+
+from fake_npoint import FakeNpoint, make_document
+from fake_telegram import FakeBotAPI, add_fault_arguments, faults_from_args, make_message_update
+from fixtures import TOKEN, percentile, started_application, write_env
+
+FIRST_CHAT_ID = 100000
+
+def classify_replies(sent, start_text: str, textjson) -> Counter:
+    kinds = {
+        start_text: "start",
+        textjson.common.network_error: "network_error",
+        textjson.common.error_generic: "error_generic",
+        textjson.common.bad_request: "bad_request",
+    }
+    overloaded = textjson.common.bot_overloaded.split("{")[0]
+    replies = Counter()
+    for _, params in sent:
+        text = params.get("text", "")
+        kind = kinds.get(text)
+        if kind is None:
+            kind = "bot_overloaded" if text.startswith(overloaded) else "other"
+        replies[kind] += 1
+    return replies
+
+async def signup(application, chat_ids, rate: float, rng: random.Random):
+    latencies = []
+
+    async def process(update: Update):
+        started = time.perf_counter()
+        await application.process_update(update)
+        latencies.append(time.perf_counter() - started)
+
+    tasks = []
+    started = time.perf_counter()
+    for update_id, chat_id in enumerate(chat_ids, start=1):
+        if rate:
+            await asyncio.sleep(rng.expovariate(rate))
+        update = Update.de_json(make_message_update(update_id, chat_id, "/start"), application.bot)
+        tasks.append(asyncio.create_task(process(update)))
+    await asyncio.gather(*tasks)
+    return latencies, time.perf_counter() - started
+
+async def run(args):
+    rng = random.Random(args.seed)
+    fake = FakeBotAPI(TOKEN, faults=faults_from_args(args), seed=args.seed)
+    npoint = FakeNpoint(make_document(args.practices, args.categories), latency=args.npoint_latency,
+                        error_rate=args.npoint_error_rate, seed=args.seed)
+    await fake.start()
+    await npoint.start()
+    write_env(tempfile.mkdtemp(), BOT_API_URL=fake.base_url, NPOINT_URL=npoint.url)
+
+    import bot
+    from broadcast import TokenBucket
+    from outbox import outbox
+    # logger.py configures the root logger at INFO on import
+    logging.getLogger().setLevel(args.log_level)
+
+    if args.broadcast_rate:
+        outbox.broadcaster.bucket = TokenBucket(args.broadcast_rate)
+    try:
+        # Job queue and update fetching stay off; the driver runs the jobs itself
+        async with started_application(bot, start=False) as application:
+            await drive(args, application, fake, npoint, rng)
+    finally:
+        await fake.stop()
+        await npoint.stop()
+
+async def drive(args, application, fake: FakeBotAPI, npoint: FakeNpoint, rng: random.Random) -> None:
+    """The signup phase, then the broadcast phase"""
+    import db
+    import users
+    from commands.system import check_new_practices_job
+    from language import textjson
+    from storage import storage
+
+    context = CallbackContext(application)
+    # First run only records the current practices, as on a fresh deploy
+    await check_new_practices_job(context)
+
+    chat_ids = [FIRST_CHAT_ID + i for i in range(args.users)]
+    print(f"signup: {args.users} users at ~{args.rate:g}/s, faults {fake.faults}")
+    latencies, elapsed = await signup(application, chat_ids, args.rate, rng)
+    replies = classify_replies(fake.sent, await db.get_start_text(), textjson)
+    print(f"  {len(latencies)} updates in {elapsed:.1f} s ({len(latencies) / elapsed:.0f}/s)  "
+          f"p50={statistics.median(latencies) * 1000:.1f} ms  p95={percentile(latencies, 95) * 1000:.1f} ms  "
+          f"p99={percentile(latencies, 99) * 1000:.1f} ms  max={max(latencies) * 1000:.1f} ms")
+    print(f"  replies: {dict(replies)}")
+    print(f"  Bot API sends: {dict(fake.stats)}")
+    started = time.perf_counter()
+    flushed = await users.registry.flush()
+    print(f"  registry flush: {flushed} users in {(time.perf_counter() - started) * 1000:.0f} ms, "
+          f"{len(await storage.get_users(subscribed_only=False))} users in storage")
+
+    fake.stats.clear()
+    practice = npoint.add_practice()
+    await db._refresh()
+    print(f"broadcast: practice {practice['id']} to {len(await storage.get_users(subscribed_only=False))} users")
+    started = time.perf_counter()
+    await check_new_practices_job(context)
+    elapsed = time.perf_counter() - started
+    deliveries = Counter(status for _, status in await storage.get_deliveries(f"practices:{practice['id']}"))
+    print(f"  {elapsed:.1f} s, deliveries: {dict(deliveries)} "
+          f"({deliveries['sent'] / elapsed:.1f} msg/s)")
+    print(f"  Bot API sends: {dict(fake.stats)}")
+    print(f"  npoint requests: {dict(npoint.stats)}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--rate", type=float, default=200, help="mean /start updates per second, 0 for all at once")
+    parser.add_argument("--practices", type=int, default=200)
+    parser.add_argument("--categories", type=int, default=10)
+    parser.add_argument("--broadcast-rate", type=float, help="override BROADCAST_RATE (messages/second)")
+    parser.add_argument("--npoint-latency", type=float, default=0.0)
+    parser.add_argument("--npoint-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--log-level", default="CRITICAL", help="handlers log every failed send at ERROR")
+    add_fault_arguments(parser)
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
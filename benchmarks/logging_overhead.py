@@ -0,0 +1,109 @@
+"""Micro-benchmark: logging cost per update on the event loop thread.
+
+Each simulated update logs what a menu handler logs (two INFO records with
+the chat ID and button text, one DEBUG record below the level). Variants:
+
+before     f-strings formatted eagerly, synchronous StreamHandler, text format
+queue      lazy %-arguments, NonBlockingQueueHandler + listener thread, JSON
+sampled    as queue, with the INFO events sampled at --sample-rate
+
+Time is measured on the calling thread only; the listener thread is drained
+before the next variant starts. Output goes to a file, or to a pipe read by
+a slow consumer with --slow-reader to show blocking writes.
+
+Usage: python benchmarks/logging_overhead.py [--updates 20000] [--sample-rate 0.1] [--slow-reader]
+"""
+import argparse
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# logger.py reads env.json from the working directory; run from an empty one so defaults apply
+os.chdir(tempfile.mkdtemp())
+
+# Importing logger also applies its LogRecord settings, which "before" did not have
+logging_flags = (logging.logThreads, logging.logProcesses, logging.logMultiprocessing, logging.logAsyncioTasks)
+
+from logger import TEXT_FORMAT, create_handler, log_context
+
+def set_record_flags(flags) -> None:
+    logging.logThreads, logging.logProcesses, logging.logMultiprocessing, logging.logAsyncioTasks = flags
+
+SELECT = "User %s selected in practices menu: %s"
+VIEW = "User %s viewing category: %s"
+
+def open_output(slow_reader: bool):
+    if slow_reader:
+        # Reads in small chunks with pauses, like a busy log shipper
+        reader = subprocess.Popen([sys.executable, "-c",
+                                   "import sys, time\nwhile sys.stdin.buffer.read(4096): time.sleep(0.005)"],
+                                  stdin=subprocess.PIPE)
+        return open(reader.stdin.fileno(), "w", closefd=False), reader
+    return open(os.path.join(tempfile.mkdtemp(), "bench.log"), "w"), None
+
+def make_logger(name: str, handler: logging.Handler) -> logging.Logger:
+    bench_logger = logging.getLogger(f"bench.{name}")
+    bench_logger.handlers = [handler]
+    bench_logger.propagate = False
+    bench_logger.setLevel(logging.INFO)
+    return bench_logger
+
+def run_before(bench_logger: logging.Logger, updates: int) -> float:
+    started = time.perf_counter()
+    for chat_id in range(updates):
+        text = "Breathing 🧘"
+        bench_logger.info(f"User {chat_id} selected in practices menu: {text}")
+        bench_logger.debug(f"Navigation stack: {[0, 3]}")
+        bench_logger.info(f"User {chat_id} viewing category: {text}")
+    return time.perf_counter() - started
+
+def run_after(bench_logger: logging.Logger, updates: int) -> float:
+    started = time.perf_counter()
+    for chat_id in range(updates):
+        text = "Breathing 🧘"
+        with log_context(chat_id=chat_id, state="practices_menu", handler="practices_menu_handler"):
+            bench_logger.info(SELECT, chat_id, text)
+            bench_logger.debug("Navigation stack: %s", [0, 3])
+            bench_logger.info(VIEW, chat_id, text)
+    return time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=20000)
+    parser.add_argument("--sample-rate", type=float, default=0.1)
+    parser.add_argument("--slow-reader", action="store_true", help="write to a pipe drained by a slow reader")
+    args = parser.parse_args()
+
+    print(f"{args.updates} updates, 2 INFO + 1 DEBUG records each")
+    for name in ("before", "queue", "sampled"):
+        output, reader = open_output(args.slow_reader)
+        listener = None
+        flags = (logging.logThreads, logging.logProcesses, logging.logMultiprocessing, logging.logAsyncioTasks)
+        if name == "before":
+            set_record_flags(logging_flags)
+            handler = logging.StreamHandler(output)
+            handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+            elapsed = run_before(make_logger(name, handler), args.updates)
+            set_record_flags(flags)
+        else:
+            sampling = {SELECT: args.sample_rate, VIEW: args.sample_rate} if name == "sampled" else {}
+            handler, listener = create_handler("json", sampling, output)
+            elapsed = run_after(make_logger(name, handler), args.updates)
+        drain_started = time.perf_counter()
+        if listener is not None:
+            listener.stop()
+        output.close()
+        if reader is not None:
+            reader.stdin.close()
+            reader.wait()
+        drain = time.perf_counter() - drain_started
+        print(f"{name:<8} {elapsed / args.updates * 1e6:7.2f} us/update on the loop thread  "
+              f"(drain after run {drain:.2f} s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Micro-benchmark: per-state dispatch with stacked Regex MessageHandlers vs StateRouter.
+
+"before" reproduces the previous ConversationHandler states: handlers are
+checked in order (Regex for the back and main menu buttons, then the
+catch-all), and the main menu resolves its button with the if/elif chain on
+the first word including the function-local imports. "after" is one
+MessageHandler check plus StateRouter.resolve.
+
+Usage: python benchmarks/router_dispatch.py [--number 20000]
+"""
+import argparse
+import tempfile
+import timeit
+
+from fixtures import write_env
+
+# Command modules read env.json and language.json from the working directory at import time
+write_env(tempfile.mkdtemp(), STORAGE_URL="sqlite::memory:")
+
+from telegram import Update
+from telegram.ext import MessageHandler, filters
+
+from fake_telegram import make_message_update
+from language import textjson
+from config import MAIN_MENU, UNIVERSITY_MENU, PRACTICES_MENU
+from commands.routes import state_routers
+
+BACK = "^Назад ↩️$"
+MAIN = "^Вернуться в главное меню 🏠$"
+
+def noop(update, context):
+    pass
+
+def old_state_handlers():
+    """Handler lists of the previous bot.py, in their original order per state"""
+    text = filters.TEXT & ~filters.COMMAND
+    handlers = {}
+    for state in state_routers:
+        if state == MAIN_MENU:
+            handlers[state] = [MessageHandler(text, noop)]
+        elif state in (UNIVERSITY_MENU, PRACTICES_MENU):
+            handlers[state] = [MessageHandler(filters.Regex(MAIN), noop), MessageHandler(text, noop)]
+        else:
+            handlers[state] = [MessageHandler(filters.Regex(MAIN), noop), MessageHandler(filters.Regex(BACK), noop),
+                               MessageHandler(text, noop)]
+    return handlers
+
+def old_main_menu(text):
+    first = text.split(" ")[0]
+    if first == "Узнать":
+        from commands.universities import handle_university_info
+        return handle_university_info
+    elif first == "Найти":
+        from commands.psychologists import handle_find_psychologist
+        return handle_find_psychologist
+    elif first == "Практики":
+        from commands.practices import handle_practices
+        return handle_practices
+    elif first == "Контакты":
+        from commands.contacts import handle_contacts
+        return handle_contacts
+    elif first == "Наши":
+        from commands.partners import handle_partners
+        return handle_partners
+    elif first == "Сообщить":
+        return None
+    return None
+
+def dispatch_before(handlers, state, update):
+    for handler in handlers[state]:
+        if handler.check_update(update):
+            break
+    if state == MAIN_MENU:
+        old_main_menu(update.message.text)
+
+def dispatch_after(handler, state, update):
+    if handler.check_update(update):
+        state_routers[state].resolve(update.message.text)
+
+def make_inputs():
+    main_buttons = list(vars(textjson.main_menu).values())
+    section_texts = [textjson.common.back_button, textjson.common.main_menu_button, "Some category 🧘‍♀️"]
+    inputs = []
+    update_id = 0
+    for state in state_routers:
+        for text in (main_buttons + ["hello"] if state == MAIN_MENU else section_texts):
+            update_id += 1
+            inputs.append((state, Update.de_json(make_message_update(update_id, 1, text), None)))
+    return inputs
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=20000, help="passes over all inputs")
+    args = parser.parse_args()
+
+    inputs = make_inputs()
+    handlers = old_state_handlers()
+    catch_all = MessageHandler(filters.TEXT & ~filters.COMMAND, noop)
+
+    def before():
+        for state, update in inputs:
+            dispatch_before(handlers, state, update)
+
+    def after():
+        for state, update in inputs:
+            dispatch_after(catch_all, state, update)
+
+    print(f"{len(inputs)} inputs over {len(state_routers)} states, {args.number} passes")
+    for name, func in (("before", before), ("after", after)):
+        seconds = min(timeit.repeat(func, number=args.number, repeat=3))
+        print(f"{name:<8} {seconds / (args.number * len(inputs)) * 1e9:8.0f} ns/update")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Micro-benchmark: list scans over the raw document vs DataSnapshot index lookups.
+
+Usage: python benchmarks/snapshot_lookups.py [--practices 10000] [--universities 1000]
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from snapshot import DataSnapshot
+
+def make_document(practices: int, universities: int, categories: int = 50, events_per_university: int = 5):
+    return {
+        "users": list(range(practices)),
+        "admin_ids": [1],
+        "bot_info": {
+            "practices": [
+                {"id": i, "name": f"Practice {i}", "category": f"Category {i % categories}", "content": "..."}
+                for i in range(practices)
+            ],
+            "universities": [{"id": i, "name": f"University {i}"} for i in range(universities)],
+            "events": [
+                {"id": i * events_per_university + j, "universityId": i, "title": f"Event {j}"}
+                for i in range(universities) for j in range(events_per_university)
+            ],
+        },
+    }
+
+# Previous implementations from db.py, operating on the raw document
+def scan_categories(data):
+    categories = []
+    for practice in data["bot_info"]["practices"]:
+        if practice["category"] not in categories:
+            categories.append(practice["category"])
+    return categories
+
+def scan_by_category(data, category):
+    return [p for p in data["bot_info"]["practices"] if p["category"] == category]
+
+def scan_practice(data, practice_id):
+    return next((p for p in data["bot_info"]["practices"] if p.get("id") == practice_id), None)
+
+def scan_events(data, university_id):
+    return [e for e in data["bot_info"]["events"] if e.get("universityId") == university_id]
+
+def scan_university(data, name):
+    return next((u for u in data["bot_info"]["universities"] if u.get("name") == name), None)
+
+def bench(label, func, number):
+    seconds = timeit.timeit(func, number=number)
+    print(f"  {label:<24} {seconds / number * 1e6:12.2f} µs/op")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--practices", type=int, default=10_000)
+    parser.add_argument("--universities", type=int, default=1_000)
+    parser.add_argument("--number", type=int, default=200)
+    args = parser.parse_args()
+
+    data = make_document(args.practices, args.universities)
+    rng = random.Random(0)
+    practice_id = rng.randrange(args.practices)
+    university_id = rng.randrange(args.universities)
+    category = f"Category {rng.randrange(50)}"
+    name = f"University {university_id}"
+
+    build = timeit.timeit(lambda: DataSnapshot(data), number=10) / 10
+    print(f"{args.practices} practices, {args.universities} universities; snapshot build {build * 1000:.1f} ms")
+    snapshot = DataSnapshot(data)
+
+    print("before (list scans)")
+    bench("practice categories", lambda: scan_categories(data), args.number)
+    bench("practices by category", lambda: scan_by_category(data, category), args.number)
+    bench("practice by id", lambda: scan_practice(data, practice_id), args.number)
+    bench("university events", lambda: scan_events(data, university_id), args.number)
+    bench("university by name", lambda: scan_university(data, name), args.number)
+
+    number = args.number * 100
+    print("after (snapshot indexes)")
+    bench("practice categories", lambda: snapshot.practice_categories, number)
+    bench("practices by category", lambda: snapshot.get_practices_by_category(category), number)
+    bench("practice by id", lambda: snapshot.get_practice(practice_id), number)
+    bench("university events", lambda: snapshot.get_university_events(university_id), number)
+    bench("university by name", lambda: snapshot.get_university_by_name(name), number)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Update-to-reply latency and bot CPU time: polling (poll_interval=2) vs webhook.
+
+The bot runs in a child process against an in-process fake Bot API and
+echoes every message. Updates arrive as a Poisson process; latency is
+measured from the moment an update is made available to the bot (queued for
+getUpdates, or POSTed to the webhook) until its reply reaches the fake API.
+CPU time is read from /proc for the bot process during the load window.
+
+Usage: python benchmarks/webhook_vs_polling.py [--updates 200] [--rate 20] [--chats 50]
+"""
+import argparse
+import asyncio
+import os
+import random
+import signal
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from fake_telegram import FakeBotAPI, make_message_update
+from fixtures import ROOT, TOKEN, percentile
+
+SECRET = "bench-secret"
+
+def run_child(mode: str, base_url: str, webhook_port: int) -> None:
+    """Bot process: echo every text message back, receiving updates in the given mode"""
+    from telegram.ext import Application, MessageHandler, filters
+    from webhook import serve_webhook
+
+    async def echo(update, context):
+        await update.message.reply_text(update.message.text)
+
+    application = Application.builder().token(TOKEN).base_url(base_url).build()
+    application.add_handler(MessageHandler(filters.TEXT, echo))
+    if mode == "webhook":
+        url = f"http://127.0.0.1:{webhook_port}/telegram"
+        asyncio.run(serve_webhook(application, url, SECRET, "127.0.0.1", webhook_port))
+    else:
+        application.run_polling(poll_interval=2)
+
+def process_cpu(pid: int) -> float:
+    """User + system CPU seconds of a running process (Linux /proc)"""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+def free_port() -> int:
+    import socket
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+async def measure(mode: str, updates: int, rate: float, chats: int):
+    fake = FakeBotAPI(TOKEN)
+    await fake.start()
+    webhook_port = free_port()
+    pending = {}
+    latencies = []
+    done = asyncio.Event()
+
+    def on_send(now, params):
+        arrived = pending.pop(params.get("text"), None)
+        if arrived is not None:
+            latencies.append(now - arrived)
+            if len(latencies) == updates:
+                done.set()
+    fake.on_send = on_send
+
+    child = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--child", mode,
+                              "--base-url", fake.base_url, "--webhook-port", str(webhook_port)],
+                             cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    await asyncio.wait_for((fake.webhook_set if mode == "webhook" else fake.polling).wait(), 30)
+
+    rng = random.Random(1)
+    async with httpx.AsyncClient() as client:
+        started = time.perf_counter()
+        cpu_before = process_cpu(child.pid)
+        for update_id in range(1, updates + 1):
+            await asyncio.sleep(rng.expovariate(rate))
+            text = f"ping {update_id}"
+            update = make_message_update(update_id, rng.randrange(chats) + 1, text)
+            pending[text] = time.perf_counter()
+            if mode == "webhook":
+                await client.post(fake.webhook_url, json=update, headers={"X-Telegram-Bot-Api-Secret-Token": SECRET})
+            else:
+                await fake.push_update(update)
+        await asyncio.wait_for(done.wait(), 60)
+        elapsed = time.perf_counter() - started
+        # Only the load window counts, not interpreter startup and imports
+        cpu = process_cpu(child.pid) - cpu_before
+
+    child.send_signal(signal.SIGINT)
+    await asyncio.get_running_loop().run_in_executor(None, child.wait)
+    await fake.stop()
+    return latencies, cpu, elapsed
+
+def report(mode, latencies, cpu, elapsed):
+    print(f"{mode:<8} p50={statistics.median(latencies) * 1000:7.1f} ms  p95={percentile(latencies, 95) * 1000:7.1f} ms  "
+          f"p99={percentile(latencies, 99) * 1000:7.1f} ms  max={max(latencies) * 1000:7.1f} ms  "
+          f"cpu={cpu:5.2f} s ({cpu / len(latencies) * 1000:.2f} ms/update over {elapsed:.1f} s)")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=20, help="mean incoming updates per second")
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--child", choices=["polling", "webhook"], help=argparse.SUPPRESS)
+    parser.add_argument("--base-url", help=argparse.SUPPRESS)
+    parser.add_argument("--webhook-port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.base_url, args.webhook_port)
+        return
+
+    print(f"{args.updates} updates at ~{args.rate:g}/s from {args.chats} chats")
+    for mode in ("polling", "webhook"):
+        report(mode, *asyncio.run(measure(mode, args.updates, args.rate, args.chats)))
+
+if __name__ == "__main__":
+    main()
@@ -1,88 +1,184 @@
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters, ConversationHandler
+import asyncio
 
+from typing import Optional, Tuple
+
+from telegram.ext import Application, ApplicationBuilder, CommandHandler, CallbackQueryHandler, InlineQueryHandler, MessageHandler, filters, ConversationHandler
+
+import db
+import users
+import metrics
+from tracing import TracingApplication
+from update_processor import ChatOrderedUpdateProcessor
+from storage import storage, StorageError
+from persistence import persistence
+from flood import flood_control
+from audio_cache import audio_cache
+import practice_search
+import text_search
 from logger import logger
-from config import TOKEN, MAIN_MENU, UNIVERSITY_MENU, FIND_PSYCHOLOGIST, PRACTICES_MENU, PRACTICE_CATEGORY, PRACTICE_DETAIL, CONTACTS_MENU, REPORT_ISSUE, PARTNERS_MENU
+from webhook import serve_webhook
+from config import TOKEN, BOT_API_URL, MODE, WEBHOOK_URL, WEBHOOK_SECRET, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_CERT, WEBHOOK_KEY
+from config import METRICS_LISTEN, METRICS_PORT, UPDATE_CONCURRENCY
+from config import USERS_FLUSH_INTERVAL, MAIN_MENU, UNIVERSITY_MENU, FIND_PSYCHOLOGIST, PRACTICES_MENU, PRACTICE_CATEGORY, PRACTICE_DETAIL, CONTACTS_MENU, REPORT_ISSUE, PARTNERS_MENU, SEARCH
 
 # Import command handlers from modules
-from commands.system import start, main_menu_handler, fallback_handler, error_handler, check_new_practices_job, heartbeat_job
-from commands.system import go_back, return_to_main_menu, report_issue_handler
-from commands.universities import university_menu_handler
-from commands.practices import practices_menu_handler, practice_detail_handler, button_handler
-from commands.psychologists import handle_find_psychologist
-from commands.partners import handle_partners
+from commands.system import start, fallback_handler, error_handler, check_new_practices_job, heartbeat_job, flush_users_job
+from commands.system import resume_broadcasts_job
+from commands.practices import button_handler
+from commands.routes import state_routers, page_handler
+from pagination import PAGE_PATTERN
+from commands.admin import trace_command, profile_command
+from commands.inline import inline_query_handler
+from commands.search import open_found_practice
 
-def main():
-    # Create the application with better polling parameters
-    application = Application.builder().token(TOKEN).build()
+metrics_server: Optional[metrics.MetricsServer] = None
+
+def readiness(application: Application) -> Tuple[bool, str]:
+    if not db.get_cache_stats()["snapshot_version"]:
+        return False, "content not loaded"
+    if not application.running:
+        return False, "application not running"
+    return True, "ready"
+
+async def post_init(application: Application):
+    """Warm the data cache and user registry so the first users do not wait on the backend"""
+    global metrics_server
+    if METRICS_PORT is not None and metrics_server is None:
+        metrics_server = metrics.MetricsServer(METRICS_LISTEN, int(METRICS_PORT), lambda: readiness(application))
+        await metrics_server.start()
+    try:
+        await db.fetch_db()
+        await users.registry.load()
+    except (db.DatabaseError, StorageError) as e:
+        logger.error(f"Startup warm-up failed: {str(e)}")
+    if db.start_watching():
+        logger.info("Watching the content source for changes")
+
+async def post_shutdown(application: Application):
+    """Write pending users, close local storage and the content source"""
+    global metrics_server
+    if metrics_server is not None:
+        await metrics_server.stop()
+        metrics_server = None
+    await users.registry.close()
+    await storage.close()
+    await db.close_client()
+
+def build_application(builder: Optional[ApplicationBuilder] = None) -> Application:
+    """Create the application with all handlers and jobs registered.
+
+    `builder` defaults to Application.builder() with the bot token and
+    BOT_API_URL; benchmarks pass one pointed at a fake Bot API.
+    """
+    if builder is None:
+        builder = Application.builder().token(TOKEN)
+        if BOT_API_URL:
+            builder = builder.base_url(BOT_API_URL)
+    # Outbound Bot API calls are counted and timed by method; updates are traced while /trace is on
+    # Chats are served concurrently, each chat's updates one at a time and in order
+    application = (builder.application_class(TracingApplication).request(metrics.InstrumentedRequest())
+                   .concurrent_updates(ChatOrderedUpdateProcessor(UPDATE_CONCURRENCY))
+                   .persistence(persistence).post_init(post_init).post_shutdown(post_shutdown).build())
+    metrics.update_queue_depth.function = application.update_queue.qsize
     
-    logger.info("Starting bot with modular structure")
+    # Every state resolves its text messages with a single lookup in its router
+    text_messages = filters.TEXT & ~filters.COMMAND
+    
+    # Handlers outside the state routers are timed here; the routers time their own
+    timed_start = metrics.timed("entry", start)
     
     # Create conversation handler with the states
     conv_handler = ConversationHandler(
         entry_points=[
-            CommandHandler("start", start),
-            MessageHandler(filters.TEXT, start),
-            MessageHandler(filters.COMMAND, start)
+            CommandHandler("start", timed_start),
+            MessageHandler(filters.TEXT, timed_start),
+            MessageHandler(filters.COMMAND, timed_start)
         ],
         states={
-            MAIN_MENU: [MessageHandler(filters.TEXT & ~filters.COMMAND, main_menu_handler)],
-            UNIVERSITY_MENU: [
-                MessageHandler(filters.Regex("^Вернуться в главное меню 🏠$"), return_to_main_menu),
-                MessageHandler(filters.TEXT & ~filters.COMMAND, university_menu_handler)
-            ],
-            FIND_PSYCHOLOGIST: [
-                MessageHandler(filters.Regex("^Вернуться в главное меню 🏠$"), return_to_main_menu),
-                MessageHandler(filters.Regex("^Назад ↩️$"), go_back),
-                MessageHandler(filters.TEXT & ~filters.COMMAND, handle_find_psychologist)
-            ],
-            CONTACTS_MENU: [
-                MessageHandler(filters.Regex("^Вернуться в главное меню 🏠$"), return_to_main_menu),
-                MessageHandler(filters.Regex("^Назад ↩️$"), go_back),
-                MessageHandler(filters.TEXT & ~filters.COMMAND, go_back)
-            ],
-            PRACTICES_MENU: [
-                MessageHandler(filters.Regex("^Вернуться в главное меню 🏠$"), return_to_main_menu),
-                MessageHandler(filters.TEXT & ~filters.COMMAND, practices_menu_handler)
-            ],
+            MAIN_MENU: [MessageHandler(text_messages, state_routers[MAIN_MENU])],
+            UNIVERSITY_MENU: [MessageHandler(text_messages, state_routers[UNIVERSITY_MENU])],
+            FIND_PSYCHOLOGIST: [MessageHandler(text_messages, state_routers[FIND_PSYCHOLOGIST])],
+            CONTACTS_MENU: [MessageHandler(text_messages, state_routers[CONTACTS_MENU])],
+            PRACTICES_MENU: [MessageHandler(text_messages, state_routers[PRACTICES_MENU])],
             PRACTICE_CATEGORY: [
-                CallbackQueryHandler(button_handler),
-                MessageHandler(filters.Regex("^Вернуться в главное меню 🏠$"), return_to_main_menu),
-                MessageHandler(filters.Regex("^Назад ↩️$"), go_back),
-                MessageHandler(filters.TEXT & ~filters.COMMAND, go_back)
-            ],
-            PRACTICE_DETAIL: [
-                MessageHandler(filters.Regex("^Вернуться в главное меню 🏠$"), return_to_main_menu),
-                MessageHandler(filters.Regex("^Назад ↩️$"), go_back),
-                MessageHandler(filters.TEXT & ~filters.COMMAND, practice_detail_handler)
+                CallbackQueryHandler(metrics.timed("practice_category", button_handler), pattern="^show_practice_"),
+                MessageHandler(text_messages, state_routers[PRACTICE_CATEGORY])
             ],
-            REPORT_ISSUE: [
-                MessageHandler(filters.Regex("^Вернуться в главное меню 🏠$"), return_to_main_menu),
-                MessageHandler(filters.Regex("^Назад ↩️$"), go_back),
-                MessageHandler(filters.TEXT & ~filters.COMMAND, report_issue_handler)
-            ],
-            PARTNERS_MENU: [
-                MessageHandler(filters.Regex("^Вернуться в главное меню 🏠$"), return_to_main_menu),
-                MessageHandler(filters.Regex("^Назад ↩️$"), go_back),
-                MessageHandler(filters.TEXT & ~filters.COMMAND, handle_partners)
+            PRACTICE_DETAIL: [MessageHandler(text_messages, state_routers[PRACTICE_DETAIL])],
+            REPORT_ISSUE: [MessageHandler(text_messages, state_routers[REPORT_ISSUE])],
+            PARTNERS_MENU: [MessageHandler(text_messages, state_routers[PARTNERS_MENU])],
+            SEARCH: [
+                CallbackQueryHandler(metrics.timed("search", open_found_practice), pattern="^show_practice_"),
+                MessageHandler(text_messages, state_routers[SEARCH])
             ],
         },
-        fallbacks=[CommandHandler("start", start), MessageHandler(filters.ALL, fallback_handler)],
+        fallbacks=[CommandHandler("start", metrics.timed("fallback", start)),
+                   MessageHandler(filters.ALL, metrics.timed("fallback", fallback_handler))],
+        name="main",
+        persistent=True,
     )
     
+    application.add_handler(metrics.update_counter_handler(), group=-4)
+    # Drop updates of chats that send too fast before they cost storage reads or replies; dropped ones are still counted
+    application.add_handler(flood_control.handler(), group=-3)
+    # Admin diagnostics stop here; other users' commands go on to the conversation handler
+    application.add_handler(CommandHandler("trace", trace_command), group=-2)
+    application.add_handler(CommandHandler("profile", profile_command), group=-2)
+    # Load each chat's saved state on its first allowed update, before the conversation handler sees it
+    application.add_handler(persistence.preload_handler(application), group=-1)
     application.add_handler(conv_handler)
+    # Page buttons of listings work in any state; the conversation does not handle them
+    application.add_handler(CallbackQueryHandler(metrics.timed("pagination", page_handler), pattern=PAGE_PATTERN))
+    # "@bot <words>" in any chat; inline queries belong to no chat, so the conversation never sees them
+    application.add_handler(InlineQueryHandler(metrics.timed("inline", inline_query_handler)))
+    
+    # Finish broadcasts interrupted by a restart or redeploy
+    application.job_queue.run_once(resume_broadcasts_job, when=0)
     
-    # Schedule periodic job for new practices check every 1 minute (60 seconds)
-    application.job_queue.run_repeating(check_new_practices_job, interval=60, first=0)
+    if db.source.supports_watch:
+        # Check for new practices whenever the watched source produces a new snapshot
+        async def on_snapshot_change(snapshot):
+            application.job_queue.run_once(check_new_practices_job, when=0)
+        db.add_snapshot_listener(on_snapshot_change)
+        application.job_queue.run_once(check_new_practices_job, when=0)
+    else:
+        # Schedule periodic job for new practices check every 1 minute (60 seconds)
+        application.job_queue.run_repeating(check_new_practices_job, interval=60, first=0)
     logger.info("Bot started and job scheduled.")
     
+    # Upload audio of new practices ahead of the first user who opens them
+    async def prewarm_audio(snapshot):
+        await audio_cache.on_snapshot(application.bot, snapshot)
+    db.add_snapshot_listener(prewarm_audio)
+    
+    # Index each new snapshot for inline and full-text search now rather than on the first query
+    async def prewarm_search(snapshot):
+        await asyncio.to_thread(practice_search.index_for, snapshot)
+        await text_search.sync(snapshot)
+    db.add_snapshot_listener(prewarm_search)
+    
+    # Write newly registered users to storage in batches
+    application.job_queue.run_repeating(flush_users_job, interval=USERS_FLUSH_INTERVAL, first=USERS_FLUSH_INTERVAL)
+    
     # Add a heartbeat job to run every 5 minutes
     application.job_queue.run_repeating(heartbeat_job, interval=300, first=0)
     
     # Register the error handler
     application.add_error_handler(error_handler)
+    return application
+
+def main():
+    application = build_application()
+    logger.info("Starting bot with modular structure")
     
     # Start the bot (this will run until interrupted)
-    application.run_polling(poll_interval=2)
+    if MODE == "webhook":
+        if not WEBHOOK_URL:
+            raise ValueError("WEBHOOK_URL is required in webhook mode")
+        asyncio.run(serve_webhook(application, WEBHOOK_URL, WEBHOOK_SECRET, WEBHOOK_LISTEN, WEBHOOK_PORT,
+                                  WEBHOOK_CERT, WEBHOOK_KEY))
+    else:
+        application.run_polling(poll_interval=2)
 
 if __name__ == '__main__':
     main()
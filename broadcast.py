@@ -0,0 +1,197 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TimedOut
+
+import metrics
+from logger import logger
+from config import BROADCAST_RATE, BROADCAST_CONCURRENCY, BROADCAST_PER_CHAT_INTERVAL
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, bursts up to `capacity`.
+
+    `clock` and `sleep` default to the event loop's time source; tests pass a fake pair.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], Awaitable] = asyncio.sleep):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float) -> None:
+        """Stop handing out tokens for `seconds` (used when Telegram answers RetryAfter)"""
+        self._paused_until = max(self._paused_until, self._clock() + seconds)
+        # Empty when the pause ends, rather than refilled over the pause
+        self._tokens = 0.0
+        self._updated = self._paused_until
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = self._clock()
+                if now < self._paused_until:
+                    await self._sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await self._sleep((1 - self._tokens) / self.rate)
+
+class PerChatLimiter:
+    """Enforce a minimum interval between messages to the same chat"""
+
+    def __init__(self, interval: float, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], Awaitable] = asyncio.sleep):
+        self.interval = interval
+        self._clock = clock
+        self._sleep = sleep
+        self._next_allowed: Dict[int, float] = {}
+
+    async def wait(self, chat_id: int) -> None:
+        now = self._clock()
+        next_allowed = self._next_allowed.get(chat_id, 0.0)
+        if next_allowed > now:
+            self._next_allowed[chat_id] = next_allowed + self.interval
+            await self._sleep(next_allowed - now)
+        else:
+            self._next_allowed[chat_id] = now + self.interval
+            if len(self._next_allowed) > 10000:
+                self._prune(now)
+
+    def _prune(self, now: float) -> None:
+        self._next_allowed = {chat_id: t for chat_id, t in self._next_allowed.items() if t > now}
+
+@dataclass
+class BroadcastResult:
+    total: int = 0
+    sent: int = 0
+    failed: int = 0
+    blocked: List[int] = field(default_factory=list)
+    retries: int = 0
+    duration: float = 0.0
+
+    @property
+    def rate(self) -> float:
+        return self.sent / self.duration if self.duration else 0.0
+
+class Broadcaster:
+    """Deliver a message to many chats with bounded concurrency and Telegram rate limits.
+
+    A global token bucket keeps the bot under Telegram's ~30 messages/second
+    limit and a per-chat limiter spaces messages to the same chat. RetryAfter
+    pauses the global bucket and re-queues the message; network errors are
+    retried a few times. Chats that blocked the bot are reported in the result.
+    """
+
+    def __init__(self, rate: float = BROADCAST_RATE, concurrency: int = BROADCAST_CONCURRENCY,
+                 per_chat_interval: float = BROADCAST_PER_CHAT_INTERVAL, max_retries: int = 3,
+                 progress_interval: float = 10.0):
+        self.bucket = TokenBucket(rate)
+        self.per_chat = PerChatLimiter(per_chat_interval)
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.progress_interval = progress_interval
+
+    async def broadcast(self, chat_ids: Iterable[int], send: Callable[[int], Awaitable],
+                        on_result: Optional[Callable[[int, str], Awaitable]] = None) -> BroadcastResult:
+        """Call `send(chat_id)` for every chat.
+
+        `on_result(chat_id, status)` is awaited after each final outcome, with
+        status "sent", "failed" or "blocked".
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        for chat_id in chat_ids:
+            queue.put_nowait((chat_id, 0))
+        result = BroadcastResult(total=queue.qsize())
+        started = time.monotonic()
+        if not result.total:
+            return result
+
+        async def finish(chat_id: int, status: str) -> None:
+            metrics.broadcast_messages_total.inc(status=status)
+            if on_result is not None:
+                try:
+                    await on_result(chat_id, status)
+                except Exception as e:
+                    logger.error(f"Error recording broadcast result for {chat_id}: {str(e)}")
+
+        async def worker():
+            while True:
+                chat_id, attempt = await queue.get()
+                try:
+                    await self.bucket.acquire()
+                    await self.per_chat.wait(chat_id)
+                    await send(chat_id)
+                    result.sent += 1
+                    await finish(chat_id, "sent")
+                except RetryAfter as e:
+                    retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, "total_seconds") else e.retry_after
+                    logger.warning("Broadcast throttled by Telegram, pausing for %ss", retry_after)
+                    self.bucket.pause(retry_after)
+                    result.retries += 1
+                    metrics.broadcast_retries_total.inc()
+                    queue.put_nowait((chat_id, attempt))
+                except Forbidden:
+                    result.failed += 1
+                    result.blocked.append(chat_id)
+                    await finish(chat_id, "blocked")
+                except BadRequest as e:
+                    # Permanent failure (e.g. chat not found); BadRequest is a NetworkError subclass
+                    result.failed += 1
+                    logger.error(f"Error sending broadcast to user {chat_id}: {str(e)}")
+                    await finish(chat_id, "failed")
+                except (TimedOut, NetworkError) as e:
+                    if attempt < self.max_retries:
+                        result.retries += 1
+                        metrics.broadcast_retries_total.inc()
+                        await asyncio.sleep(2 ** attempt)
+                        queue.put_nowait((chat_id, attempt + 1))
+                    else:
+                        result.failed += 1
+                        logger.error(f"Error sending broadcast to user {chat_id}: {str(e)}")
+                        await finish(chat_id, "failed")
+                except Exception as e:
+                    result.failed += 1
+                    logger.error(f"Error sending broadcast to user {chat_id}: {str(e)}")
+                    await finish(chat_id, "failed")
+                finally:
+                    queue.task_done()
+
+        async def report_progress():
+            while True:
+                await asyncio.sleep(self.progress_interval)
+                elapsed = time.monotonic() - started
+                done = result.sent + result.failed
+                rate = done / elapsed if elapsed else 0.0
+                eta = (result.total - done) / rate if rate else float("inf")
+                logger.info("Broadcast progress: %s/%s (%.1f msg/s, ETA %.0fs)", done, result.total, rate, eta)
+
+        workers = [asyncio.create_task(worker()) for _ in range(min(self.concurrency, result.total))]
+        reporter = asyncio.create_task(report_progress())
+        try:
+            await queue.join()
+        finally:
+            for task in workers + [reporter]:
+                task.cancel()
+            await asyncio.gather(*workers, reporter, return_exceptions=True)
+        result.duration = time.monotonic() - started
+        metrics.broadcast_rate.set(result.rate)
+        logger.info(
+            f"Broadcast finished: {result.sent} sent, {result.failed} failed "
+            f"({len(result.blocked)} blocked), {result.retries} retries in {result.duration:.1f}s "
+            f"({result.rate:.1f} msg/s)"
+        )
+        return result
+
+# Shared instance so every mass send counts against the same limits
+broadcaster = Broadcaster()
@@ -0,0 +1,104 @@
+import html
+
+from telegram import Update
+from telegram.constants import ParseMode
+from telegram.ext import ApplicationHandlerStop, ContextTypes
+
+import db
+from logger import logger
+from profiling import MODES, ProfilerBusy, profiler
+from tracing import tracer
+from config import PROFILE_SECONDS, PROFILE_MAX_SECONDS
+from language import textjson
+
+# Telegram rejects longer messages
+MAX_MESSAGE_LENGTH = 4096
+
+async def is_admin(update: Update) -> bool:
+    return update.effective_chat is not None and update.effective_chat.id in await db.get_admin_ids()
+
+def _preformatted(header: str, body: str) -> str:
+    """Header plus a <pre> block cut to fit in one message"""
+    budget = MAX_MESSAGE_LENGTH - len(header) - len("\n<pre></pre>") - 1
+    body = html.escape(body)
+    if len(body) > budget:
+        body = body[:body.rfind("\n", 0, budget - 1)] + "\n…"
+    return f"{header}\n<pre>{body}</pre>"
+
+async def trace_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/trace on [rate] [threshold ms], /trace off, or /trace for the slowest recent updates.
+
+    For other users the command falls through to the conversation, as any
+    unknown command does.
+    """
+    if not await is_admin(update):
+        return
+    args = context.args or []
+    try:
+        if args and args[0] == "on":
+            rate = float(args[1]) if len(args) > 1 else 1.0
+            threshold = float(args[2]) if len(args) > 2 else 0.0
+            if not 0 < rate <= 1 or threshold < 0:
+                raise ValueError(args)
+            tracer.enable(rate, threshold / 1000)
+            logger.info("Admin %s enabled tracing of %s of updates", update.effective_chat.id, rate)
+            await update.message.reply_text(textjson.admin.trace_enabled.format(rate=rate, threshold=threshold))
+        elif args and args[0] == "off":
+            tracer.disable()
+            logger.info("Admin %s disabled tracing", update.effective_chat.id)
+            await update.message.reply_text(textjson.admin.trace_disabled)
+        elif args:
+            raise ValueError(args)
+        else:
+            traces = tracer.slowest()
+            if not traces:
+                await update.message.reply_text(textjson.admin.trace_empty)
+            else:
+                status = textjson.admin.trace_status_on if tracer.enabled else textjson.admin.trace_status_off
+                lines = [f"{trace.duration * 1000:7.1f} ms  update {trace.update_id}, chat {trace.chat_id}\n"
+                         f"           {trace.summary()}" for trace in traces]
+                await update.message.reply_text(
+                    _preformatted(textjson.admin.trace_header.format(status=status), "\n".join(lines)),
+                    parse_mode=ParseMode.HTML)
+    except ValueError:
+        await update.message.reply_text(textjson.admin.trace_usage)
+    raise ApplicationHandlerStop
+
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/profile [seconds] [sample|cprofile]: profile the event loop, then send the hot spots and a dump file"""
+    if not await is_admin(update):
+        return
+    args = context.args or []
+    try:
+        seconds = float(args[0]) if args else PROFILE_SECONDS
+        mode = args[1] if len(args) > 1 else "sample"
+        if not 0 < seconds <= PROFILE_MAX_SECONDS or mode not in MODES:
+            raise ValueError(args)
+    except ValueError:
+        await update.message.reply_text(textjson.admin.profile_usage.format(max_seconds=PROFILE_MAX_SECONDS))
+        raise ApplicationHandlerStop
+    if profiler.running is not None:
+        await update.message.reply_text(textjson.admin.profile_busy.format(mode=profiler.running))
+        raise ApplicationHandlerStop
+
+    chat_id = update.effective_chat.id
+    logger.info("Admin %s requested a %s profile for %s s", chat_id, mode, seconds)
+    await update.message.reply_text(textjson.admin.profile_started.format(mode=mode, seconds=seconds))
+    # Profile in the background so the run covers other updates, not this handler waiting
+    context.application.create_task(_send_profile(context, chat_id, seconds, mode), update=update)
+    raise ApplicationHandlerStop
+
+async def _send_profile(context: ContextTypes.DEFAULT_TYPE, chat_id: int, seconds: float, mode: str) -> None:
+    try:
+        result = await profiler.run(seconds, mode)
+    except ProfilerBusy as e:
+        # Another /profile started between the check in profile_command and this task
+        await context.bot.send_message(chat_id, textjson.admin.profile_busy.format(mode=e.args[0]))
+        return
+    except ValueError as e:
+        # cProfile refuses to start while another profiler is attached to the interpreter
+        await context.bot.send_message(chat_id, textjson.admin.profile_failed.format(error=str(e)))
+        return
+    header = textjson.admin.profile_header.format(seconds=result.seconds, mode=result.mode)
+    await context.bot.send_message(chat_id, _preformatted(header, result.report), parse_mode=ParseMode.HTML)
+    await context.bot.send_document(chat_id, result.dump, filename=result.filename)
@@ -1,4 +1,4 @@
-import db
+from typing import Optional
 from telegram import Update
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
@@ -6,13 +6,27 @@ from telegram.constants import ParseMode
 from logger import logger
 from config import CONTACTS_MENU, MAIN_MENU
 from language import textjson
+from render_cache import render
+from snapshot import DataSnapshot
 from commands.system import back_button
 
+def render_contacts(snapshot: DataSnapshot) -> Optional[str]:
+    """Render the contacts message, or None if there are no contacts"""
+    if not snapshot.contacts:
+        return None
+    parts = [textjson.contacts.header]
+    for contact in snapshot.contacts:
+        phone = contact.get("phone")
+        email = contact.get("email")
+        parts.append(f"<strong>{contact.get('name', '')}</strong>\r\n")
+        parts.append(f"{textjson.contacts.phone.format(phone=f'<a href=\"tel:{phone}\">{phone}</a>')}\r\n")
+        parts.append(f"{textjson.contacts.email.format(email=f'<a href=\"mailto:{email}\">{email}</a>')}\n\n")
+    return "".join(parts)
+
 async def handle_contacts(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
-        logger.info(f"User {update.effective_chat.id} viewing contacts")
-        contacts = db.get_contacts()
-        logger.debug(f"Retrieved {len(contacts) if contacts else 0} contacts")
+        logger.info("User %s viewing contacts", update.effective_chat.id)
+        response = await render("contacts", None, render_contacts)
         
         # Store current state in navigation stack to enable going back
         if not context.user_data.get('nav_stack'):
@@ -22,16 +36,10 @@ async def handle_contacts(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if not context.user_data['nav_stack'] or context.user_data['nav_stack'][-1] != MAIN_MENU:
             context.user_data['nav_stack'].append(MAIN_MENU)
         
-        if not contacts:
+        if response is None:
             await update.message.reply_text(textjson.contacts.no_info, reply_markup=back_button)
             return CONTACTS_MENU
         
-        response = textjson.contacts.header
-        for contact in contacts:
-            response += f"<strong>{contact.get('name', '')}</strong>\r\n"
-            response += f"{textjson.contacts.phone.format(phone=f'<a href=\"tel:{contact.get("phone")}\">{contact.get("phone")}</a>')}\r\n"
-            response += f"{textjson.contacts.email.format(email=f'<a href=\"mailto:{contact.get("email")}\">{contact.get("email")}</a>')}\n\n"
-        
         await update.message.reply_text(response, reply_markup=back_button, parse_mode=ParseMode.HTML, link_preview_options={"is_disabled": True})
         return CONTACTS_MENU
     except Exception as e:
@@ -0,0 +1,67 @@
+from typing import List, Optional, Tuple
+
+from telegram import (Update, InlineQueryResultArticle, InlineQueryResultsButton, InputTextMessageContent,
+                      LinkPreviewOptions)
+from telegram.constants import MessageLimit, ParseMode
+from telegram.ext import ContextTypes
+
+import db
+import metrics
+import tracing
+from logger import logger
+from practice_search import index_for, normalize
+from render_cache import RenderCache
+from snapshot import DataSnapshot
+from config import INLINE_RESULTS, INLINE_CACHE_TIME
+from language import textjson
+from commands.practices import render_practice
+
+# Results per (query, offset) of the current snapshot; kept apart from the menu renders so
+# the long tail of typed queries cannot evict those
+inline_cache = RenderCache(max_entries=4096)
+metrics.registry.gauge("bot_inline_cache_hit_ratio", "Share of inline queries answered from cache",
+                       function=lambda: inline_cache.get_stats()["hit_ratio"])
+
+def _article(snapshot: DataSnapshot, practice: dict) -> InlineQueryResultArticle:
+    practice_id = practice.get("id")
+    text = render_practice(snapshot, practice_id)
+    if text is None or len(text) > MessageLimit.MAX_TEXT_LENGTH:
+        # Too long to send as one message: the name and description only
+        text = f"<strong>{practice.get('name', '')}{textjson.practices.category_suffix}</strong>\n\n" \
+               f"{practice.get('description') or ''}"
+    description = " · ".join(part for part in (practice.get("category"), practice.get("description")) if part)
+    return InlineQueryResultArticle(
+        id=str(practice_id),
+        title=practice.get("name", ""),
+        description=description,
+        input_message_content=InputTextMessageContent(text, parse_mode=ParseMode.HTML,
+                                                      link_preview_options=LinkPreviewOptions(is_disabled=True)),
+    )
+
+def render_results(snapshot: DataSnapshot, query: str, offset: int) -> Tuple[List[InlineQueryResultArticle], Optional[str]]:
+    """Articles of the practices matching `query` from `offset`, and the offset of the next batch if any"""
+    with tracing.span("search", "practices"):
+        matches = index_for(snapshot).search(query)
+    batch = matches[offset:offset + INLINE_RESULTS]
+    next_offset = str(offset + INLINE_RESULTS) if offset + INLINE_RESULTS < len(matches) else None
+    return [_article(snapshot, practice) for practice in batch], next_offset
+
+async def inline_query_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Answer "@bot <words>" in any chat with the matching practices, sent as their full text when picked"""
+    query = update.inline_query
+    try:
+        try:
+            offset = max(int(query.offset or 0), 0)
+        except ValueError:
+            offset = 0
+        text = normalize(query.query)
+        logger.debug("User %s searching practices inline: %s", update.effective_user.id, text)
+        snapshot = await db.fetch_db()
+        results, next_offset = inline_cache.get_or_render(
+            "inline_practices", (text, offset), snapshot.version, lambda: render_results(snapshot, text, offset))
+        # With nothing found, offer to open the bot and browse the categories instead
+        button = None if results or offset else InlineQueryResultsButton(textjson.inline.open_bot,
+                                                                         start_parameter="search")
+        await query.answer(results, cache_time=INLINE_CACHE_TIME, next_offset=next_offset, button=button)
+    except Exception as e:
+        logger.error(f"Error in inline_query_handler: {str(e)}", exc_info=True)
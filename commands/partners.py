@@ -1,24 +1,44 @@
-import db
-from telegram import Update
+from typing import Optional, Tuple
+from telegram import Update, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from telegram.constants import ParseMode
 
+import db
 from logger import logger
-from config import PARTNERS_MENU, MAIN_MENU
+from config import PARTNERS_MENU, MAIN_MENU, PAGE_SIZE
 from language import textjson
-from commands.system import back_button, go_back
+from pagination import navigation_row, page_of
+from render_cache import render
+from snapshot import DataSnapshot
+from commands.system import back_button, reply_with_pages
+
+def render_partners(snapshot: DataSnapshot, offset: int = 0) -> Optional[Tuple[str, Optional[InlineKeyboardMarkup]]]:
+    """Render the page of partners starting at `offset` and its page buttons, or None if there are no partners"""
+    if not snapshot.partners:
+        return None
+    page = page_of(snapshot.partners, offset, PAGE_SIZE)
+    parts = [textjson.partners.title]
+    for partner in page.items:
+        parts.append(f"<strong>{partner.get('name', '')}</strong>\n")
+        parts.append(f"{partner.get('description', '')}\n")
+        if partner.get('link'):
+            parts.append(f"<a href='{partner.get('link')}'>{textjson.partners.visit_link}</a>\n\n")
+        else:
+            parts.append("\n")
+    row = navigation_row("partners", "", page)
+    return "".join(parts), InlineKeyboardMarkup([row]) if row else None
+
+async def partners_page(key: str, offset: int) -> Optional[Tuple[str, Optional[InlineKeyboardMarkup]]]:
+    """Page of the partners starting at `offset`, or None if the offset is not one this bot sends"""
+    if offset % PAGE_SIZE:
+        return None
+    # Clamped before it becomes part of the cache key, so offsets past the end share the last page's entry
+    offset = page_of((await db.fetch_db()).partners, offset, PAGE_SIZE).offset
+    return await render("partners", offset, lambda snapshot: render_partners(snapshot, offset))
 
 async def handle_partners(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         text = update.message.text if update.message else None
-        logger.info(f"User {update.effective_chat.id} viewing partners, text: {text}")
-        
-        # Handle back button
-        if text == textjson.common.back_button or text == "Назад":
-            return await go_back(update, context)
-        elif text == textjson.common.main_menu_button:
-            from commands.system import return_to_main_menu
-            return await return_to_main_menu(update, context)
+        logger.info("User %s viewing partners, text: %s", update.effective_chat.id, text)
         
         # Store current state in navigation stack to enable going back
         if not context.user_data.get('nav_stack'):
@@ -28,23 +48,13 @@ async def handle_partners(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if not context.user_data['nav_stack'] or context.user_data['nav_stack'][-1] != MAIN_MENU:
             context.user_data['nav_stack'].append(MAIN_MENU)
         
-        partners = db.get_partners()
-        logger.debug(f"Retrieved {len(partners) if partners else 0} partners")
+        rendered = await partners_page("", 0)
         
-        if not partners:
+        if rendered is None:
             await update.message.reply_text(textjson.partners.no_info, reply_markup=back_button)
             return PARTNERS_MENU
         
-        response = textjson.partners.title
-        for partner in partners:
-            response += f"<strong>{partner.get('name', '')}</strong>\n"
-            response += f"{partner.get('description', '')}\n"
-            if partner.get('link'):
-                response += f"<a href='{partner.get('link')}'>{textjson.partners.visit_link}</a>\n\n"
-            else:
-                response += "\n"
-        
-        await update.message.reply_text(response, reply_markup=back_button, parse_mode=ParseMode.HTML, link_preview_options={"is_disabled": True})
+        await reply_with_pages(update, *rendered)
         return PARTNERS_MENU
     except Exception as e:
         logger.error(f"Error in handle_partners: {str(e)}", exc_info=True)
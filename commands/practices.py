@@ -1,16 +1,87 @@
 import db
+from typing import Optional, Tuple
 from telegram import Update, ReplyKeyboardMarkup, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
 
 from logger import logger
-from config import PRACTICES_MENU, PRACTICE_CATEGORY, PRACTICE_DETAIL, MAIN_MENU
+from audio_cache import audio_cache, practice_audio_url
+from config import PRACTICES_MENU, PRACTICE_CATEGORY, PRACTICE_DETAIL, MAIN_MENU, PRACTICES_PAGE_SIZE
 from language import textjson
-from commands.system import back_button, go_back
+from pagination import navigation_row, page_of, short_key
+from render_cache import render
+from snapshot import DataSnapshot
+from commands.system import back_button
+
+def render_categories_menu(snapshot: DataSnapshot) -> Optional[ReplyKeyboardMarkup]:
+    """Build the practice categories keyboard, or None if there are no practices"""
+    if not snapshot.practice_categories:
+        return None
+    keyboard = [[category + textjson.practices.category_suffix] for category in snapshot.practice_categories]
+    keyboard.append([textjson.common.back_button])
+    keyboard.append([textjson.common.main_menu_button])
+    return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+
+def render_category(snapshot: DataSnapshot, category: str, offset: int = 0) -> Optional[Tuple[str, InlineKeyboardMarkup]]:
+    """Render the page of a category listing starting at `offset` with its practice and page buttons, or None if it is empty"""
+    practices_data = snapshot.get_practices_by_category(category)
+    if not practices_data:
+        return None
+    page = page_of(practices_data, offset, PRACTICES_PAGE_SIZE)
+    
+    buttons = []
+    row = []
+    parts = [textjson.practices.category_header.format(category=category)]
+    for index, practice in enumerate(page.items, start=page.offset + 1):
+        title = practice.get("name", "")
+        description = practice.get('description', '')
+        parts.append(f"{index}. <strong>{title}</strong>\n")
+        if description:
+            parts.append(description + "\n")
+        
+        button = InlineKeyboardButton(str(index), callback_data=f"show_practice_{practice.get('id')}")
+        row.append(button)
+        
+        if len(row) == 2:
+            buttons.append(row)
+            row = []
+    
+    if row:
+        buttons.append(row)
+    navigation = navigation_row("practice_category", short_key(category), page)
+    if navigation:
+        buttons.append(navigation)
+    
+    parts.append(textjson.practices.select_practice)
+    return "".join(parts), InlineKeyboardMarkup(buttons)
+
+async def practice_category_page(key: str, offset: int) -> Optional[Tuple[str, InlineKeyboardMarkup]]:
+    """Page of the category with short_key `key`, or None if it no longer exists or the offset is not one this bot sends"""
+    if offset % PRACTICES_PAGE_SIZE:
+        return None
+    snapshot = await db.fetch_db()
+    category = snapshot.practice_category_by_key.get(key)
+    if category is None:
+        return None
+    # Clamped before it becomes part of the cache key, so offsets past the end share the last page's entry
+    offset = page_of(snapshot.get_practices_by_category(category), offset, PRACTICES_PAGE_SIZE).offset
+    return await render("practice_category", (category, offset),
+                        lambda snapshot: render_category(snapshot, category, offset))
+
+def render_practice(snapshot: DataSnapshot, practice_id: int) -> Optional[str]:
+    """Render the practice detail text, or None if the practice does not exist"""
+    practice = snapshot.get_practice(practice_id)
+    if not practice:
+        return None
+    name = f"<strong>{practice.get('name', '')}{textjson.practices.category_suffix}</strong>\n\n"
+    content = name + practice.get("content", "")
+    if practice.get("author"):
+        content += f"\n\n{textjson.practices.author.format(author=practice.get('author'))}"
+    return content
 
 async def handle_practices(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
-        logger.info(f"User {update.effective_chat.id} accessing practices")
+        logger.info("User %s accessing practices", update.effective_chat.id)
         
         # Store current state in navigation stack to enable going back
         if not context.user_data.get('nav_stack'):
@@ -20,24 +91,12 @@ async def handle_practices(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if not context.user_data['nav_stack'] or context.user_data['nav_stack'][-1] != MAIN_MENU:
             context.user_data['nav_stack'].append(MAIN_MENU)
             
-        categories = db.get_practice_categories()
-        logger.debug(f"Retrieved {len(categories) if categories else 0} practice categories")
+        markup = await render("practice_categories", None, render_categories_menu)
         
-        if not categories:
+        if markup is None:
             await update.message.reply_text(textjson.practices.no_info, reply_markup=back_button)
             return PRACTICES_MENU
         
-        keyboard = []
-        logger.info(f"Categories: {categories}")
-        for category in categories:
-            keyboard.append([category + textjson.practices.category_suffix])
-        keyboard.append([textjson.common.back_button])
-        keyboard.append([textjson.common.main_menu_button])
-        markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
-        
-        # Store categories for later use
-        context.user_data['practice_categories'] = categories
-        
         await update.message.reply_text(textjson.practices.select_category, reply_markup=markup)
         return PRACTICES_MENU
     except Exception as e:
@@ -48,20 +107,13 @@ async def handle_practices(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def practices_menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         text = update.message.text
-        logger.info(f"User {update.effective_chat.id} selected in practices menu: {text}")
-        
-        if text == textjson.common.back_button or text == "Назад":
-            return await go_back(update, context)
-        elif text == textjson.common.main_menu_button:
-            from commands.system import return_to_main_menu
-            return await return_to_main_menu(update, context)
+        logger.info("User %s selected in practices menu: %s", update.effective_chat.id, text)
         
         # Remove emoji if present
         text = text.split(textjson.practices.category_suffix)[0] if textjson.practices.category_suffix in text else text
         
-        categories = context.user_data.get('practice_categories', [])
-        if text not in categories:
-            logger.warning(f"Practice category not found: {text}")
+        if not await db.get_practices_by_category(text):
+            logger.warning("Practice category not found: %s", text)
             await update.message.reply_text(textjson.common.fallback, reply_markup=back_button)
             return PRACTICES_MENU
         
@@ -80,41 +132,20 @@ async def show_practice_category(update: Update, context: ContextTypes.DEFAULT_T
         if not category:
             category = context.user_data.get('current_category')
             if not category:
-                logger.warning(f"No category found for user {update.effective_chat.id}")
+                logger.warning("No category found for user %s", update.effective_chat.id)
                 await update.message.reply_text(textjson.common.unknown_state, reply_markup=back_button)
                 return PRACTICE_CATEGORY
         
-        logger.info(f"User {update.effective_chat.id} viewing category: {category}")
-        practices_data = db.get_practices_by_category(category)
-        logger.debug(f"Retrieved {len(practices_data) if practices_data else 0} practices for category {category}")
+        logger.info("User %s viewing category: %s", update.effective_chat.id, category)
+        rendered = await render("practice_category", (category, 0), lambda snapshot: render_category(snapshot, category))
         
-        if not practices_data:
+        if rendered is None:
             await update.message.reply_text(textjson.practices.no_practices.format(category=category), reply_markup=back_button)
             return PRACTICE_CATEGORY
         
-        buttons = []
-        row = []
-        response = textjson.practices.category_header.format(category=category)
-        for index, practice in enumerate(practices_data, start=1):
-            title = practice.get("name", "")
-            description = practice.get('description', '')
-            response += f"{index}. <strong>{title}</strong>\n"
-            response += f"{(description + '\n') if description else ''}"
-            
-            button = InlineKeyboardButton(str(index), callback_data=f"show_practice_{practice.get('id')}")
-            row.append(button)
-            
-            if len(row) == 2:
-                buttons.append(row)
-                row = []
-        
-        if row:
-            buttons.append(row)
-        
-        inline_markup = InlineKeyboardMarkup(buttons)
+        response, inline_markup = rendered
         context.user_data['current_category'] = category
         
-        response += textjson.practices.select_practice
         await update.message.reply_text(response, reply_markup=inline_markup, parse_mode=ParseMode.HTML)
         
         # Send a message with the back button after the inline keyboard message
@@ -130,29 +161,25 @@ async def show_practice_detail(update: Update, context: ContextTypes.DEFAULT_TYP
     try:
         practice_id = context.user_data.get('current_practice_id')
         if not practice_id:
-            logger.warning(f"No practice ID found for user {update.effective_chat.id}")
+            logger.warning("No practice ID found for user %s", update.effective_chat.id)
             await update.message.reply_text(textjson.common.unknown_state, reply_markup=back_button)
             return PRACTICE_CATEGORY
             
-        practices_data = db.get_practices()
-        practice = next((p for p in practices_data if p.get("id") == practice_id), None)
+        practice = await db.get_practice(practice_id)
         
         if not practice:
-            logger.warning(f"Practice not found with ID: {practice_id}")
+            logger.warning("Practice not found with ID: %s", practice_id)
             await update.message.reply_text(textjson.practices.practice_not_found, reply_markup=back_button)
             return PRACTICE_CATEGORY
             
-        name = practice.get("name", "")
-        name = f"<strong>{name}{textjson.practices.category_suffix}</strong>\n\n"
-        content = name + practice.get("content", "")
-        if practice.get("author"):
-            content += f"\n\n{textjson.practices.author.format(author=practice.get('author'))}"
+        content = await render("practice", practice_id, lambda snapshot: render_practice(snapshot, practice_id))
             
         await update.message.reply_text(content, reply_markup=back_button, parse_mode=ParseMode.HTML)
         
         # NEW: if practice has an audio url, send the audio and store its message id
-        if practice.get("audio") and practice["audio"].get("url"):
-            audio_message = await update.message.reply_audio(audio=practice["audio"]["url"])
+        audio_url = practice_audio_url(practice)
+        if audio_url:
+            audio_message = await audio_cache.send(context.bot, update.effective_chat.id, practice_id, audio_url)
             context.user_data["practice_audio_message_id"] = audio_message.message_id
 
         return PRACTICE_DETAIL
@@ -167,29 +194,21 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await query.answer()
         data = query.data
         
-        logger.info(f"User {update.effective_chat.id} clicked button: {data}")
+        logger.info("User %s clicked button: %s", update.effective_chat.id, data)
         
         if data.startswith('show_practice_'):
             try:
                 practice_id = int(data.split('_')[-1])
-                logger.debug(f"Showing practice with ID: {practice_id}")
+                logger.debug("Showing practice with ID: %s", practice_id)
             except ValueError:
                 logger.error(f"Invalid practice ID format: {data}")
                 await query.edit_message_text(text=textjson.practices.practice_error)
                 return PRACTICE_CATEGORY
             
-            practices_data = db.get_practices()
-            practice = next(
-                (p for p in practices_data if p.get("id") == practice_id),
-                None
-            )
+            practice = await db.get_practice(practice_id)
             
             if practice:
-                name = practice.get("name", "")
-                name = f"<strong>{name}{textjson.practices.category_suffix}</strong>\n\n"
-                content = name + practice.get("content", "")
-                if practice.get("author"):
-                    content += f"\n\n{textjson.practices.author.format(author=practice.get('author'))}"
+                content = await render("practice", practice_id, lambda snapshot: render_practice(snapshot, practice_id))
                 
                 # Push current state to navigation stack
                 if not context.user_data.get('nav_stack'):
@@ -200,11 +219,9 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 await query.edit_message_text(text=content, parse_mode=ParseMode.HTML)
                 
                 # NEW: if practice has an audio url, send the audio and store its message id
-                if practice.get("audio") and practice["audio"].get("url"):
-                    audio_message = await context.bot.send_audio(
-                        chat_id=update.effective_chat.id,
-                        audio=practice["audio"]["url"]
-                    )
+                audio_url = practice_audio_url(practice)
+                if audio_url:
+                    audio_message = await audio_cache.send(context.bot, update.effective_chat.id, practice_id, audio_url)
                     context.user_data["practice_audio_message_id"] = audio_message.message_id
 
                 # Send a new message with back button
@@ -215,7 +232,7 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 # )
                 return PRACTICE_DETAIL
             else:
-                logger.warning(f"Practice not found with ID: {practice_id}")
+                logger.warning("Practice not found with ID: %s", practice_id)
                 await query.edit_message_text(text=textjson.practices.practice_not_found)
                 return PRACTICE_CATEGORY
     except Exception as e:
@@ -233,13 +250,7 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def practice_detail_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         text = update.message.text
-        logger.info(f"User {update.effective_chat.id} in practice detail: {text}")
-        
-        if text == textjson.common.back_button or text == "Назад":
-            return await go_back(update, context)
-        elif text == textjson.common.main_menu_button:
-            from commands.system import return_to_main_menu
-            return await return_to_main_menu(update, context)
+        logger.info("User %s in practice detail: %s", update.effective_chat.id, text)
         
         await update.message.reply_text(textjson.common.navigation_hint, reply_markup=back_button)
         return PRACTICE_DETAIL
@@ -1,35 +1,147 @@
-import db
-from telegram import Update
+from typing import Dict, List, Optional, Tuple
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from telegram.constants import ParseMode
 
+import db
 from logger import logger
-from config import FIND_PSYCHOLOGIST, MAIN_MENU
+from config import FIND_PSYCHOLOGIST, MAIN_MENU, PAGE_SIZE, PSYCHOLOGIST_PRICE_BANDS, PSYCHOLOGIST_SPECIALTY_BUTTONS
 from language import textjson
-from commands.system import back_button, go_back
+from pagination import navigation_row, page_callback, page_of, short_key
+from psychologist_index import parse_price
+from render_cache import render
+from snapshot import DataSnapshot
+from commands.system import back_button, reply_with_pages
+
+def _format_amount(num: int) -> str:
+    return "{:,}".format(num).replace(",", " ") + "₸"
 
 def format_price(price) -> str:
-    try:
-        num = int(price)
-    except (ValueError, TypeError):
-        logger.debug(f"Invalid price format: {price}")
-        return textjson.psychologists.price_unknown
-    if num == 0:
+    num = parse_price(price)
+    if num is None:
+        logger.debug("Invalid or unset price: %s", price)
         return textjson.psychologists.price_unknown
-    str_price = "{:,}".format(num).replace(",", " ") + "₸"
-    return str_price
+    return _format_amount(num)
+
+def price_band(band: int) -> Tuple[Optional[int], Optional[int]]:
+    """[low, high) bounds of price band `band`; band 0 is any price"""
+    if band == 0:
+        return None, None
+    low = PSYCHOLOGIST_PRICE_BANDS[band - 2] if band > 1 else None
+    high = PSYCHOLOGIST_PRICE_BANDS[band - 1] if band <= len(PSYCHOLOGIST_PRICE_BANDS) else None
+    return low, high
+
+def _band_label(band: int) -> str:
+    low, high = price_band(band)
+    if low is None and high is None:
+        return textjson.psychologists.all_prices
+    if low is None:
+        return textjson.psychologists.price_under.format(high=_format_amount(high))
+    if high is None:
+        return textjson.psychologists.price_from.format(low=_format_amount(low))
+    return textjson.psychologists.price_between.format(low=_format_amount(low), high=_format_amount(high))
+
+def filter_key(specialty: Optional[str], band: int) -> str:
+    """Page callback key of a filter: the specialty's short_key (empty for any) and the price band.
+
+    The empty key, as in page buttons sent before filters existed, is the unfiltered listing.
+    """
+    if specialty is None and band == 0:
+        return ""
+    return f"{short_key(specialty) if specialty is not None else ''}.{band}"
+
+def parse_filter_key(key: str) -> Optional[Tuple[str, int]]:
+    """(specialty short_key or "", band) from a filter key, or None if the band is not one of the price bands"""
+    specialty, _, band = key.partition(".")
+    try:
+        band = int(band or 0)
+    except ValueError:
+        return None
+    if not 0 <= band <= len(PSYCHOLOGIST_PRICE_BANDS) + 1:
+        return None
+    return specialty, band
+
+def _filter_buttons(snapshot: DataSnapshot, specialty: Optional[str], band: int) -> List[List[InlineKeyboardButton]]:
+    """Specialty and price band buttons; the chosen ones are marked and pressing one again clears it"""
+    def button(label: str, chosen: bool, key: str) -> InlineKeyboardButton:
+        if chosen:
+            label = textjson.psychologists.selected.format(label=label)
+        return InlineKeyboardButton(label, callback_data=page_callback("psychologists", key, 0))
+
+    specialties = snapshot.psychologist_index.specialties[:PSYCHOLOGIST_SPECIALTY_BUTTONS]
+    buttons = [button(textjson.psychologists.all_specialties, specialty is None, filter_key(None, band))]
+    for label in specialties:
+        chosen = label == specialty
+        buttons.append(button(label, chosen, filter_key(None if chosen else label, band)))
+    rows = [buttons[i:i + 2] for i in range(0, len(buttons), 2)]
+    bands = [button(_band_label(b), b == band, filter_key(specialty, 0 if b == band else b))
+             for b in range(len(PSYCHOLOGIST_PRICE_BANDS) + 2)]
+    rows.extend(bands[i:i + 3] for i in range(0, len(bands), 3))
+    return rows
+
+def render_psychologists(snapshot: DataSnapshot, specialty: Optional[str] = None, band: int = 0,
+                         offset: int = 0) -> Optional[Tuple[str, InlineKeyboardMarkup]]:
+    """Render the page of psychologists matching the filter starting at `offset` with the filter and page
+    buttons, or None if there are no psychologists at all"""
+    if not snapshot.psychologists:
+        return None
+    low, high = price_band(band)
+    matches = snapshot.psychologist_index.search(specialty, low, high)
+    key = filter_key(specialty, band)
+    rows = _filter_buttons(snapshot, specialty, band)
+    if not matches:
+        return textjson.psychologists.no_results, InlineKeyboardMarkup(rows)
+    page = page_of(matches, offset, PAGE_SIZE)
+    parts = []
+    if key:
+        parts.append(f"<i>{textjson.psychologists.found.format(count=page.total)}</i>\n\n")
+    for psychologist in page.items:
+        instagram_link = psychologist.get("instagram", "")
+        if instagram_link.startswith('@'):
+            instagram_link = instagram_link[1:]
+        instagram_link = f"https://instagram.com/{instagram_link}"
+            
+        parts.append(f"<strong>{psychologist.get('name', '')}{textjson.psychologists.title_suffix}</strong>\r\n")
+        parts.append(f"{textjson.psychologists.specialty.format(specialty=psychologist.get('specialty', ''))}\r\n")
+        parts.append(f"{textjson.psychologists.price.format(price=format_price(psychologist.get('price')))}\r\n")
+        
+        # Fix the string formatting
+        phone = psychologist.get("contacts", {}).get("phone", "")
+        parts.append(f"{textjson.psychologists.phone.format(phone=f'<a href=\"tel:{phone}\">{phone}</a>')}\r\n")
+        parts.append(f"<a href='{instagram_link}'>Instagram 📱</a>\n\n")
+    row = navigation_row("psychologists", key, page)
+    if row:
+        rows.append(row)
+    return "".join(parts), InlineKeyboardMarkup(rows)
+
+def _specialty_keys(snapshot: DataSnapshot) -> Dict[str, str]:
+    return {short_key(label): label for label in snapshot.psychologist_index.specialties}
+
+async def psychologists_page(key: str, offset: int) -> Optional[Tuple[str, InlineKeyboardMarkup]]:
+    """Page of the psychologists matching filter `key`, or None if the filter or offset is not one this bot sends.
+
+    Callback data comes from the client, so everything in it is checked before
+    it becomes part of a render cache key; a specialty no longer in the
+    directory is rejected as well.
+    """
+    parsed = parse_filter_key(key)
+    if parsed is None or offset % PAGE_SIZE:
+        return None
+    specialty_key, band = parsed
+    specialty = None
+    if specialty_key:
+        specialty = (await render("psychologist_specialties", None, _specialty_keys)).get(specialty_key)
+        if specialty is None:
+            return None
+    # Clamped so offsets past the end share the last page's entry
+    snapshot = await db.fetch_db()
+    offset = page_of(snapshot.psychologist_index.search(specialty, *price_band(band)), offset, PAGE_SIZE).offset
+    return await render("psychologists", (specialty, band, offset),
+                        lambda snapshot: render_psychologists(snapshot, specialty, band, offset))
 
 async def handle_find_psychologist(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         text = update.message.text if update.message else None
-        logger.info(f"User {update.effective_chat.id} searching for psychologists, text: {text}")
-        
-        # Handle back button
-        if text == textjson.common.back_button or text == "Назад":
-            return await go_back(update, context)
-        elif text == textjson.common.main_menu_button:
-            from commands.system import return_to_main_menu
-            return await return_to_main_menu(update, context)
+        logger.info("User %s searching for psychologists, text: %s", update.effective_chat.id, text)
         
         # Store current state in navigation stack to enable going back
         if not context.user_data.get('nav_stack'):
@@ -39,33 +151,13 @@ async def handle_find_psychologist(update: Update, context: ContextTypes.DEFAULT
         if not context.user_data['nav_stack'] or context.user_data['nav_stack'][-1] != MAIN_MENU:
             context.user_data['nav_stack'].append(MAIN_MENU)
         
-        psychologists = db.get_psychologists()
-        logger.debug(f"Retrieved {len(psychologists) if psychologists else 0} psychologists")
+        rendered = await psychologists_page("", 0)
         
-        if not psychologists:
+        if rendered is None:
             await update.message.reply_text(textjson.psychologists.no_info, reply_markup=back_button)
             return FIND_PSYCHOLOGIST
         
-        response = ""
-        for psychologist in psychologists:
-            instagram_link = psychologist.get("instagram", "")
-            if instagram_link.startswith('@'):
-                instagram_link = instagram_link[1:]
-            instagram_link = f"https://instagram.com/{instagram_link}"
-            
-            if psychologist.get("price", 0) == 0:
-                psychologist["price"] = textjson.psychologists.price_unknown
-                
-            response += f"<strong>{psychologist.get('name', '')}{textjson.psychologists.title_suffix}</strong>\r\n"
-            response += f"{textjson.psychologists.specialty.format(specialty=psychologist.get('specialty', ''))}\r\n"
-            response += f"{textjson.psychologists.price.format(price=format_price(psychologist.get('price')))}\r\n"
-            
-            # Fix the string formatting
-            phone = psychologist.get("contacts", {}).get("phone", "")
-            response += f"{textjson.psychologists.phone.format(phone=f'<a href=\"tel:{phone}\">{phone}</a>')}\r\n"
-            response += f"<a href='{instagram_link}'>Instagram 📱</a>\n\n"
-        
-        await update.message.reply_text(response, reply_markup=back_button, parse_mode=ParseMode.HTML, link_preview_options={"is_disabled": True})
+        await reply_with_pages(update, *rendered)
         return FIND_PSYCHOLOGIST
     except Exception as e:
         logger.error(f"Error in handle_find_psychologist: {str(e)}", exc_info=True)
@@ -0,0 +1,119 @@
+import functools
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from telegram import Update, InlineKeyboardMarkup
+from telegram.constants import ParseMode
+from telegram.error import BadRequest
+from telegram.ext import ContextTypes
+
+from logger import logger
+from pagination import parse_page_callback
+from router import Callback, StateRouter
+from config import MAIN_MENU, UNIVERSITY_MENU, FIND_PSYCHOLOGIST, PRACTICES_MENU, PRACTICE_CATEGORY, PRACTICE_DETAIL, CONTACTS_MENU, REPORT_ISSUE, PARTNERS_MENU, SEARCH
+from language import textjson
+from commands.system import main_menu_handler, handle_report_issue, report_issue_handler, go_back, return_to_main_menu, back_targets
+from commands.universities import handle_university_info, university_menu_handler
+from commands.practices import handle_practices, practices_menu_handler, show_practice_category, show_practice_detail, practice_detail_handler
+from commands.practices import practice_category_page
+from commands.psychologists import handle_find_psychologist, psychologists_page
+from commands.contacts import handle_contacts
+from commands.partners import handle_partners, partners_page
+from commands.search import handle_search, search_query_handler, back_to_search
+
+def from_main_menu(handler: Callback) -> Callback:
+    """Open a section from the main menu, so going back returns there"""
+    @functools.wraps(handler)
+    async def open_section(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        context.user_data['nav_stack'] = [MAIN_MENU]
+        return await handler(update, context)
+    return open_section
+
+async def back_to_category(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # Return to the last opened category, or to the category list if there is none
+    category = context.user_data.get('current_category')
+    if category:
+        return await show_practice_category(update, context, category)
+    return await handle_practices(update, context)
+
+# Label of each state in metrics
+state_names: Dict[int, str] = {
+    MAIN_MENU: "main_menu",
+    UNIVERSITY_MENU: "university_menu",
+    FIND_PSYCHOLOGIST: "find_psychologist",
+    CONTACTS_MENU: "contacts_menu",
+    PRACTICES_MENU: "practices_menu",
+    PRACTICE_CATEGORY: "practice_category",
+    PRACTICE_DETAIL: "practice_detail",
+    REPORT_ISSUE: "report_issue",
+    PARTNERS_MENU: "partners_menu",
+    SEARCH: "search",
+}
+
+def section_router(state: int, default: Callback) -> StateRouter:
+    """Router for a section state: the back and main menu buttons, everything else to `default`"""
+    return StateRouter(default, {
+        textjson.common.back_button: go_back,
+        textjson.common.main_menu_button: return_to_main_menu,
+    }, state=state_names[state])
+
+state_routers: Dict[int, StateRouter] = {
+    MAIN_MENU: StateRouter(main_menu_handler, {
+        textjson.main_menu.university: from_main_menu(handle_university_info),
+        textjson.main_menu.psychologist: from_main_menu(handle_find_psychologist),
+        textjson.main_menu.practices: from_main_menu(handle_practices),
+        textjson.main_menu.search: from_main_menu(handle_search),
+        textjson.main_menu.contacts: from_main_menu(handle_contacts),
+        textjson.main_menu.partners: from_main_menu(handle_partners),
+        textjson.main_menu.report_issue: from_main_menu(handle_report_issue),
+    }, state=state_names[MAIN_MENU], first_word=True),
+    UNIVERSITY_MENU: section_router(UNIVERSITY_MENU, university_menu_handler),
+    FIND_PSYCHOLOGIST: section_router(FIND_PSYCHOLOGIST, handle_find_psychologist),
+    CONTACTS_MENU: section_router(CONTACTS_MENU, go_back),
+    PRACTICES_MENU: section_router(PRACTICES_MENU, practices_menu_handler),
+    PRACTICE_CATEGORY: section_router(PRACTICE_CATEGORY, go_back),
+    PRACTICE_DETAIL: section_router(PRACTICE_DETAIL, practice_detail_handler),
+    REPORT_ISSUE: section_router(REPORT_ISSUE, report_issue_handler),
+    PARTNERS_MENU: section_router(PARTNERS_MENU, handle_partners),
+    SEARCH: section_router(SEARCH, search_query_handler),
+}
+
+back_targets.update({
+    UNIVERSITY_MENU: handle_university_info,
+    PRACTICES_MENU: handle_practices,
+    PRACTICE_CATEGORY: back_to_category,
+    FIND_PSYCHOLOGIST: handle_find_psychologist,
+    PRACTICE_DETAIL: show_practice_detail,
+    CONTACTS_MENU: handle_contacts,
+    PARTNERS_MENU: handle_partners,
+    SEARCH: back_to_search,
+})
+
+# Page renderers of the paginated listings by view name, as used in page callback data
+Pager = Callable[[str, int], Awaitable[Optional[Tuple[str, Optional[InlineKeyboardMarkup]]]]]
+pagers: Dict[str, Pager] = {
+    "psychologists": psychologists_page,
+    "partners": partners_page,
+    "practice_category": practice_category_page,
+}
+
+async def page_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show another page of a listing by editing its message in place; the conversation state does not change"""
+    query = update.callback_query
+    try:
+        parsed = parse_page_callback(query.data)
+        pager = pagers.get(parsed[0]) if parsed else None
+        rendered = await pager(parsed[1], parsed[2]) if pager else None
+        await query.answer()
+        if rendered is None:
+            logger.warning("Page not found for callback: %s", query.data)
+            return
+        text, markup = rendered
+        try:
+            await query.edit_message_text(text, reply_markup=markup, parse_mode=ParseMode.HTML,
+                                          link_preview_options={"is_disabled": True})
+        except BadRequest as e:
+            # The page counter shows the page already on screen
+            if "not modified" not in str(e):
+                raise
+    except Exception as e:
+        logger.error(f"Error in page_handler: {str(e)}", exc_info=True)
@@ -0,0 +1,100 @@
+import html
+from typing import Optional, Tuple
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import ContextTypes
+
+import metrics
+from logger import logger
+from config import SEARCH, SEARCH_RESULTS, PRACTICE_DETAIL
+from language import textjson
+import db
+from render_cache import RenderCache
+from snapshot import DataSnapshot
+from text_search import ContentSearchIndex, index_for, snippet, terms
+from commands.system import back_button, reply_with_pages
+from commands.practices import button_handler
+
+# Longer messages are cut; the query is repeated in the results header
+MAX_QUERY_LENGTH = 200
+
+# Results per typed query; kept apart from the menu renders so the long tail of queries cannot evict those
+search_cache = RenderCache(max_entries=4096)
+metrics.registry.gauge("bot_search_cache_hit_ratio", "Share of searches answered from cache",
+                       function=lambda: search_cache.get_stats()["hit_ratio"])
+
+def render_results(snapshot: DataSnapshot, index: ContentSearchIndex,
+                   query: str) -> Optional[Tuple[str, Optional[InlineKeyboardMarkup]]]:
+    """Render the best matches for `query` with buttons opening the practices among them, or None if nothing matches"""
+    hits = index.search(query, SEARCH_RESULTS)
+    if not hits:
+        return None
+    query_terms = set(terms(query))
+    university_names = {university.get("id"): university.get("name", "") for university in snapshot.universities}
+    parts = [textjson.search.results_header.format(query=html.escape(query))]
+    buttons = []
+    for number, hit in enumerate(hits, start=1):
+        record = hit.record
+        if hit.kind == "practice":
+            parts.append(f"{number}. {textjson.search.practice_label}: <strong>{record.get('name', '')}</strong>\n")
+            parts.append(f"{snippet(record.get('content', ''), query_terms)}\n\n")
+            buttons.append(InlineKeyboardButton(str(number), callback_data=f"show_practice_{record.get('id')}"))
+        elif hit.kind == "university":
+            parts.append(f"{number}. <strong>{record.get('name', '')}</strong>{textjson.universities.university_suffix}\n")
+            parts.append(f"{snippet(record.get('description', ''), query_terms)}\n\n")
+        else:
+            university = university_names.get(record.get("universityId"), "")
+            parts.append(f"{number}. {textjson.search.event_label}: <strong>{record.get('title', '')}</strong>\n")
+            parts.append(f"<i>{textjson.search.event_of.format(university=university, date=record.get('date', ''))}</i>\n")
+            parts.append(f"{snippet(record.get('description', ''), query_terms)}\n")
+            if record.get("link"):
+                parts.append(f"<a href='{record.get('link')}'>{textjson.universities.event_link}</a>\n")
+            parts.append("\n")
+    if not buttons:
+        return "".join(parts), None
+    parts.append(textjson.search.select_practice)
+    return "".join(parts), InlineKeyboardMarkup([buttons[i:i + 4] for i in range(0, len(buttons), 4)])
+
+async def show_results(update: Update, context: ContextTypes.DEFAULT_TYPE, query: str):
+    snapshot = await db.fetch_db()
+    index = await index_for(snapshot)
+    # Keyed by the index version too, so results of a previous index are not served once the current one is ready
+    rendered = search_cache.get_or_render("search", (query, index.version), snapshot.version,
+                                          lambda: render_results(snapshot, index, query))
+    if rendered is None:
+        await update.message.reply_text(textjson.search.no_results.format(query=query), reply_markup=back_button)
+        return SEARCH
+    await reply_with_pages(update, *rendered)
+    return SEARCH
+
+async def handle_search(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Ask what to search for"""
+    context.user_data.pop('search_query', None)
+    await update.message.reply_text(textjson.search.prompt, reply_markup=back_button)
+    return SEARCH
+
+async def search_query_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        query = " ".join(update.message.text.split())[:MAX_QUERY_LENGTH]
+        logger.info("User %s searching for: %s", update.effective_chat.id, query)
+        # Kept so going back from a practice shows these results again
+        context.user_data['search_query'] = query
+        return await show_results(update, context, query)
+    except Exception as e:
+        logger.error(f"Error in search_query_handler: {str(e)}", exc_info=True)
+        await update.message.reply_text(textjson.common.error_generic, reply_markup=back_button)
+        return SEARCH
+
+async def back_to_search(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # Return to the last results, or to the prompt if there are none
+    query = context.user_data.get('search_query')
+    if query:
+        return await show_results(update, context, query)
+    return await handle_search(update, context)
+
+async def open_found_practice(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Open a practice from the results; going back from it returns to the results rather than to a category"""
+    state = await button_handler(update, context)
+    if state != PRACTICE_DETAIL:
+        return SEARCH
+    context.user_data['nav_stack'][-1] = SEARCH
+    return state
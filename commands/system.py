@@ -1,12 +1,20 @@
 import db
+import users
+import time
 import traceback
+import metrics
+from typing import Awaitable, Callable, Dict, Optional
 from telegram import Update, ReplyKeyboardMarkup, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler
 from telegram.constants import ParseMode
 from telegram.error import TimedOut, NetworkError, RetryAfter, BadRequest
 
 from logger import logger
-from config import last_practice_ids, MAIN_MENU, UNIVERSITY_MENU, FIND_PSYCHOLOGIST, PRACTICES_MENU,PRACTICE_CATEGORY, PRACTICE_DETAIL, CONTACTS_MENU, REPORT_ISSUE, PARTNERS_MENU
+from outbox import outbox
+from render_cache import render_cache
+from audio_cache import audio_cache
+from storage import storage
+from config import MAIN_MENU, REPORT_ISSUE
 from language import textjson
 
 
@@ -15,6 +23,7 @@ start_menu = ReplyKeyboardMarkup([
     [textjson.main_menu.university],
     [textjson.main_menu.psychologist],
     [textjson.main_menu.practices],
+    [textjson.main_menu.search],
     [textjson.main_menu.contacts],
     [textjson.main_menu.partners],
     [textjson.main_menu.report_issue]
@@ -25,16 +34,31 @@ back_button = ReplyKeyboardMarkup([
     [textjson.common.main_menu_button]
 ], resize_keyboard=True)
 
+async def reply_with_pages(update: Update, text: str, pages: Optional[InlineKeyboardMarkup]) -> None:
+    """Reply with the first page of a listing.
+
+    A single page keeps the back button keyboard on the same message; a
+    message can carry only one keyboard, so the page buttons of a longer
+    listing come with it and the back button follows in a second message.
+    """
+    if pages is None:
+        await update.message.reply_text(text, reply_markup=back_button, parse_mode=ParseMode.HTML,
+                                        link_preview_options={"is_disabled": True})
+        return
+    await update.message.reply_text(text, reply_markup=pages, parse_mode=ParseMode.HTML,
+                                    link_preview_options={"is_disabled": True})
+    await update.message.reply_text(textjson.common.navigation_hint, reply_markup=back_button)
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    logger.info(f"User {update.effective_chat.id} started the bot")
+    logger.info("User %s started the bot", update.effective_chat.id)
     try:
-        db.add_user(update.effective_chat.id)
+        await users.registry.add(update.effective_chat.id)
         # Store an empty navigation stack in user_data
         context.user_data['nav_stack'] = []
         
         # Get the start text from the database
-        text = db.get_start_text()
-        logger.debug(f"Retrieved start text: {text[:20]}...")
+        text = await db.get_start_text()
+        logger.debug("Retrieved start text: %s...", text[:20])
             
         await update.message.reply_text(text, reply_markup=start_menu)
         return MAIN_MENU
@@ -44,55 +68,29 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return ConversationHandler.END
 
 async def main_menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle text messages from the main menu"""
+    """Handle main menu text that is not one of the menu buttons"""
     try:
-        text = update.message.text.split(" ")[0]  # Remove emoji if present
-        logger.info(f"User {update.effective_chat.id} selected from main menu: {text}")
-        
-        # Reset navigation stack when at main menu
+        logger.warning("User %s sent unexpected text: %s", update.effective_chat.id, update.message.text)
         context.user_data['nav_stack'] = []
-        
-        if text == "Узнать":
-            # Import here to avoid circular imports
-            from commands.universities import handle_university_info
-            context.user_data['nav_stack'].append(MAIN_MENU)
-            return await handle_university_info(update, context)
-        elif text == "Найти":
-            from commands.psychologists import handle_find_psychologist
-            context.user_data['nav_stack'].append(MAIN_MENU)
-            return await handle_find_psychologist(update, context)
-        elif text == "Практики":
-            from commands.practices import handle_practices
-            context.user_data['nav_stack'].append(MAIN_MENU)
-            return await handle_practices(update, context)
-        elif text == "Контакты":
-            from commands.contacts import handle_contacts
-            context.user_data['nav_stack'].append(MAIN_MENU)
-            return await handle_contacts(update, context)
-        elif text == "Наши":
-            from commands.partners import handle_partners
-            context.user_data['nav_stack'].append(MAIN_MENU)
-            return await handle_partners(update, context)
-        elif text == "Сообщить":
-            context.user_data['nav_stack'].append(MAIN_MENU)
-            await update.message.reply_text(
-                textjson.report_issue.prompt,
-                reply_markup=back_button
-            )
-            return REPORT_ISSUE
-        else:
-            logger.warning(f"User {update.effective_chat.id} sent unexpected text: {text}")
-            await update.message.reply_text(textjson.common.select_option, reply_markup=start_menu)
-            return MAIN_MENU
+        await update.message.reply_text(textjson.common.select_option, reply_markup=start_menu)
+        return MAIN_MENU
     except Exception as e:
         logger.error(f"Error in main menu handler: {str(e)}", exc_info=True)
         await update.message.reply_text(textjson.common.error_generic, reply_markup=start_menu)
         return MAIN_MENU
 
+async def handle_report_issue(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Ask the user to describe the problem"""
+    await update.message.reply_text(textjson.report_issue.prompt, reply_markup=back_button)
+    return REPORT_ISSUE
+
+# Handler that re-opens each state when going back to it; filled in by commands.routes
+back_targets: Dict[int, Callable[[Update, ContextTypes.DEFAULT_TYPE], Awaitable[int]]] = {}
+
 async def go_back(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle going back to the previous state"""
     try:
-        logger.info(f"User {update.effective_chat.id} requested to go back")
+        logger.info("User %s requested to go back", update.effective_chat.id)
         
         # NEW: Delete practice audio message if it exists
         if "practice_audio_message_id" in context.user_data:
@@ -106,54 +104,29 @@ async def go_back(update: Update, context: ContextTypes.DEFAULT_TYPE):
             context.user_data.pop("practice_audio_message_id", None)
         
         nav_stack = context.user_data.get('nav_stack', [])
-        logger.debug(f"Navigation stack: {nav_stack}")
+        logger.debug("Navigation stack: %s", nav_stack)
         
         if not nav_stack:
             # If stack is empty, go to main menu
-            text = db.get_start_text()
+            text = await db.get_start_text()
             await update.message.reply_text(text, reply_markup=start_menu)
             return MAIN_MENU
         
         # Pop the last state from stack
         prev_state = nav_stack.pop()
-        logger.debug(f"Going back to state: {prev_state}")
+        logger.debug("Going back to state: %s", prev_state)
         
         # Navigate to previous state
         if prev_state == MAIN_MENU:
             await update.message.reply_text(textjson.common.go_to_main_menu, reply_markup=start_menu)
             return MAIN_MENU
-        elif prev_state == UNIVERSITY_MENU:
-            from commands.universities import handle_university_info
-            return await handle_university_info(update, context)
-        elif prev_state == PRACTICES_MENU:
-            from commands.practices import handle_practices
-            return await handle_practices(update, context)
-        elif prev_state == PRACTICE_CATEGORY:
-            from commands.practices import show_practice_category
-            # Get the category from user_data and return to that category
-            category = context.user_data.get('current_category')
-            if category:
-                return await show_practice_category(update, context, category)
-            else:
-                from commands.practices import handle_practices
-                return await handle_practices(update, context)
-        elif prev_state == FIND_PSYCHOLOGIST:
-            from commands.psychologists import handle_find_psychologist
-            return await handle_find_psychologist(update, context)
-        elif prev_state == PRACTICE_DETAIL:
-            from commands.practices import show_practice_detail
-            return await show_practice_detail(update, context)
-        elif prev_state == CONTACTS_MENU:
-            from commands.contacts import handle_contacts
-            return await handle_contacts(update, context)
-        elif prev_state == PARTNERS_MENU:
-            from commands.partners import handle_partners
-            return await handle_partners(update, context)
-        else:
+        target = back_targets.get(prev_state)
+        if target is None:
             # Default to main menu if state is unknown
-            logger.warning(f"Unknown previous state: {prev_state}, defaulting to main menu")
+            logger.warning("Unknown previous state: %s, defaulting to main menu", prev_state)
             await update.message.reply_text(textjson.common.unknown_state, reply_markup=start_menu)
             return MAIN_MENU
+        return await target(update, context)
     except Exception as e:
         logger.error(f"Error in go_back handler: {str(e)}", exc_info=True)
         await update.message.reply_text(textjson.common.error_generic, reply_markup=start_menu)
@@ -162,7 +135,7 @@ async def go_back(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def return_to_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle returning to the main menu from anywhere"""
     try:
-        logger.info(f"User {update.effective_chat.id} returning to main menu")
+        logger.info("User %s returning to main menu", update.effective_chat.id)
         
         # Clear navigation stack
         context.user_data['nav_stack'] = []
@@ -177,15 +150,10 @@ async def return_to_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE
 async def report_issue_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         text = update.message.text
-        logger.info(f"User {update.effective_chat.id} in report issue: {text}")
-        
-        if text == textjson.common.back_button or text == "Назад":
-            return await go_back(update, context)
-        elif text == textjson.common.main_menu_button:
-            return await return_to_main_menu(update, context)
+        logger.info("User %s in report issue: %s", update.effective_chat.id, text)
         
         # Handle user issue reports
-        admin_ids = db.get_admin_ids()
+        admin_ids = await db.get_admin_ids()
         if not admin_ids:
             logger.error("No admin IDs found in database")
             await update.message.reply_text(textjson.report_issue.send_error, reply_markup=back_button)
@@ -195,7 +163,7 @@ async def report_issue_handler(update: Update, context: ContextTypes.DEFAULT_TYP
             message = textjson.report_issue.admin_message.format(user_id=update.effective_chat.id, text=update.message.text)
             try:
                 await context.bot.send_message(admin_id, message)
-                logger.info(f"Issue report sent to admin {admin_id}")
+                logger.info("Issue report sent to admin %s", admin_id)
             except Exception as e:
                 logger.error(f"Failed to send report to admin {admin_id}: {str(e)}")
         
@@ -207,13 +175,14 @@ async def report_issue_handler(update: Update, context: ContextTypes.DEFAULT_TYP
         return REPORT_ISSUE
 
 async def fallback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    logger.warning(f"Fallback handler triggered by user {update.effective_chat.id}")
+    logger.warning("Fallback handler triggered by user %s", update.effective_chat.id)
     await update.message.reply_text(textjson.common.fallback, reply_markup=start_menu)
     return MAIN_MENU
 
 async def error_handler(update, context):
     """Log errors caused by Updates."""
     logger.error("Exception while handling an update:", exc_info=context.error)
+    metrics.update_errors_total.inc(error=type(context.error).__name__)
     
     try:
         # Get the error details
@@ -222,7 +191,7 @@ async def error_handler(update, context):
         
         # Log the error to console
         logger.error(f"Update {update} caused error {error_msg}")
-        logger.debug(f"Full traceback: {tb_string}")
+        logger.debug("Full traceback: %s", tb_string)
         
         if update and update.effective_chat:
             # Let the user know an error happened
@@ -248,20 +217,21 @@ async def error_handler(update, context):
         logger.error(f"Error in error handler: {str(e)}")
 
 async def check_new_practices_job(context: ContextTypes.DEFAULT_TYPE):
-    global last_practice_ids
     try:
         logger.debug("Running check_new_practices_job")
-        practices = db.get_practices()
+        practices = await db.get_practices()
         current_ids = {practice.get("id") for practice in practices if practice.get("id") is not None}
-        logger.info(f"Fetched {len(current_ids)} practices.")
-        if not last_practice_ids:
-            last_practice_ids = current_ids
+        logger.info("Fetched %s practices.", len(current_ids))
+        # The last seen practice IDs are persisted so practices added during downtime are still announced
+        last_practice_ids = await storage.get_checkpoint("last_practice_ids")
+        if last_practice_ids is None:
+            await storage.set_checkpoint("last_practice_ids", sorted(current_ids))
             logger.info("Initialized practice IDs without announcement.")
             return
-        new_ids = current_ids - last_practice_ids
+        new_ids = current_ids - set(last_practice_ids)
         if new_ids:
             new_practices = [practice for practice in practices if practice.get("id") in new_ids]
-            logger.info(f"Detected {len(new_practices)} new practices: {new_ids}")
+            logger.info("Detected %s new practices: %s", len(new_practices), new_ids)
             message = textjson.practices.new_practices
             buttons = []
             row = []
@@ -277,19 +247,49 @@ async def check_new_practices_job(context: ContextTypes.DEFAULT_TYPE):
                 buttons.append(row)
             markup = InlineKeyboardMarkup(inline_keyboard=buttons)
             # Retrieve all user chat IDs
-            user_ids = db.get_users()
-            logger.debug(f"Sending announcements to {len(user_ids)} users")
-            for user in user_ids:
-                try:
-                    await context.bot.send_message(chat_id=user, text=message, reply_markup=markup, parse_mode=ParseMode.HTML)
-                    logger.info(f"Sent new practice announcement to user {user}.")
-                except Exception as e:
-                    logger.error(f"Error sending announcement to user {user}: {str(e)}")
+            user_ids = await users.registry.get_users()
+            # Persist the broadcast before moving the fingerprint, so a crash in between re-enqueues
+            # the same broadcast_id (a no-op) instead of losing the announcement
+            broadcast_id = "practices:" + ",".join(str(practice_id) for practice_id in sorted(new_ids))
+            await outbox.enqueue(broadcast_id, message, user_ids, reply_markup=markup, parse_mode=ParseMode.HTML)
+            await storage.set_checkpoint("last_practice_ids", sorted(current_ids))
+            await outbox.resume(context.bot)
         else:
             logger.debug("No new practices found.")
-        last_practice_ids = current_ids
+            if current_ids != set(last_practice_ids):
+                await storage.set_checkpoint("last_practice_ids", sorted(current_ids))
     except Exception as e:
         logger.error(f"Error in check_new_practices_job: {str(e)}", exc_info=True)
 
+async def resume_broadcasts_job(context: ContextTypes.DEFAULT_TYPE):
+    try:
+        await outbox.resume(context.bot)
+    except Exception as e:
+        logger.error(f"Error in resume_broadcasts_job: {str(e)}", exc_info=True)
+
+async def flush_users_job(context: ContextTypes.DEFAULT_TYPE):
+    try:
+        await users.registry.flush()
+    except Exception as e:
+        logger.error(f"Error in flush_users_job, users kept in journal: {str(e)}")
+
 async def heartbeat_job(context: ContextTypes.DEFAULT_TYPE):
-    logger.info(f"Heartbeat: Bot is running. Active conversations: {len(context.application.chat_data)}")
+    # Liveness: /healthz fails if this job stops running
+    metrics.last_heartbeat.set(time.time())
+    logger.info("Heartbeat: Bot is running. Active conversations: %s", len(context.application.chat_data))
+    stats = db.get_cache_stats()
+    logger.info(
+        f"Data cache: hits={stats['hits']} stale_hits={stats['stale_hits']} misses={stats['misses']} "
+        f"hit_ratio={stats['hit_ratio']:.2%} refreshes={stats['refreshes']} errors={stats['refresh_errors']} "
+        f"last_refresh={stats['last_refresh_duration'] * 1000:.0f}ms"
+    )
+    render_stats = render_cache.get_stats()
+    logger.info(
+        f"Render cache: entries={render_stats['entries']} hit_ratio={render_stats['hit_ratio']:.2%} "
+        f"evictions={render_stats['evictions']} invalidations={render_stats['invalidations']}"
+    )
+    audio_stats = audio_cache.get_stats()
+    logger.info(
+        f"Audio cache: entries={audio_stats['entries']} hit_ratio={audio_stats['hit_ratio']:.2%} "
+        f"prewarmed={audio_stats['prewarmed']} invalidations={audio_stats['invalidations']}"
+    )
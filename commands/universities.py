@@ -1,18 +1,72 @@
-import db
+from typing import Optional
 from telegram import Update, ReplyKeyboardMarkup
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
 
+import db
 from logger import logger
 from config import UNIVERSITY_MENU, MAIN_MENU
 from language import textjson
-from commands.system import back_button, go_back
+from render_cache import render
+from snapshot import DataSnapshot
+from commands.system import back_button
+
+def render_universities_menu(snapshot: DataSnapshot) -> Optional[ReplyKeyboardMarkup]:
+    """Build the universities keyboard, or None if there are no universities"""
+    if not snapshot.universities:
+        return None
+    keyboard = [[university.get("name", "") + textjson.universities.university_suffix] for university in snapshot.universities]
+    keyboard.append([textjson.common.back_button])
+    keyboard.append([textjson.common.main_menu_button])
+    return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+
+def render_university(snapshot: DataSnapshot, name: str) -> Optional[str]:
+    """Render a university page with its events, or None if it does not exist"""
+    university = snapshot.get_university_by_name(name)
+    if not university:
+        return None
+    
+    instagram_link = university['instagram']
+    if instagram_link.startswith('@'):
+        instagram_link = instagram_link[1:]
+    instagram_link = f"https://instagram.com/{instagram_link}"
+    
+    parts = [
+        f"<strong>{university['name']}{textjson.universities.university_suffix}</strong>\r\n\r\n",
+        f"{university['description']}\r\n\r\n",
+    ]
+    
+    if university["link"]["url"] and university["link"]["title"]:
+        parts.append(f"<a href='{university['link']['url']}'>{university['link']['title']}</a>\n\n")
+    elif university["link"]["title"] and not university["link"]["url"]:
+        parts.append(f"<a href='{instagram_link}'>{university['link']['title']}</a>\n\n")
+    elif university["link"]["url"] and not university["link"]["title"]:
+        parts.append(f"<a href='{university['link']['url']}'>{textjson.universities.visit_website}</a>\n\n")
+    
+    parts.append(f"<a href='{instagram_link}'>Instagram 📱</a>\n\n")
+    
+    events = snapshot.get_university_events(university.get("id"))
+    if events:
+        parts.append(textjson.universities.events_header)
+        for event in events:
+            parts.append(f"<strong>{event.get('title')}</strong>\n")
+            parts.append(f"{textjson.universities.event_date.format(date=event.get('date'))}\n")
+            parts.append(f"{textjson.universities.event_description.format(description=event.get('description'))}\n")
+            parts.append(f"<a href='{event.get('link')}'>{textjson.universities.event_link}</a>\n\n")
+    return "".join(parts)
+
+async def university_page(name: str) -> Optional[str]:
+    """Page of the university called `name`, or None if there is none"""
+    # Typed text is looked up first, so only real universities take render cache entries
+    university = (await db.fetch_db()).get_university_by_name(name)
+    if university is None:
+        return None
+    return await render("university", university.get("id"), lambda snapshot: render_university(snapshot, name))
 
 async def handle_university_info(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
-        logger.info(f"User {update.effective_chat.id} accessing university info")
-        universities = db.get_universities()
-        logger.debug(f"Retrieved {len(universities) if universities else 0} universities")
+        logger.info("User %s accessing university info", update.effective_chat.id)
+        markup = await render("universities", None, render_universities_menu)
         
         # Store current state in navigation stack to enable going back
         if not context.user_data.get('nav_stack'):
@@ -22,21 +76,11 @@ async def handle_university_info(update: Update, context: ContextTypes.DEFAULT_T
         if not context.user_data['nav_stack'] or context.user_data['nav_stack'][-1] != MAIN_MENU:
             context.user_data['nav_stack'].append(MAIN_MENU)
         
-        if not universities:
+        if markup is None:
             await update.message.reply_text(textjson.universities.no_info, reply_markup=back_button)
             return UNIVERSITY_MENU
         
-        keyboard = []
-        for university in universities:
-            keyboard.append([university.get("name", "") + textjson.universities.university_suffix])
-        keyboard.append([textjson.common.back_button])
-        keyboard.append([textjson.common.main_menu_button])
-        markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
-        
         await update.message.reply_text(textjson.universities.select_prompt, reply_markup=markup)
-        
-        # Store universities in context for later use
-        context.user_data['universities'] = universities
         return UNIVERSITY_MENU
     except Exception as e:
         logger.error(f"Error in handle_university_info: {str(e)}", exc_info=True)
@@ -46,57 +90,18 @@ async def handle_university_info(update: Update, context: ContextTypes.DEFAULT_T
 async def university_menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         text = update.message.text
-        logger.info(f"User {update.effective_chat.id} selected in university menu: {text}")
-        
-        if text == textjson.common.back_button or text == "Назад":
-            return await go_back(update, context)
-        elif text == textjson.common.main_menu_button:
-            from commands.system import return_to_main_menu
-            return await return_to_main_menu(update, context)
+        logger.info("User %s selected in university menu: %s", update.effective_chat.id, text)
         
         # Remove emoji if present
         text = text.split(textjson.universities.university_suffix)[0] if textjson.universities.university_suffix in text else text
         
-        universities = context.user_data.get('universities', [])
-        university = next((u for u in universities if u.get("name") == text), None)
+        response = await university_page(text)
         
-        if not university:
-            logger.warning(f"University not found: {text}")
+        if response is None:
+            logger.warning("University not found: %s", text)
             await update.message.reply_text(textjson.universities.not_found, reply_markup=back_button)
             return UNIVERSITY_MENU
         
-        university_id = university.get("id")
-        logger.debug(f"Showing university ID: {university_id}")
-        response = ""
-        instagram_link = university['instagram']
-        if instagram_link.startswith('@'):
-            instagram_link = instagram_link[1:]
-            instagram_link = f"https://instagram.com/{instagram_link}"
-        else:
-            instagram_link = f"https://instagram.com/{instagram_link}"
-        
-        response += f"<strong>{university['name']}{textjson.universities.university_suffix}</strong>\r\n\r\n"
-        response += f"{university['description']}\r\n\r\n"
-        
-        if university["link"]["url"] and university["link"]["title"]:
-            response += f"<a href='{university['link']['url']}'>{university['link']['title']}</a>\n\n"
-        elif university["link"]["title"] and not university["link"]["url"]:
-            response += f"<a href='{instagram_link}'>{university['link']['title']}</a>\n\n"
-        elif university["link"]["url"] and not university["link"]["title"]:
-            response += f"<a href='{university['link']['url']}'>{textjson.universities.visit_website}</a>\n\n"
-        
-        response += f"<a href='{instagram_link}'>Instagram 📱</a>\n\n"
-        
-        events = db.get_university_events(university_id)
-        if events:
-            logger.debug(f"Retrieved {len(events)} events for university {university_id}")
-            response += textjson.universities.events_header
-            for event in events:
-                response += f"<strong>{event.get('title')}</strong>\n"
-                response += f"{textjson.universities.event_date.format(date=event.get('date'))}\n"
-                response += f"{textjson.universities.event_description.format(description=event.get('description'))}\n"
-                response += f"<a href='{event.get('link')}'>{textjson.universities.event_link}</a>\n\n"
-        
         await update.message.reply_text(response, reply_markup=back_button, parse_mode=ParseMode.HTML)
         return UNIVERSITY_MENU
     except Exception as e:
@@ -7,6 +7,31 @@ try:
         env = json.load(f)
     
     TOKEN = env["TOKEN"]
+    # Base URL of a self-hosted or stand-in Bot API server, e.g. "http://localhost:8081/bot"; Telegram's if unset
+    BOT_API_URL = env.get("BOT_API_URL")
+    # Local storage for bot-owned state (users, deliveries, checkpoints)
+    STORAGE_URL = env.get("STORAGE_URL", "sqlite:data/bot.sqlite3")
+    # Local journal of registered users not yet written to storage
+    USERS_JOURNAL = env.get("USERS_JOURNAL", "data/users.journal")
+    # How updates are received: "polling" or "webhook"
+    MODE = env.get("MODE", "polling")
+    # Public HTTPS URL Telegram posts updates to, e.g. "https://bot.example.com/telegram"
+    WEBHOOK_URL = env.get("WEBHOOK_URL")
+    # Checked against the X-Telegram-Bot-Api-Secret-Token header; generated at startup if empty
+    WEBHOOK_SECRET = env.get("WEBHOOK_SECRET")
+    # Only a reverse proxy on the same host can reach the webhook by default; "0.0.0.0" exposes it directly
+    WEBHOOK_LISTEN = env.get("WEBHOOK_LISTEN", "127.0.0.1")
+    WEBHOOK_PORT = int(env.get("WEBHOOK_PORT", 8443))
+    # Optional certificate and key to terminate TLS in the bot itself instead of a reverse proxy
+    WEBHOOK_CERT = env.get("WEBHOOK_CERT")
+    WEBHOOK_KEY = env.get("WEBHOOK_KEY")
+    # Chat (e.g. a private channel) where new practice audio is uploaded ahead of time; pre-warming is off if unset
+    AUDIO_CACHE_CHAT_ID = env.get("AUDIO_CACHE_CHAT_ID")
+    # Updates of different chats are handled concurrently, at most this many at once
+    UPDATE_CONCURRENCY = int(env.get("UPDATE_CONCURRENCY", 32))
+    # Prometheus /metrics plus /healthz and /readyz probes; set METRICS_PORT to null to disable
+    METRICS_LISTEN = env.get("METRICS_LISTEN", "127.0.0.1")
+    METRICS_PORT = env.get("METRICS_PORT", 9100)
     logger.info("Environment configuration loaded successfully")
 except Exception as e:
     logger.error(f"Failed to load environment configuration: {str(e)}")
@@ -14,7 +39,45 @@ except Exception as e:
 
 # Define conversation states
 (MAIN_MENU, UNIVERSITY_MENU, FIND_PSYCHOLOGIST, PRACTICES_MENU, 
- PRACTICE_CATEGORY, PRACTICE_DETAIL, CONTACTS_MENU, REPORT_ISSUE, PARTNERS_MENU) = range(9)
+ PRACTICE_CATEGORY, PRACTICE_DETAIL, CONTACTS_MENU, REPORT_ISSUE, PARTNERS_MENU, SEARCH) = range(10)
 
-# Global variable to store last known practice IDs
-last_practice_ids = set()
+# Interval in seconds between batched writes of new users to storage
+USERS_FLUSH_INTERVAL = 30
+
+# Interval in seconds between batched writes of conversation states and user_data
+PERSISTENCE_UPDATE_INTERVAL = 30
+
+# Broadcast limits: Telegram allows roughly 30 messages/second overall and about one per second per chat
+BROADCAST_RATE = 25
+BROADCAST_CONCURRENCY = 20
+BROADCAST_PER_CHAT_INTERVAL = 1.0
+
+# Entries per page of the psychologists and partners listings, and practices per page of a category
+PAGE_SIZE = 5
+PRACTICES_PAGE_SIZE = 10
+
+# Psychologist filters: bounds of the price bands in tenge (under the first, between each pair,
+# from the last up) and how many of the most common specialties get a button
+PSYCHOLOGIST_PRICE_BANDS = (10000, 20000, 30000)
+PSYCHOLOGIST_SPECIALTY_BUTTONS = 6
+
+# Inline mode: practices per answer (Telegram allows up to 50) and seconds Telegram may cache an answer
+INLINE_RESULTS = 20
+INLINE_CACHE_TIME = 300
+
+# Results shown for a search from the main menu
+SEARCH_RESULTS = 8
+
+# Flood control per chat: updates/second after a burst of FLOOD_BURST; 0 disables it.
+# Once the burst is spent, the same text or button within FLOOD_DUPLICATE_WINDOW seconds counts once;
+# FLOOD_MUTE_AFTER dropped updates in a row mute the chat for FLOOD_MUTE_SECONDS.
+# Sized so benchmarks/flood_abuse.py drops no update of a regular user, even at --think 0.1
+FLOOD_RATE = 2.0
+FLOOD_BURST = 12
+FLOOD_DUPLICATE_WINDOW = 1.0
+FLOOD_MUTE_AFTER = 10
+FLOOD_MUTE_SECONDS = 60
+
+# Admin /profile runs: default and longest duration in seconds
+PROFILE_SECONDS = 30
+PROFILE_MAX_SECONDS = 300
@@ -1,9 +1,14 @@
-import requests
+import asyncio
+import hashlib
 import logging
 import time
 import json
-from typing import Optional, List
+from typing import Awaitable, Callable, List, Optional, Sequence, Set
 from classes import Data, Contact, Event, Psychologist, Practice, University
+import metrics
+import tracing
+from snapshot import DataSnapshot
+from sources import ContentSource, create_source
 
 logger = logging.getLogger(__name__)
 
@@ -11,148 +16,266 @@ logger = logging.getLogger(__name__)
 with open("env.json", "r") as f:
     env = json.load(f)
 
-API_URL = env["NPOINT_URL"]
+# CONTENT_SOURCE may point to an http(s) URL, "file:<path>" or "sqlite:<path>"; defaults to NPOINT_URL
+source: ContentSource = create_source(env.get("CONTENT_SOURCE") or env["NPOINT_URL"])
 
 class DatabaseError(Exception):
     """Custom exception for database operations"""
     pass
 
-_cache_ttl = 60  # cache duration in seconds
-_db_cache: Optional[Data] = None
+_cache_ttl = 60  # seconds before a snapshot is considered stale and refreshed in the background
+_db_cache: Optional[DataSnapshot] = None
 _db_cache_timestamp: float = 0.0
+_refresh_task: Optional[asyncio.Task] = None
+_watch_task: Optional[asyncio.Task] = None
 
-def fetch_db() -> Data:
-    """Fetch database content with caching"""
-    global _db_cache, _db_cache_timestamp
-    current_time = time.time()
-    if _db_cache is not None and (current_time - _db_cache_timestamp) < _cache_ttl:
-        return _db_cache
+# Change detection for the document
+_content_hash: Optional[str] = None
+_snapshot_version = 0  # incremented every time a new snapshot is built
+_snapshot_listeners: List[Callable[[DataSnapshot], Awaitable[None]]] = []
+# The event loop only keeps weak references to tasks; listener notifications are kept here until they finish
+_notifications: Set[asyncio.Task] = set()
+
+# Counters for the snapshot cache, reported by heartbeat_job
+cache_stats = {
+    "hits": 0,
+    "stale_hits": 0,
+    "misses": 0,
+    "refreshes": 0,
+    "refresh_errors": 0,
+    "unchanged": 0,
+    "last_refresh_duration": 0.0,
+    "total_refresh_duration": 0.0,
+}
+
+async def close_client() -> None:
+    """Stop watching the content source and close it (called on application shutdown)"""
+    global _watch_task
+    if _watch_task is not None:
+        _watch_task.cancel()
+        _watch_task = None
+    await source.close()
+
+def _set_snapshot(data: Data, content_hash: Optional[str] = None) -> DataSnapshot:
+    """Build the indexed snapshot for a document and swap it into the cache"""
+    global _db_cache, _db_cache_timestamp, _content_hash, _snapshot_version
+    _snapshot_version += 1
+    _db_cache = DataSnapshot(data, version=_snapshot_version)
+    _db_cache_timestamp = time.time()
+    _content_hash = content_hash
+    for listener in _snapshot_listeners:
+        task = asyncio.create_task(_notify(listener, _db_cache))
+        _notifications.add(task)
+        task.add_done_callback(_notifications.discard)
+    return _db_cache
+
+async def _notify(listener: Callable[[DataSnapshot], Awaitable[None]], snapshot: DataSnapshot) -> None:
     try:
-        response = requests.get(API_URL)
-        response.raise_for_status()
-        data = response.json()
-        _db_cache = data
-        _db_cache_timestamp = current_time
-        return data
+        await listener(snapshot)
+    except Exception as e:
+        logger.error(f"Error in snapshot listener: {str(e)}", exc_info=True)
+
+def add_snapshot_listener(listener: Callable[[DataSnapshot], Awaitable[None]]) -> None:
+    """Register a coroutine called with every newly built snapshot"""
+    _snapshot_listeners.append(listener)
+
+async def _refresh() -> DataSnapshot:
+    """Download a fresh snapshot and swap it into the cache.
+
+    Unchanged content (304 response or identical body hash) only renews the
+    current snapshot, skipping JSON decoding and index rebuilds.
+    """
+    global _db_cache_timestamp
+    started = time.perf_counter()
+    try:
+        raw = await source.fetch(conditional=_db_cache is not None)
+        cache_stats["refreshes"] += 1
+        content_hash = hashlib.sha256(raw).hexdigest() if raw is not None else None
+        if _db_cache is not None and (raw is None or content_hash == _content_hash):
+            cache_stats["unchanged"] += 1
+            _db_cache_timestamp = time.time()
+            return _db_cache
+        return _set_snapshot(json.loads(raw), content_hash)
     except Exception as e:
+        cache_stats["refresh_errors"] += 1
+        metrics.content_fetch_errors_total.inc()
         logger.error(f"Error fetching database: {str(e)}")
         raise DatabaseError(f"Failed to fetch database: {str(e)}")
+    finally:
+        duration = time.perf_counter() - started
+        cache_stats["last_refresh_duration"] = duration
+        cache_stats["total_refresh_duration"] += duration
+        metrics.content_fetch_duration.observe(duration)
+
+def _on_refresh_done(task: asyncio.Task) -> None:
+    # Background refreshes may have no awaiter; retrieve the exception so it is not reported as unhandled
+    if not task.cancelled():
+        task.exception()
+
+def _start_refresh() -> asyncio.Task:
+    """Return the in-flight refresh task, starting one if none is running (single-flight)"""
+    global _refresh_task
+    if _refresh_task is None or _refresh_task.done():
+        _refresh_task = asyncio.create_task(_refresh())
+        _refresh_task.add_done_callback(_on_refresh_done)
+    return _refresh_task
+
+async def fetch_db() -> DataSnapshot:
+    """Fetch database content with stale-while-revalidate caching.
+
+    Once warm, the cached snapshot is always returned immediately; an expired
+    snapshot triggers a single background refresh. Only a cold cache waits,
+    and concurrent cold callers share one in-flight request.
+    """
+    if _db_cache is not None:
+        # A watched source pushes changes, so its snapshot only goes stale if the watch has stopped
+        watching = _watch_task is not None and not _watch_task.done()
+        if not watching and (time.time() - _db_cache_timestamp) >= _cache_ttl:
+            cache_stats["stale_hits"] += 1
+            _start_refresh()
+        else:
+            cache_stats["hits"] += 1
+        return _db_cache
+    cache_stats["misses"] += 1
+    # Only a cold cache waits, so only this path is worth a trace span
+    with tracing.span("fetch_db"):
+        # Shield so a cancelled handler does not cancel the refresh other callers are waiting on
+        return await asyncio.shield(_start_refresh())
 
-def update_db(data: Data) -> Data:
+async def get_snapshot_version() -> int:
+    """Get the version of the current snapshot, for keying derived caches"""
+    snapshot = await fetch_db()
+    return snapshot.version
+
+async def _on_source_change() -> None:
+    try:
+        await asyncio.shield(_start_refresh())
+    except DatabaseError:
+        pass  # already logged; the previous snapshot stays in use
+
+def _on_watch_done(task: asyncio.Task) -> None:
+    # Sources keep watching through errors, so this is unexpected; fetch_db falls back to _cache_ttl
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Watching the content source stopped: {str(task.exception())}")
+
+def start_watching() -> bool:
+    """Refresh the snapshot as soon as the content source reports a change.
+
+    Returns False if the source cannot be watched (HTTP), in which case the
+    snapshot keeps expiring after _cache_ttl seconds, as it does if the watch
+    ever stops.
+    """
+    global _watch_task
+    if not source.supports_watch:
+        return False
+    if _watch_task is None or _watch_task.done():
+        _watch_task = asyncio.create_task(source.watch(_on_source_change))
+        _watch_task.add_done_callback(_on_watch_done)
+    return True
+
+def get_cache_stats() -> dict:
+    """Get snapshot cache counters, including hit ratio and snapshot age"""
+    stats = dict(cache_stats)
+    lookups = stats["hits"] + stats["stale_hits"] + stats["misses"]
+    stats["hit_ratio"] = (stats["hits"] + stats["stale_hits"]) / lookups if lookups else 0.0
+    stats["snapshot_age"] = time.time() - _db_cache_timestamp if _db_cache is not None else None
+    stats["snapshot_version"] = _snapshot_version
+    return stats
+
+metrics.registry.gauge("bot_snapshot_age_seconds", "Seconds since the snapshot was fetched or revalidated",
+                       function=lambda: get_cache_stats()["snapshot_age"])
+metrics.registry.gauge("bot_snapshot_version", "Version of the current snapshot",
+                       function=lambda: get_cache_stats()["snapshot_version"])
+metrics.registry.gauge("bot_content_cache_hit_ratio", "Share of fetch_db calls served from the snapshot cache",
+                       function=lambda: get_cache_stats()["hit_ratio"])
+
+async def update_db(data: Data) -> Data:
     """Update database content"""
     try:
-        response = requests.post(API_URL, json=data)
-        response.raise_for_status()
-        return response.json()
+        with metrics.content_update_duration.time():
+            await source.write(data)
+        return data
     except Exception as e:
+        metrics.content_update_errors_total.inc()
         logger.error(f"Error updating database: {str(e)}")
         raise DatabaseError(f"Failed to update database: {str(e)}")
     
-def get_start_text() -> str:
+async def get_start_text() -> str:
     """Get formatted start text"""
-    data = fetch_db()
-    bot_info = data.get("bot_info", {})
-    start_text = bot_info.get("start_text", "").replace("\\n", "\n")
-    # If no start text is found in the database, use a default message
-    if not start_text:
-        start_text = "Привет, я - DOS 🤖\nДруг проекта JARQYN\n"
-    
-    text = start_text + "\nВыбери действие из меню ниже:"
-    return text
+    snapshot = await fetch_db()
+    return snapshot.start_text
             
-def get_practices() -> List[Practice]:
+async def get_practices() -> Sequence[Practice]:
     """Get formatted practices info"""
-    data = fetch_db()
-    bot_info = data.get("bot_info", [])
-    practices = bot_info.get("practices", [])
-    return practices
+    snapshot = await fetch_db()
+    return snapshot.practices
+
+async def get_practice(practice_id: int) -> Optional[Practice]:
+    """Get a single practice by its ID"""
+    snapshot = await fetch_db()
+    return snapshot.get_practice(practice_id)
 
 # Add function to get partners
-def get_partners() -> List[dict]:
+async def get_partners() -> Sequence[dict]:
     """Get formatted partners info"""
-    data = fetch_db()
-    bot_info = data.get("bot_info", {})
-    partners = bot_info.get("partners", [])
-    return partners
-
-def get_practice_categories() -> List[str]:
-    practices = get_practices()
-    categories = []
-    for practice in practices:
-        if practice["category"] not in categories:
-            categories.append(practice["category"])
-    return categories
-
-def get_practices_by_category(category_name: str) -> List[Practice]:
-    practices = get_practices()
-    filtered_practices = []
-    for practice in practices:
-        if practice["category"] == category_name:
-            filtered_practices.append(practice)
-            
-    return filtered_practices
+    snapshot = await fetch_db()
+    return snapshot.partners
+
+async def get_practice_categories() -> Sequence[str]:
+    snapshot = await fetch_db()
+    return snapshot.practice_categories
+
+async def get_practices_by_category(category_name: str) -> Sequence[Practice]:
+    snapshot = await fetch_db()
+    return snapshot.get_practices_by_category(category_name)
  
-def get_psychologists() -> List[Psychologist]:
+async def get_psychologists() -> Sequence[Psychologist]:
     """Get formatted psychologists info"""
-    data = fetch_db()
-    bot_info = data.get("bot_info", [])
-    psychologists = bot_info.get("psychologists", [])
-    return psychologists 
+    snapshot = await fetch_db()
+    return snapshot.psychologists
 
-def get_universities() -> List[University]:
+async def get_universities() -> Sequence[University]:
     """Get formatted universities info"""
-    data = fetch_db()
-    bot_info = data.get("bot_info", [])
-    universities = bot_info.get("universities", [])
-    return universities
+    snapshot = await fetch_db()
+    return snapshot.universities
 
-def get_contacts() -> List[Contact]:
+async def get_university_by_name(name: str) -> Optional[University]:
+    """Get a university by its display name"""
+    snapshot = await fetch_db()
+    return snapshot.get_university_by_name(name)
+
+async def get_contacts() -> Sequence[Contact]:
     """Get formatted contacts info"""
-    data = fetch_db()
-    bot_info = data.get("bot_info", [])
-    contacts = bot_info.get("contacts", [])
-    return contacts
+    snapshot = await fetch_db()
+    return snapshot.contacts
 
-def get_events() -> List[Event]:
+async def get_events() -> Sequence[Event]:
     """Get formatted events info"""
-    data = fetch_db()
-    bot_info = data.get("bot_info", [])
-    events = bot_info.get("events", [])
-    return events
+    snapshot = await fetch_db()
+    return snapshot.events
 
-def get_university_events(university_id: str) -> List[Event]:
+async def get_university_events(university_id: str) -> Sequence[Event]:
     """Get events for a specific university"""
-    events = get_events()
-    events = [event for event in events if event.get("universityId") == university_id]
-    return events
+    snapshot = await fetch_db()
+    return snapshot.get_university_events(university_id)
 
-def get_admin_ids() -> List[int]:
+async def get_admin_ids() -> Sequence[int]:
     """Get admin chat IDs"""
-    data = fetch_db()
-    return data.get("admin_ids", [])
-
-def add_user(chat_id: int) -> List[int]:
-    """Add new user chat ID"""
-    data = fetch_db()
-    users = data.get("users", [])
-    if chat_id not in users:
-        users.append(chat_id)
-        data["users"] = users
-        update_db(data)
-    return users
-
-def get_users() -> List[int]:
-    """Get list of user chat IDs"""
-    data = fetch_db()
-    return data.get("users", [])
+    snapshot = await fetch_db()
+    return snapshot.admin_ids
+
+async def get_users() -> Sequence[int]:
+    """Get the legacy list of user chat IDs stored in the document (see storage.migrate_users)"""
+    snapshot = await fetch_db()
+    return snapshot.users
 
 logger = logging.getLogger("JarqynBot.DB")
 
-def check_connection():
+async def check_connection():
     """Check if the database connection is working properly.
     Returns True if connection is ok, False otherwise."""
     try:
-        fetch_db()
+        await fetch_db()
         
         logger.info("Database connection check successful")
         return True
@@ -0,0 +1,141 @@
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+from telegram import Update
+from telegram.error import TelegramError
+from telegram.ext import ApplicationHandlerStop, ContextTypes, TypeHandler
+
+import metrics
+from logger import logger
+from language import textjson
+from pagination import PAGE_PREFIX
+from config import FLOOD_RATE, FLOOD_BURST, FLOOD_DUPLICATE_WINDOW, FLOOD_MUTE_AFTER, FLOOD_MUTE_SECONDS
+
+flood_updates_total = metrics.registry.counter("bot_flood_updates_total",
+                                               "Updates seen by flood control, by verdict", ["verdict"])
+flood_mutes_total = metrics.registry.counter("bot_flood_mutes_total", "Chats muted for flooding")
+
+# Verdicts; only ALLOWED updates reach the conversation
+ALLOWED, DUPLICATE, THROTTLED, MUTED = "allowed", "duplicate", "throttled", "muted"
+
+class _ChatState:
+    __slots__ = ("tokens", "updated", "last_key", "last_at", "strikes", "muted_until")
+
+    def __init__(self, tokens: float, now: float):
+        self.tokens = tokens
+        self.updated = now
+        self.last_key: Optional[str] = None
+        self.last_at = 0.0
+        self.strikes = 0
+        self.muted_until = 0.0
+
+class FloodControl:
+    """Per-chat token buckets checked before an update reaches the conversation.
+
+    Each chat may send `burst` updates at once and `rate` per second after
+    that. Once a chat's bucket is empty, the same text or button pressed
+    again within `duplicate_window` seconds is collapsed into the first one
+    and anything else is throttled. Navigation (`exempt` texts and callback
+    data starting with one of `exempt_prefixes`) is never collapsed and may
+    overdraw the bucket by another `burst` updates, so back and page buttons
+    keep working for a user who just clicked through quickly. A chat whose
+    updates are dropped `mute_after` times in a row is muted for
+    `mute_seconds` and told so once; while muted its updates are dropped
+    without a reply. The persistence preload comes after flood control, so
+    an abusive chat costs neither storage reads nor Bot API calls.
+    """
+
+    def __init__(self, rate: float, burst: float, duplicate_window: float, mute_after: int, mute_seconds: float,
+                 max_chats: int = 10000, exempt: Iterable[str] = (), exempt_prefixes: Tuple[str, ...] = ()):
+        self.rate = rate
+        self.burst = burst
+        self.duplicate_window = duplicate_window
+        self.mute_after = mute_after
+        self.mute_seconds = mute_seconds
+        self.max_chats = max_chats
+        self.exempt = frozenset(exempt)
+        self.exempt_prefixes = exempt_prefixes
+        self._chats: Dict[int, _ChatState] = {}
+
+    def is_navigation(self, key: Optional[str]) -> bool:
+        return key is not None and (key in self.exempt or key.startswith(self.exempt_prefixes))
+
+    def check(self, chat_id: int, key: Optional[str], now: Optional[float] = None) -> str:
+        """Verdict for one update of `chat_id`; `key` is its text or callback data, if any"""
+        if now is None:
+            now = time.monotonic()
+        state = self._chats.get(chat_id)
+        if state is None:
+            if len(self._chats) >= self.max_chats:
+                self._prune(now)
+            state = self._chats[chat_id] = _ChatState(self.burst, now)
+        if now < state.muted_until:
+            return MUTED
+        state.tokens = min(self.burst, state.tokens + (now - state.updated) * self.rate)
+        state.updated = now
+        navigation = self.is_navigation(key)
+        if state.tokens >= 1 or (navigation and state.tokens >= 1 - self.burst):
+            state.tokens -= 1
+            state.strikes = 0
+            state.last_key = key
+            state.last_at = now
+            return ALLOWED
+        if not navigation and key is not None and key == state.last_key and now - state.last_at < self.duplicate_window:
+            verdict = DUPLICATE
+        else:
+            verdict = THROTTLED
+        state.strikes += 1
+        if state.strikes >= self.mute_after:
+            state.strikes = 0
+            state.muted_until = now + self.mute_seconds
+            return MUTED
+        return verdict
+
+    def is_muted(self, chat_id: int, now: Optional[float] = None) -> bool:
+        state = self._chats.get(chat_id)
+        return state is not None and (now if now is not None else time.monotonic()) < state.muted_until
+
+    def _prune(self, now: float) -> None:
+        # Chats whose bucket has refilled and that are not muted behave like new ones, so forget them
+        refill = self.burst / self.rate if self.rate else 0.0
+        self._chats = {chat_id: state for chat_id, state in self._chats.items()
+                       if state.muted_until > now or now - state.updated < refill}
+
+    async def _filter(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        chat = update.effective_chat
+        if not self.rate or chat is None:
+            return
+        if update.message is not None:
+            key = update.message.text
+        elif update.callback_query is not None:
+            key = update.callback_query.data
+        else:
+            key = None
+        was_muted = self.is_muted(chat.id)
+        verdict = self.check(chat.id, key)
+        flood_updates_total.inc(verdict=verdict)
+        if verdict == ALLOWED:
+            return
+        if verdict == MUTED and not was_muted:
+            flood_mutes_total.inc()
+            logger.warning("Chat %s muted for %s s after flooding", chat.id, self.mute_seconds)
+            try:
+                await context.bot.send_message(chat.id, textjson.common.flood_muted.format(seconds=int(self.mute_seconds)))
+            except TelegramError as e:
+                logger.error(f"Failed to send flood notice to chat {chat.id}: {str(e)}")
+        if update.callback_query is not None:
+            # Otherwise the client keeps showing a spinner on the button until Telegram gives up
+            try:
+                await update.callback_query.answer()
+            except TelegramError as e:
+                logger.error(f"Failed to answer dropped callback query of chat {chat.id}: {str(e)}")
+        # Nothing else, not even the persistence preload, sees a dropped update
+        raise ApplicationHandlerStop
+
+    def handler(self) -> TypeHandler:
+        """Handler for a group after the update counter and before the persistence preload"""
+        return TypeHandler(Update, self._filter)
+
+flood_control = FloodControl(FLOOD_RATE, FLOOD_BURST, FLOOD_DUPLICATE_WINDOW, FLOOD_MUTE_AFTER, FLOOD_MUTE_SECONDS,
+                             exempt=(textjson.common.back_button, textjson.common.main_menu_button),
+                             exempt_prefixes=(f"{PAGE_PREFIX}:",))
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import ssl
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+logger = logging.getLogger("JarqynBot.HTTP")
+
+@dataclass
+class Request:
+    method: str
+    path: str
+    query: Dict[str, str]
+    headers: Dict[str, str]  # lower-cased names
+    body: bytes
+
+@dataclass
+class Response:
+    status: int = 200
+    body: bytes = b""
+    content_type: str = "text/plain; charset=utf-8"
+    headers: Dict[str, str] = field(default_factory=dict)
+
+Handler = Callable[[Request], Awaitable[Response]]
+
+class HeadersTooLarge(ValueError):
+    """More header lines or bytes than the server accepts"""
+
+class HTTPServer:
+    """Minimal asyncio HTTP/1.1 server with keep-alive and optional TLS.
+
+    Enough for the webhook endpoint, metrics and local test doubles without
+    pulling in a web framework. Routes are matched on exact (method, path).
+
+    A connection may wait `idle_timeout` seconds for its next request, which
+    then has `read_timeout` seconds to arrive in full; headers beyond
+    `max_headers` lines or `max_header_bytes` bytes are answered with 431.
+    Slow or stalled clients are disconnected instead of holding a connection
+    forever.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, ssl_context: Optional[ssl.SSLContext] = None,
+                 max_body: int = 1024 * 1024, read_timeout: float = 10.0, idle_timeout: float = 60.0,
+                 max_headers: int = 100, max_header_bytes: int = 16 * 1024):
+        self.host = host
+        self.port = port
+        self.ssl_context = ssl_context
+        self.max_body = max_body
+        self.read_timeout = read_timeout
+        self.idle_timeout = idle_timeout
+        self.max_headers = max_headers
+        self.max_header_bytes = max_header_bytes
+        self._routes: Dict[Tuple[str, str], Handler] = {}
+        self._server: Optional[asyncio.base_events.Server] = None
+        self._connections = set()
+
+    def route(self, method: str, path: str, handler: Handler) -> None:
+        self._routes[(method.upper(), path)] = handler
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port, ssl=self.ssl_context)
+        # Resolve the real port when binding to port 0
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info("HTTP server listening on %s:%s%s", self.host, self.port, " (TLS)" if self.ssl_context else "")
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._connections):
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Request]:
+        request_line = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+        if not request_line:
+            return None
+        # The rest of the request must arrive within read_timeout, however slowly it trickles in
+        return await asyncio.wait_for(self._read_rest(reader, request_line), self.read_timeout)
+
+    async def _read_rest(self, reader: asyncio.StreamReader, request_line: bytes) -> Request:
+        method, target, version = request_line.decode("latin-1").rstrip("\r\n").split(" ", 2)
+        headers = {}
+        size = len(request_line)
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            size += len(line)
+            if len(headers) >= self.max_headers or size > self.max_header_bytes:
+                raise HeadersTooLarge("Request headers too large")
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", 0))
+        if length > self.max_body:
+            raise ValueError("Request body too large")
+        body = await reader.readexactly(length) if length else b""
+        url = urlsplit(target)
+        if version == "HTTP/1.0" and headers.get("connection", "").lower() != "keep-alive":
+            headers.setdefault("connection", "close")
+        return Request(method.upper(), url.path, dict(parse_qsl(url.query)), headers, body)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._connections.add(writer)
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except HeadersTooLarge:
+                    await self._write(writer, Response(431, b"Request Header Fields Too Large"), close=True)
+                    break
+                except (ValueError, asyncio.IncompleteReadError):
+                    await self._write(writer, Response(400, b"Bad Request"), close=True)
+                    break
+                except asyncio.TimeoutError:
+                    break
+                if request is None:
+                    break
+                handler = self._routes.get((request.method, request.path))
+                if handler is None:
+                    response = Response(404, b"Not Found")
+                else:
+                    try:
+                        response = await handler(request)
+                    except Exception as e:
+                        logger.error(f"Error handling {request.method} {request.path}: {str(e)}", exc_info=True)
+                        response = Response(500, b"Internal Server Error")
+                close = request.headers.get("connection", "").lower() == "close"
+                await self._write(writer, response, close)
+                if close:
+                    break
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._connections.discard(writer)
+            writer.close()
+
+    async def _write(self, writer: asyncio.StreamWriter, response: Response, close: bool) -> None:
+        reason = HTTPStatus(response.status).phrase
+        head = [f"HTTP/1.1 {response.status} {reason}",
+                f"Content-Type: {response.content_type}",
+                f"Content-Length: {len(response.body)}",
+                f"Connection: {'close' if close else 'keep-alive'}"]
+        head.extend(f"{name}: {value}" for name, value in response.headers.items())
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + response.body)
+        await writer.drain()
+
+def create_ssl_context(certfile: str, keyfile: str) -> ssl.SSLContext:
+    """Server-side TLS context, for terminating HTTPS without a reverse proxy"""
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(certfile, keyfile)
+    return context
@@ -2,6 +2,9 @@ import json
 from types import SimpleNamespace
 from logger import logger
 
+# Locale of language.json; part of the render cache key
+LOCALE = "ru"
+
 def load_language_file():
     """Load language strings from JSON file and convert to nested namespaces for dot notation access"""
     try:
@@ -1,15 +1,148 @@
+import atexit
+import contextvars
+import json
 import logging
+import logging.handlers
+import queue
+import random
 import sys
+from contextlib import contextmanager
+from typing import Dict, Optional, TextIO, Tuple
+
+TEXT_FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+
+# Fields describing the update being handled, added to every record logged while handling it
+CONTEXT_FIELDS = ("chat_id", "state", "handler")
+_context: contextvars.ContextVar[Dict[str, object]] = contextvars.ContextVar("log_context", default={})
+
+# Arguments of these types cannot change after the call, so formatting can wait for the logging thread
+_IMMUTABLE_ARGS = (str, int, float, bool, type(None))
+
+@contextmanager
+def log_context(**fields):
+    """Attach fields such as chat_id, state and handler to records logged inside the block"""
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+class ContextFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        for name, value in _context.get().items():
+            if not hasattr(record, name):
+                setattr(record, name, value)
+        return True
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of INFO and DEBUG records per event; warnings and errors always pass.
+
+    An event is a record's message template (with lazy %-formatting it is the
+    same for every call of a log statement) or, failing that, the name of the
+    function that logged it. Kept records carry their `sample_rate`.
+    """
+
+    def __init__(self, rates: Optional[Dict[str, float]] = None, default: float = 1.0, seed: Optional[int] = None):
+        super().__init__()
+        self.rates = dict(rates or {})
+        self.default = default
+        self._random = random.Random(seed)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO:
+            return True
+        rate = self.rates.get(record.msg) if isinstance(record.msg, str) else None
+        if rate is None:
+            rate = self.rates.get(record.funcName, self.default)
+        if rate >= 1:
+            return True
+        record.sample_rate = rate
+        return self._random.random() < rate
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with the context fields as top-level keys"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for name in CONTEXT_FIELDS:
+            value = getattr(record, name, None)
+            if value is not None:
+                entry[name] = value
+        sample_rate = getattr(record, "sample_rate", None)
+        if sample_rate is not None:
+            entry["sample_rate"] = sample_rate
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to a QueueListener thread that formats and writes them.
+
+    Messages whose arguments are all immutable are formatted on the listener
+    thread; others, and tracebacks, are rendered here because their objects
+    may change or be freed once the call returns. Records are modified in
+    place instead of copied, so this must be the only handler that sees them.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.args and not (isinstance(record.args, tuple) and all(isinstance(arg, _IMMUTABLE_ARGS) for arg in record.args)):
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.stack_info = None
+        return record
+
+def create_handler(fmt: str = "json", sampling: Optional[Dict[str, float]] = None,
+                   stream: Optional[TextIO] = None) -> Tuple[logging.Handler, logging.handlers.QueueListener]:
+    """Queue handler for the event loop plus the started listener thread that writes to `stream`"""
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    handler = NonBlockingQueueHandler(log_queue)
+    sampling = dict(sampling or {})
+    handler.addFilter(SamplingFilter(sampling, sampling.pop("default", 1.0)))
+    handler.addFilter(ContextFilter())
+    listener = logging.handlers.QueueListener(log_queue, output)
+    listener.start()
+    return handler, listener
+
+def load_settings() -> Tuple[str, str, Dict[str, float]]:
+    """LOG_LEVEL, LOG_FORMAT ("json" or "text") and LOG_SAMPLING from env.json.
+
+    Read here rather than in config, which itself logs while loading.
+    LOG_SAMPLING maps message templates or function names to the fraction of
+    INFO/DEBUG records kept, e.g. {"default": 1.0, "User %s viewing category: %s": 0.1}.
+    """
+    try:
+        with open("env.json", "r") as f:
+            env = json.load(f)
+    except (OSError, ValueError):
+        env = {}
+    return env.get("LOG_LEVEL", "INFO"), env.get("LOG_FORMAT", "json"), env.get("LOG_SAMPLING", {})
 
 def setup_logger():
     """Configure and return the application logger"""
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
-        handlers=[
-            logging.StreamHandler(sys.stdout)
-        ]
-    )
+    level, fmt, sampling = load_settings()
+    # None of the output formats show these, so skip collecting them for every record
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+    logging.logAsyncioTasks = False
+    handler, listener = create_handler(fmt, sampling)
+    # Write out what is still queued when the process exits
+    atexit.register(listener.stop)
+    logging.basicConfig(level=level, handlers=[handler])
+    # httpx logs every Bot API request at INFO
+    logging.getLogger("httpx").setLevel(logging.WARNING)
     logger = logging.getLogger("JarqynBot")
     return logger
 
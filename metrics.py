@@ -0,0 +1,278 @@
+import bisect
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from telegram import Update
+from telegram.error import NetworkError, TimedOut
+from telegram.ext import ContextTypes, TypeHandler
+from telegram.request import HTTPXRequest
+
+import tracing
+from logger import logger, log_context
+from http_server import HTTPServer, Request, Response
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+class Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in sorted(self._values.items())]
+
+class Gauge(Metric):
+    """Gauge set directly with set(), or read at scrape time from `function`"""
+
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 function: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels) -> None:
+        self._values[self._key(labels)] = value
+
+    def get(self, default: Optional[float] = None, **labels) -> Optional[float]:
+        return self._values.get(self._key(labels), default)
+
+    def samples(self) -> List[str]:
+        if self.function is not None:
+            try:
+                self._values[()] = self.function()
+            except Exception as e:
+                logger.error(f"Error collecting metric {self.name}: {str(e)}")
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in sorted(self._values.items()) if value is not None]
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (last one is +Inf)], sum
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        entry = self._values.get(key)
+        if entry is None:
+            entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1][0] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total[0])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+              function: Optional[Callable[[], float]] = None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, function))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+registry = Registry()
+
+updates_total = registry.counter("bot_updates_total", "Updates received, by type", ["type"])
+update_errors_total = registry.counter("bot_update_errors_total", "Errors that reached error_handler, by exception",
+                                       ["error"])
+update_queue_depth = registry.gauge("bot_update_queue_depth", "Updates fetched but not yet handed to the update processor")
+updates_waiting = registry.gauge("bot_updates_waiting",
+                                 "Updates waiting for an earlier update of their chat or a free processing slot")
+updates_in_progress = registry.gauge("bot_updates_in_progress", "Updates being processed")
+update_wait_duration = registry.histogram("bot_update_wait_seconds",
+                                          "Time an update waited in the update processor before its handlers ran")
+handler_duration = registry.histogram("bot_handler_duration_seconds", "Handler latency by conversation state and handler",
+                                      ["state", "handler"])
+content_fetch_duration = registry.histogram("bot_content_fetch_duration_seconds",
+                                            "Duration of content document fetches (fetch_db refreshes)")
+content_fetch_errors_total = registry.counter("bot_content_fetch_errors_total", "Failed content document fetches")
+content_update_duration = registry.histogram("bot_content_update_duration_seconds",
+                                             "Duration of content document writes (update_db)")
+content_update_errors_total = registry.counter("bot_content_update_errors_total", "Failed content document writes")
+broadcast_messages_total = registry.counter("bot_broadcast_messages_total",
+                                            "Broadcast deliveries by final status (sent, failed, blocked)", ["status"])
+broadcast_retries_total = registry.counter("bot_broadcast_retries_total", "Broadcast sends retried after an error")
+broadcast_rate = registry.gauge("bot_broadcast_last_rate", "Messages/second of the last finished broadcast")
+api_requests_total = registry.counter("bot_api_requests_total", "Outbound Bot API calls by method and HTTP status",
+                                      ["method", "status"])
+api_request_duration = registry.histogram("bot_api_request_duration_seconds", "Outbound Bot API call latency",
+                                          ["method"])
+last_heartbeat = registry.gauge("bot_last_heartbeat_timestamp_seconds", "Unix time heartbeat_job last ran")
+
+# Updates are counted by the first of these fields that is set
+_UPDATE_TYPES = ("message", "callback_query", "edited_message", "inline_query", "my_chat_member", "chosen_inline_result")
+
+async def _count_update(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    for update_type in _UPDATE_TYPES:
+        if getattr(update, update_type, None) is not None:
+            break
+    else:
+        update_type = "other"
+    updates_total.inc(type=update_type)
+
+def update_counter_handler() -> TypeHandler:
+    """Handler for a group before all others that counts every update"""
+    return TypeHandler(Update, _count_update)
+
+Callback = Callable[[Update, ContextTypes.DEFAULT_TYPE], Awaitable[object]]
+
+@contextmanager
+def handling(state: str, handler: str, chat_id: Optional[int]):
+    """Label logs, record latency and add a trace span for one handler call"""
+    with log_context(chat_id=chat_id, state=state, handler=handler):
+        with handler_duration.time(state=state, handler=handler), tracing.span("handler", handler):
+            yield
+
+def timed(state: str, callback: Callback) -> Callback:
+    """Wrap a handler callback so its latency is recorded, and its logs labelled, under `state`"""
+    handler = callback.__name__
+
+    async def timed_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        chat_id = update.effective_chat.id if update.effective_chat else None
+        with handling(state, handler, chat_id):
+            return await callback(update, context)
+    timed_callback.__name__ = handler
+    return timed_callback
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest that counts Bot API calls and their latency by method, and traces them"""
+
+    async def do_request(self, url: str, method: str, *args, **kwargs) -> Tuple[int, bytes]:
+        api_method = url.rsplit("/", 1)[-1]
+        started = time.perf_counter()
+        status = "error"
+        try:
+            with tracing.span("api", api_method):
+                code, payload = await super().do_request(url, method, *args, **kwargs)
+            status = str(code)
+            return code, payload
+        except TimedOut:
+            status = "timeout"
+            raise
+        except NetworkError:
+            status = "network_error"
+            raise
+        finally:
+            api_requests_total.inc(method=api_method, status=status)
+            api_request_duration.observe(time.perf_counter() - started, method=api_method)
+
+class MetricsServer:
+    """Serves /metrics in Prometheus format plus liveness and readiness probes.
+
+    /healthz fails when the event loop cannot answer or heartbeat_job has not
+    run for `stale_after` seconds (the job queue is stuck). /readyz fails
+    until `ready()` returns True, e.g. before the first snapshot is loaded.
+    """
+
+    def __init__(self, listen: str, port: int, ready: Callable[[], Tuple[bool, str]], stale_after: float = 900):
+        self.http = HTTPServer(listen, port)
+        self.ready = ready
+        self.stale_after = stale_after
+        self.started = time.time()
+        self.http.route("GET", "/metrics", self.handle_metrics)
+        self.http.route("GET", "/healthz", self.handle_health)
+        self.http.route("GET", "/readyz", self.handle_ready)
+
+    async def handle_metrics(self, request: Request) -> Response:
+        return Response(200, registry.render().encode(), "text/plain; version=0.0.4; charset=utf-8")
+
+    async def handle_health(self, request: Request) -> Response:
+        last = last_heartbeat.get(self.started)
+        if time.time() - last > self.stale_after:
+            return Response(503, f"heartbeat stale for {time.time() - last:.0f}s\n".encode())
+        return Response(200, b"ok\n")
+
+    async def handle_ready(self, request: Request) -> Response:
+        ready, reason = self.ready()
+        return Response(200 if ready else 503, (reason + "\n").encode())
+
+    async def start(self) -> None:
+        await self.http.start()
+
+    async def stop(self) -> None:
+        await self.http.stop()
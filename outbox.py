@@ -0,0 +1,85 @@
+from typing import Iterable, Optional, Set
+
+from telegram import Bot, InlineKeyboardMarkup
+
+from logger import logger
+from broadcast import Broadcaster, broadcaster
+from storage import Storage, storage
+
+class Outbox:
+    """Persistent queue of broadcasts that survives restarts.
+
+    A broadcast is stored with one pending delivery row per chat before any
+    message is sent. A chat is marked "sending" before its first attempt and
+    every outcome is checkpointed as soon as it is known, so a restarted
+    process resumes with the chats that are still pending. Delivery is at
+    most once: chats left "sending" by a crash may or may not have got the
+    message and are marked "interrupted" rather than sent to again.
+    """
+
+    def __init__(self, storage: Storage, broadcaster: Broadcaster):
+        self.storage = storage
+        self.broadcaster = broadcaster
+        self._active: Set[str] = set()
+
+    async def enqueue(self, broadcast_id: str, text: str, chat_ids: Iterable[int],
+                      reply_markup: Optional[InlineKeyboardMarkup] = None, parse_mode: Optional[str] = None) -> bool:
+        """Store a broadcast for delivery; returns False if this broadcast_id was already enqueued"""
+        payload = {
+            "text": text,
+            "parse_mode": parse_mode,
+            "reply_markup": reply_markup.to_dict() if reply_markup else None,
+        }
+        created = await self.storage.create_broadcast(broadcast_id, payload, chat_ids)
+        if created:
+            logger.info("Enqueued broadcast %s", broadcast_id)
+        return created
+
+    async def deliver(self, bot: Bot, broadcast_id: str, payload: dict) -> None:
+        """Send a stored broadcast to every chat still pending"""
+        if broadcast_id in self._active:
+            logger.debug("Broadcast %s is already being delivered", broadcast_id)
+            return
+        self._active.add(broadcast_id)
+        try:
+            interrupted = await self.storage.get_deliveries(broadcast_id, "sending")
+            if interrupted:
+                logger.warning("Broadcast %s was being sent to %s chats when the previous run stopped; "
+                               "not sending to them again", broadcast_id, len(interrupted))
+                await self.storage.set_delivery_statuses(broadcast_id,
+                                                         [(chat_id, "interrupted") for chat_id, _ in interrupted])
+            pending = [chat_id for chat_id, _ in await self.storage.get_deliveries(broadcast_id, "pending")]
+            logger.info("Delivering broadcast %s to %s pending chats", broadcast_id, len(pending))
+            markup = InlineKeyboardMarkup.de_json(payload["reply_markup"], bot) if payload.get("reply_markup") else None
+
+            marked: Set[int] = set()
+
+            async def send(chat_id: int):
+                # Retries of the same chat are already marked
+                if chat_id not in marked:
+                    marked.add(chat_id)
+                    await self.storage.set_delivery_statuses(broadcast_id, [(chat_id, "sending")])
+                await bot.send_message(chat_id=chat_id, text=payload["text"], reply_markup=markup,
+                                       parse_mode=payload.get("parse_mode"))
+
+            async def checkpoint(chat_id: int, status: str):
+                await self.storage.set_delivery_statuses(broadcast_id, [(chat_id, status)])
+                # Users who blocked the bot are not sent future broadcasts
+                if status == "blocked":
+                    await self.storage.set_subscribed(chat_id, False)
+
+            await self.broadcaster.broadcast(pending, send, checkpoint)
+            remaining = await self.storage.get_deliveries(broadcast_id, "pending")
+            if remaining:
+                logger.warning("Broadcast %s still has %s pending chats, will resume later", broadcast_id, len(remaining))
+            else:
+                await self.storage.complete_broadcast(broadcast_id)
+        finally:
+            self._active.discard(broadcast_id)
+
+    async def resume(self, bot: Bot) -> None:
+        """Deliver every broadcast left unfinished by a previous run"""
+        for broadcast_id, payload in await self.storage.get_unfinished_broadcasts():
+            await self.deliver(bot, broadcast_id, payload)
+
+outbox = Outbox(storage, broadcaster)
@@ -0,0 +1,73 @@
+import hashlib
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+from telegram import InlineKeyboardButton
+
+from language import textjson
+
+PAGE_PREFIX = "pg"
+# Pattern for CallbackQueryHandler; other inline buttons must not match it
+PAGE_PATTERN = rf"^{PAGE_PREFIX}:"
+
+class Page(NamedTuple):
+    items: Sequence
+    offset: int
+    size: int
+    total: int
+
+    @property
+    def number(self) -> int:
+        return self.offset // self.size + 1
+
+    @property
+    def pages(self) -> int:
+        return max(1, -(-self.total // self.size))
+
+    @property
+    def has_prev(self) -> bool:
+        return self.offset > 0
+
+    @property
+    def has_next(self) -> bool:
+        return self.offset + self.size < self.total
+
+def page_of(items: Sequence, offset: int, size: int) -> Page:
+    """The page of `items` starting at `offset`, clamped to the last page if the list has shrunk"""
+    total = len(items)
+    offset = max(0, min(offset, (max(total - 1, 0) // size) * size))
+    return Page(items[offset:offset + size], offset, size, total)
+
+def short_key(text: str) -> str:
+    """Stable 8-character key for a name that may not fit in 64 bytes of callback data"""
+    return hashlib.blake2s(text.encode(), digest_size=4).hexdigest()
+
+def page_callback(view: str, key: str, offset: int) -> str:
+    """Callback data of the page of `view` starting at `offset`; the offset is the cursor"""
+    return f"{PAGE_PREFIX}:{view}:{key}:{offset}"
+
+def parse_page_callback(data: str) -> Optional[Tuple[str, str, int]]:
+    """(view, key, offset) from page callback data, or None if it is malformed"""
+    parts = data.split(":")
+    if len(parts) != 4 or parts[0] != PAGE_PREFIX:
+        return None
+    try:
+        offset = int(parts[3])
+    except ValueError:
+        return None
+    return parts[1], parts[2], max(offset, 0)
+
+def navigation_row(view: str, key: str, page: Page) -> List[InlineKeyboardButton]:
+    """Previous / "page of pages" / next buttons, or no buttons for a single page"""
+    if page.pages == 1:
+        return []
+    row = []
+    if page.has_prev:
+        row.append(InlineKeyboardButton(textjson.common.prev_page,
+                                        callback_data=page_callback(view, key, page.offset - page.size)))
+    # Pressing the counter shows the same page again
+    row.append(InlineKeyboardButton(textjson.common.page_counter.format(page=page.number, pages=page.pages),
+                                    callback_data=page_callback(view, key, page.offset)))
+    if page.has_next:
+        row.append(InlineKeyboardButton(textjson.common.next_page,
+                                        callback_data=page_callback(view, key, page.offset + page.size)))
+    return row
@@ -0,0 +1,206 @@
+import asyncio
+import json
+from typing import Dict, List, Optional, Set, Tuple
+
+from telegram import Update
+from telegram.ext import Application, BasePersistence, ContextTypes, PersistenceInput, TypeHandler
+
+from logger import logger
+from storage import Storage, StorageError, storage
+from config import PERSISTENCE_UPDATE_INTERVAL
+
+def conversation_states(application: Application) -> Dict[str, dict]:
+    """The live state dict of every persistent ConversationHandler of `application`, by name.
+
+    PTB has no public accessor for them; the private attribute read here is
+    checked against the versions allowed in pyproject.toml. Raises
+    RuntimeError if it is missing, so an incompatible upgrade fails at startup.
+    """
+    conversations = getattr(application, "_conversation_handler_conversations", None)
+    if not isinstance(conversations, dict):
+        raise RuntimeError("This python-telegram-bot version keeps no Application._conversation_handler_conversations "
+                           "dict; conversation states cannot be loaded per chat")
+    return conversations
+
+class StoragePersistence(BasePersistence):
+    """Persists ConversationHandler states and user_data in the local Storage.
+
+    Nothing is read at startup. A chat's user_data and conversation states are
+    loaded the first time an update from that chat gets past flood control (see
+    preload_handler); PTB's own refresh_user_data hook runs for every update,
+    dropped ones included, so it reads nothing. Writes are deltas: each user_data key is compared with the
+    last stored JSON and only changed or removed keys are written. All changes
+    collected during one Application.update_persistence run (every
+    `update_interval` seconds and on shutdown) go to storage in one batch.
+    """
+
+    def __init__(self, storage: Storage, update_interval: float = 60):
+        super().__init__(store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True,
+                                                     callback_data=False),
+                         update_interval=update_interval)
+        self.storage = storage
+        self._loaded_users: Set[int] = set()
+        self._loaded_chats: Set[int] = set()
+        # Last stored JSON value of every user_data key, per loaded user
+        self._stored: Dict[int, Dict[str, str]] = {}
+        self._user_upserts: Dict[Tuple[int, str], str] = {}
+        self._user_deletes: Set[Tuple[int, str]] = set()
+        self._conversation_changes: Dict[Tuple[str, str], Tuple[int, Optional[str]]] = {}
+        self._write_task: Optional[asyncio.Task] = None
+        self._conversations: Dict[str, dict] = {}
+
+    # Loading: everything starts empty and is filled in per chat on first access
+
+    async def get_user_data(self) -> Dict[int, dict]:
+        return {}
+
+    async def get_chat_data(self) -> Dict[int, dict]:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def get_conversations(self, name: str) -> dict:
+        return {}
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        pass
+
+    async def load_user_data(self, user_id: int, user_data: dict) -> None:
+        """Fill a user's user_data with what is stored for them"""
+        if user_id in self._loaded_users:
+            return
+        stored = await self.storage.get_user_data(user_id)
+        self._loaded_users.add(user_id)
+        self._stored[user_id] = stored
+        for key, value in stored.items():
+            # Values set in memory before the load finished are newer
+            user_data.setdefault(key, json.loads(value))
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    async def load_conversations(self, conversations: Dict[str, dict], chat_id: int) -> None:
+        """Fill the conversation handlers' state dicts with what is stored for a chat"""
+        if chat_id in self._loaded_chats:
+            return
+        rows = await self.storage.get_conversations(chat_id)
+        self._loaded_chats.add(chat_id)
+        for name, key, state in rows:
+            states = conversations.get(name)
+            key = tuple(json.loads(key))
+            if states is not None and key not in states:
+                states.update_no_track({key: json.loads(state)})
+
+    async def _preload(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        user, chat = update.effective_user, update.effective_chat
+        if user is not None:
+            try:
+                await self.load_user_data(user.id, context.user_data)
+            except StorageError as e:
+                logger.error(f"Could not load user_data of user {user.id}: {str(e)}")
+        if chat is not None:
+            try:
+                await self.load_conversations(self._conversations, chat.id)
+            except StorageError as e:
+                logger.error(f"Could not load conversation state for chat {chat.id}: {str(e)}")
+
+    def preload_handler(self, application: Application) -> TypeHandler:
+        """Handler for group -1 that loads a chat's state after flood control and before ConversationHandler"""
+        # Application fills this dict in place when it is initialized, so the reference stays valid
+        self._conversations = conversation_states(application)
+        return TypeHandler(Update, self._preload)
+
+    # Writing: updates are only collected here and written together by _write_pending
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        stored = self._stored.setdefault(user_id, {})
+        encoded = {key: json.dumps(value, ensure_ascii=False) for key, value in data.items()}
+        for key, value in encoded.items():
+            if stored.get(key) != value:
+                self._user_upserts[(user_id, key)] = value
+                self._user_deletes.discard((user_id, key))
+        for key in stored.keys() - encoded.keys():
+            self._user_deletes.add((user_id, key))
+            self._user_upserts.pop((user_id, key), None)
+        self._stored[user_id] = encoded
+        self._schedule_write()
+
+    async def update_conversation(self, name: str, key: tuple, new_state: Optional[object]) -> None:
+        encoded_state = None if new_state is None else json.dumps(new_state)
+        self._conversation_changes[(name, json.dumps(list(key)))] = (key[0], encoded_state)
+        self._schedule_write()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._stored.pop(user_id, None)
+        self._user_upserts = {k: v for k, v in self._user_upserts.items() if k[0] != user_id}
+        self._user_deletes = {k for k in self._user_deletes if k[0] != user_id}
+        await self.storage.delete_user_data(user_id)
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    def _schedule_write(self) -> None:
+        # update_persistence calls the update_* methods concurrently; one task writes them all
+        if self._write_task is None or self._write_task.done():
+            self._write_task = asyncio.create_task(self._write_pending())
+
+    def _has_pending(self) -> bool:
+        return bool(self._user_upserts or self._user_deletes or self._conversation_changes)
+
+    async def _write_pending(self) -> None:
+        await asyncio.sleep(0)
+        # Changes made while a batch is being written go into the next batch
+        while self._has_pending():
+            user_upserts = [(user_id, key, value) for (user_id, key), value in self._user_upserts.items()]
+            user_deletes = list(self._user_deletes)
+            conversation_upserts: List[tuple] = []
+            conversation_deletes: List[tuple] = []
+            for (name, key), (chat_id, state) in self._conversation_changes.items():
+                if state is None:
+                    conversation_deletes.append((name, key))
+                else:
+                    conversation_upserts.append((name, key, chat_id, state))
+            self._user_upserts, self._user_deletes, self._conversation_changes = {}, set(), {}
+            try:
+                if user_upserts or user_deletes:
+                    await self.storage.update_user_data(user_upserts, user_deletes)
+                if conversation_upserts or conversation_deletes:
+                    await self.storage.update_conversations(conversation_upserts, conversation_deletes)
+            except StorageError as e:
+                logger.error(f"Failed to persist conversation state, will retry: {str(e)}")
+                # Keep unwritten changes for the next run unless newer ones replaced them
+                for user_id, key, value in user_upserts:
+                    if (user_id, key) not in self._user_deletes:
+                        self._user_upserts.setdefault((user_id, key), value)
+                self._user_deletes |= {k for k in user_deletes if k not in self._user_upserts}
+                for name, key, chat_id, state in conversation_upserts:
+                    self._conversation_changes.setdefault((name, key), (chat_id, state))
+                for name, key in conversation_deletes:
+                    self._conversation_changes.setdefault((name, key), (None, None))
+                return
+            logger.debug("Persisted %s user_data keys and %s conversation states",
+                         len(user_upserts) + len(user_deletes), len(conversation_upserts) + len(conversation_deletes))
+
+    async def flush(self) -> None:
+        if self._write_task is not None:
+            await self._write_task
+        if self._has_pending():
+            await self._write_pending()
+
+persistence = StoragePersistence(storage, PERSISTENCE_UPDATE_INTERVAL)
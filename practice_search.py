@@ -0,0 +1,121 @@
+import re
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+
+from classes import Practice
+from snapshot import DataSnapshot
+
+_NON_WORD = re.compile(r"[\W_]+")
+
+def normalize(text) -> str:
+    """Lowercase words separated by single spaces, with ё folded into е: "Дыхание, Ёлка!" -> "дыхание елка" """
+    if not isinstance(text, str):
+        return ""
+    return _NON_WORD.sub(" ", text.casefold().replace("ё", "е")).strip()
+
+def _trigrams(text: str) -> set:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+# Fields in rank order: a word of the name beats one of the category, which beats the description
+_FIELDS = ("name", "category", "description")
+# Rank of a match found only inside a word, through the trigram index
+_INFIX_RANK = 2 * len(_FIELDS)
+
+class PracticeSearchIndex:
+    """Practices by the words of their name, category and description, built once per snapshot.
+
+    Every query word must match. A word matches a practice when it starts one
+    of its words, found by bisecting the sorted vocabulary; words of three or
+    more letters also match inside a word ("дых" in "вдыхание") through a
+    trigram index over the vocabulary, which is far smaller than the texts.
+    Results are ranked by where each word matched (whole word before prefix,
+    name before category before description, prefix before infix), then by
+    directory order.
+    """
+
+    __slots__ = ("practices", "_vocabulary", "_postings", "_trigrams")
+
+    def __init__(self, practices: Tuple[Practice, ...]):
+        self.practices = practices
+        # word -> {position: best field}
+        postings: Dict[str, Dict[int, int]] = {}
+        for position, practice in enumerate(practices):
+            for rank, field in enumerate(_FIELDS):
+                for word in normalize(practice.get(field)).split():
+                    best = postings.setdefault(word, {})
+                    if best.get(position, rank) >= rank:
+                        best[position] = rank
+        self._vocabulary: List[str] = sorted(postings)
+        self._postings = postings
+        # trigram -> indexes in the vocabulary of the words containing it
+        trigrams: Dict[str, List[int]] = {}
+        for index, word in enumerate(self._vocabulary):
+            for trigram in _trigrams(word):
+                trigrams.setdefault(trigram, []).append(index)
+        self._trigrams = trigrams
+
+    def search(self, query: str) -> List[Practice]:
+        """Practices matching every word of `query`, best first; all of them in directory order for an empty query"""
+        words = normalize(query).split()
+        if not words:
+            return list(self.practices)
+        scores: Optional[Dict[int, int]] = None
+        for word in words:
+            matches = self._match(word)
+            if scores is None:
+                scores = matches
+            else:
+                scores = {position: score + matches[position] for position, score in scores.items()
+                          if position in matches}
+            if not scores:
+                return []
+        # One integer per practice sorts much faster than (score, position) tuples
+        count = len(self.practices)
+        order = sorted(score * count + position for position, score in scores.items())
+        return [self.practices[key % count] for key in order]
+
+    def _match(self, word: str) -> Dict[int, int]:
+        """{position: rank} of the practices `word` matches"""
+        ranks: Dict[int, int] = {}
+        vocabulary = self._vocabulary
+        index = bisect_left(vocabulary, word)
+        while index < len(vocabulary) and vocabulary[index].startswith(word):
+            candidate = vocabulary[index]
+            partial = candidate != word
+            for position, field in self._postings[candidate].items():
+                rank = 2 * field + partial
+                if ranks.get(position, _INFIX_RANK) > rank:
+                    ranks[position] = rank
+            index += 1
+        if len(word) >= 3:
+            for candidate in self._containing(word):
+                for position in self._postings[candidate]:
+                    ranks.setdefault(position, _INFIX_RANK)
+        return ranks
+
+    def _containing(self, word: str) -> List[str]:
+        """Words of the vocabulary with `word` inside them, not at the start (those are prefix matches)"""
+        postings = sorted((self._trigrams.get(trigram, ()) for trigram in _trigrams(word)), key=len)
+        if not postings[0]:
+            return []
+        candidates = set(postings[0])
+        for other in postings[1:]:
+            candidates.intersection_update(other)
+            if not candidates:
+                return []
+        # All trigrams can occur without the word itself ("абв" and "бвг" in "абвxбвг")
+        found = []
+        for index in candidates:
+            candidate = self._vocabulary[index]
+            if word in candidate and not candidate.startswith(word):
+                found.append(candidate)
+        return found
+
+_index: Optional[Tuple[int, PracticeSearchIndex]] = None
+
+def index_for(snapshot: DataSnapshot) -> PracticeSearchIndex:
+    """The search index of `snapshot`, built on first use and kept until a newer snapshot is searched"""
+    global _index
+    if _index is None or _index[0] != snapshot.version:
+        _index = (snapshot.version, PracticeSearchIndex(snapshot.practices))
+    return _index[1]
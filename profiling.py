@@ -0,0 +1,140 @@
+import asyncio
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+from logger import logger
+
+MODES = ("sample", "cprofile")
+
+class ProfilerBusy(Exception):
+    """Raised when a profile is requested while another one is running"""
+
+class ProfileResult:
+    """Top hot spots as text plus a dump file for offline analysis"""
+
+    def __init__(self, mode: str, seconds: float, report: str, dump: bytes, filename: str):
+        self.mode = mode
+        self.seconds = seconds
+        self.report = report
+        self.dump = dump
+        self.filename = filename
+
+def _label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class StackSampler:
+    """Samples the stack of one thread from a background thread.
+
+    Costs the profiled thread nothing but the GIL switches needed to read its
+    frames, so it is safe to run on a loaded bot. Stacks are kept as tuples of
+    code objects, root first, counted per distinct stack.
+    """
+
+    def __init__(self, thread_id: int, interval: float = 0.005, max_depth: int = 64):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            if stack:
+                stack.reverse()
+                self.stacks[tuple(stack)] += 1
+
+    def report(self, top: int = 20) -> str:
+        total = sum(self.stacks.values())
+        if not total:
+            return "no samples"
+        own: Counter = Counter()
+        inclusive: Counter = Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            # A recursive function is counted once per sample
+            for code in set(stack):
+                inclusive[code] += count
+        lines = [f"{total} samples every {self.interval * 1000:g} ms", "", "own time:"]
+        lines.extend(f"{count / total:6.1%}  {_label(code)}" for code, count in own.most_common(top))
+        lines.extend(["", "including callees:"])
+        lines.extend(f"{count / total:6.1%}  {_label(code)}" for code, count in inclusive.most_common(top))
+        return "\n".join(lines)
+
+    def collapsed(self) -> bytes:
+        """Stacks in the collapsed format read by flamegraph.pl and speedscope"""
+        lines = [";".join(_label(code) for code in stack) + f" {count}" for stack, count in self.stacks.items()]
+        return ("\n".join(lines) + "\n").encode()
+
+def _cprofile_report(profile: cProfile.Profile, top: int = 20) -> str:
+    output = io.StringIO()
+    stats = pstats.Stats(profile, stream=output)
+    stats.strip_dirs().sort_stats(pstats.SortKey.TIME).print_stats(top)
+    # Skip the preamble; the table header and rows are what matter in a chat
+    text = output.getvalue()
+    start = text.find("   ncalls")
+    return text[start:].rstrip() if start >= 0 else text.strip()
+
+class Profiler:
+    """Runs at most one profile of the event loop thread at a time.
+
+    "sample" reads the loop thread's stack from another thread and reports
+    where time is spent with almost no overhead; "cprofile" records every
+    call with cProfile, which is exact but slows the bot down while it runs.
+    Nothing is installed outside a run.
+    """
+
+    def __init__(self):
+        self.running: Optional[str] = None
+
+    async def run(self, seconds: float, mode: str = "sample") -> ProfileResult:
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiler mode {mode}")
+        if self.running is not None:
+            raise ProfilerBusy(self.running)
+        self.running = mode
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        logger.info("Profiling the event loop with %s for %s s", mode, seconds)
+        try:
+            if mode == "cprofile":
+                profile = cProfile.Profile()
+                profile.enable()
+                try:
+                    await asyncio.sleep(seconds)
+                finally:
+                    profile.disable()
+                profile.create_stats()
+                # The .prof format that pstats.Stats and snakeviz load
+                dump = marshal.dumps(profile.stats)
+                return ProfileResult(mode, seconds, _cprofile_report(profile), dump, f"profile-{stamp}.prof")
+            sampler = StackSampler(threading.get_ident())
+            sampler.start()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                sampler.stop()
+            return ProfileResult(mode, seconds, sampler.report(), sampler.collapsed(), f"stacks-{stamp}.txt")
+        finally:
+            self.running = None
+
+profiler = Profiler()
@@ -0,0 +1,116 @@
+import re
+from bisect import bisect_left
+from collections.abc import Sequence
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from classes import Psychologist
+
+# "Тревожность, депрессия / отношения; выгорание"
+_SPECIALTY_SEPARATORS = re.compile(r"[,;/\n]")
+
+def parse_price(price) -> Optional[int]:
+    """Consultation price as a number, or None if it is missing, malformed or 0 ("to be agreed")"""
+    try:
+        num = int(price)
+    except (ValueError, TypeError):
+        return None
+    return num or None
+
+def split_specialties(specialty) -> List[str]:
+    """Separate specialties of a psychologist, in the order written, without duplicates"""
+    if not isinstance(specialty, str):
+        return []
+    seen = {}
+    for part in _SPECIALTY_SEPARATORS.split(specialty):
+        part = part.strip()
+        if part and specialty_key(part) not in seen:
+            seen[specialty_key(part)] = part
+    return list(seen.values())
+
+def specialty_key(specialty: str) -> str:
+    return " ".join(specialty.casefold().split())
+
+class SliceView(Sequence):
+    """Read-only window of a tuple; slicing it or taking its length does not copy the tuple"""
+    __slots__ = ("_items", "_start", "_stop")
+
+    def __init__(self, items: tuple, start: int, stop: int):
+        self._items = items
+        self._start = start
+        self._stop = max(start, stop)
+
+    def __len__(self) -> int:
+        return self._stop - self._start
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            return self._items[self._start + start:self._start + stop:step]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self._items[self._start + index]
+
+class _Group:
+    """Psychologists of one specialty (or all of them): in directory order, and those with a price by price"""
+    __slots__ = ("records", "prices", "by_price")
+
+    def __init__(self, records: List[Psychologist]):
+        self.records = tuple(records)
+        # sorted() is stable, so equal prices keep directory order
+        priced = sorted(((price, record) for record in records
+                         if (price := parse_price(record.get("price"))) is not None), key=lambda item: item[0])
+        self.prices = tuple(price for price, _ in priced)
+        self.by_price = tuple(record for _, record in priced)
+
+class PsychologistIndex:
+    """Psychologists by specialty and price, built once per snapshot.
+
+    Each specialty (split from the free-text `specialty` field and matched
+    case-insensitively) maps to its psychologists in directory order and to
+    the same psychologists sorted by price, so a filter is a dict lookup plus
+    two bisections, and its result is a view rather than a copy. Records are
+    only read, never modified.
+    """
+
+    __slots__ = ("specialties", "_all", "_groups")
+
+    def __init__(self, psychologists: Tuple[Psychologist, ...]):
+        members: Dict[str, List[Psychologist]] = {}
+        labels: Dict[str, str] = {}
+        for psychologist in psychologists:
+            for specialty in split_specialties(psychologist.get("specialty")):
+                key = specialty_key(specialty)
+                labels.setdefault(key, specialty[:1].upper() + specialty[1:])
+                members.setdefault(key, []).append(psychologist)
+        self._all = _Group(list(psychologists))
+        self._groups: Mapping[str, _Group] = MappingProxyType({key: _Group(records) for key, records in members.items()})
+        # Most common first, then in order of first appearance
+        self.specialties: Tuple[str, ...] = tuple(labels[key] for key in sorted(members, key=lambda k: -len(members[k])))
+
+    def count(self, specialty: Optional[str] = None) -> int:
+        group = self._group(specialty)
+        return len(group.records) if group else 0
+
+    def search(self, specialty: Optional[str] = None, low: Optional[int] = None,
+               high: Optional[int] = None) -> Sequence:
+        """Psychologists of `specialty` (None for any) whose price is in [low, high).
+
+        Without a price bound the result is in directory order and includes
+        psychologists whose price is unknown; with one it is sorted by price.
+        """
+        group = self._group(specialty)
+        if group is None:
+            return ()
+        if low is None and high is None:
+            return group.records
+        start = bisect_left(group.prices, low) if low is not None else 0
+        stop = bisect_left(group.prices, high) if high is not None else len(group.prices)
+        return SliceView(group.by_price, start, stop)
+
+    def _group(self, specialty: Optional[str]) -> Optional[_Group]:
+        if specialty is None:
+            return self._all
+        return self._groups.get(specialty_key(specialty))
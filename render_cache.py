@@ -0,0 +1,61 @@
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+import db
+import metrics
+import tracing
+from language import LOCALE
+from snapshot import DataSnapshot
+
+class RenderCache:
+    """Cache of fully rendered responses (text and reply markup) for read-only views.
+
+    Entries are keyed by (view, argument, snapshot version, locale). When a
+    newer snapshot version is seen the whole cache is swapped for an empty one,
+    so stale renders are never served. The least recently used entries are
+    evicted beyond `max_entries`.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, Any]" = OrderedDict()
+        self._version = None
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def get_or_render(self, view: str, argument: Hashable, version: int, render: Callable[[], Any],
+                      locale: str = LOCALE) -> Any:
+        if version != self._version:
+            if self._version is not None:
+                self.stats["invalidations"] += 1
+            self._entries = OrderedDict()
+            self._version = version
+        key = (view, argument, version, locale)
+        entries = self._entries
+        if key in entries:
+            entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entries[key]
+        self.stats["misses"] += 1
+        value = render()
+        entries[key] = value
+        if len(entries) > self.max_entries:
+            entries.popitem(last=False)
+            self.stats["evictions"] += 1
+        return value
+
+    def get_stats(self) -> dict:
+        stats = dict(self.stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        stats["entries"] = len(self._entries)
+        return stats
+
+render_cache = RenderCache()
+metrics.registry.gauge("bot_render_cache_hit_ratio", "Share of menu and listing renders served from cache",
+                       function=lambda: render_cache.get_stats()["hit_ratio"])
+
+async def render(view: str, argument: Hashable, render_func: Callable[[DataSnapshot], Any]) -> Any:
+    """Render a view from the current snapshot, reusing the cached result when possible"""
+    snapshot = await db.fetch_db()
+    with tracing.span("render", view):
+        return render_cache.get_or_render(view, argument, snapshot.version, lambda: render_func(snapshot))
@@ -0,0 +1,73 @@
+import re
+from typing import Awaitable, Callable, Dict, Optional
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from metrics import handling
+
+Callback = Callable[[Update, ContextTypes.DEFAULT_TYPE], Awaitable[object]]
+
+# Emoji and pictographs, arrows, dingbats and other symbol blocks, plus the joiners, variation selectors,
+# keycap and tag characters emoji are built from
+_SYMBOLS = re.compile("[\u00a9\u00ae\u200b-\u200f\u2190-\u2bff\u20e3\ufe00-\ufe0f"
+                      "\U0001f000-\U0001faff\U000e0000-\U000e007f]+")
+
+def strip_symbols(text: str) -> str:
+    """Text without emoji and variation selectors, with whitespace collapsed"""
+    return " ".join(_SYMBOLS.sub(" ", text).split())
+
+def normalize(text: str) -> str:
+    """Button text without emoji, variation selectors and case, e.g. "Назад ↩️" -> "назад" """
+    return strip_symbols(text).casefold()
+
+class StateRouter:
+    """Dispatches the text messages of one conversation state by button text.
+
+    Button texts and their normalized forms are registered as aliases when
+    the routes are built, so a button press or a typed variant ("назад",
+    missing emoji) is resolved with one dict lookup on the raw text. With
+    `first_word`, a message is also matched by its first word, as the main
+    menu always did ("Узнать" opens "Узнать о JARQYN"). Other text no longer
+    than a button is normalized once and looked up again; anything else goes
+    to `default` without being normalized.
+    Handler latency is recorded under the router's `state` name.
+    """
+
+    def __init__(self, default: Callback, routes: Optional[Dict[str, Callback]] = None, state: str = "",
+                 first_word: bool = False):
+        self.default = default
+        self.state = state
+        self.first_word = first_word
+        self._aliases: Dict[str, Callback] = {}
+        self._first_words: Dict[str, Callback] = {}
+        self._longest = 0
+        for text, handler in (routes or {}).items():
+            self.add(text, handler)
+
+    def add(self, text: str, handler: Callback) -> None:
+        without_symbols = strip_symbols(text)
+        for alias in (without_symbols.casefold(), without_symbols, without_symbols.lower(),
+                      without_symbols.capitalize(), without_symbols.upper(), text.lower(), text.strip()):
+            self._aliases.setdefault(alias, handler)
+        # The button text itself always wins over another button's alias
+        self._aliases[text] = handler
+        self._longest = max(self._longest, len(text))
+        if self.first_word:
+            self._first_words.setdefault(text.split(" ")[0], handler)
+
+    def resolve(self, text: str) -> Callback:
+        handler = self._aliases.get(text)
+        if handler is None and self.first_word:
+            handler = self._first_words.get(text.split(" ", 1)[0])
+        if handler is None:
+            # Doubled spaces around a button's text are about as long as it gets
+            if len(text) > 2 * self._longest:
+                return self.default
+            handler = self._aliases.get(normalize(text), self.default)
+        return handler
+
+    async def __call__(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        handler = self.resolve(update.message.text)
+        with handling(self.state, handler.__name__, update.effective_chat.id):
+            return await handler(update, context)
@@ -0,0 +1,91 @@
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from classes import Data, Event, Practice, University
+from pagination import short_key
+from psychologist_index import PsychologistIndex
+
+DEFAULT_START_TEXT = "Привет, я - DOS 🤖\nДруг проекта JARQYN\n"
+
+def _group_by(records, key: str) -> Mapping[Any, Tuple[dict, ...]]:
+    """Group records by a field, keeping the original order inside each group"""
+    groups: Dict[Any, List[dict]] = {}
+    for record in records:
+        groups.setdefault(record.get(key), []).append(record)
+    return MappingProxyType({name: tuple(items) for name, items in groups.items()})
+
+class DataSnapshot:
+    """Immutable view of the bot document with lookup indexes built once per refresh.
+
+    Collections are exposed as tuples and read-only mappings; the records
+    themselves are shared with the raw document and must not be modified.
+    ``version`` increases monotonically with every rebuilt snapshot, so caches
+    derived from the data can use it as part of their key.
+    """
+
+    __slots__ = (
+        "version", "data", "start_text", "practices", "partners", "psychologists", "universities",
+        "contacts", "events", "admin_ids", "users", "user_ids",
+        "practice_by_id", "practice_categories", "practice_category_by_key", "practices_by_category",
+        "events_by_university", "university_by_name", "psychologist_index",
+    )
+
+    def __init__(self, data: Data, version: int = 0):
+        bot_info = data.get("bot_info", {})
+        start_text = bot_info.get("start_text", "").replace("\\n", "\n")
+        # If no start text is found in the database, use a default message
+        if not start_text:
+            start_text = DEFAULT_START_TEXT
+
+        practices: Tuple[Practice, ...] = tuple(bot_info.get("practices", []))
+        universities: Tuple[University, ...] = tuple(bot_info.get("universities", []))
+        events: Tuple[Event, ...] = tuple(bot_info.get("events", []))
+        users: Tuple[int, ...] = tuple(data.get("users", []))
+        psychologists = tuple(bot_info.get("psychologists", []))
+        practices_by_category = _group_by(practices, "category")
+        # A practice without a category has no page of its own
+        categories = tuple(c for c in practices_by_category if isinstance(c, str))
+
+        fields = {
+            "version": version,
+            "data": data,
+            "start_text": start_text + "\nВыбери действие из меню ниже:",
+            "practices": practices,
+            "partners": tuple(bot_info.get("partners", [])),
+            "psychologists": psychologists,
+            "universities": universities,
+            "contacts": tuple(bot_info.get("contacts", [])),
+            "events": events,
+            "admin_ids": tuple(data.get("admin_ids", [])),
+            "users": users,
+            "user_ids": frozenset(users),
+            "practice_by_id": MappingProxyType({p.get("id"): p for p in practices if p.get("id") is not None}),
+            # dicts keep insertion order, so categories stay in order of first appearance
+            "practice_categories": categories,
+            # Category pages' callback data carry the short_key of the category
+            "practice_category_by_key": MappingProxyType({short_key(c): c for c in categories}),
+            "practices_by_category": practices_by_category,
+            "events_by_university": _group_by(events, "universityId"),
+            "university_by_name": MappingProxyType({u.get("name"): u for u in universities}),
+            "psychologist_index": PsychologistIndex(psychologists),
+        }
+        for name, value in fields.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def get_practice(self, practice_id) -> Optional[Practice]:
+        return self.practice_by_id.get(practice_id)
+
+    def get_practices_by_category(self, category: str) -> Tuple[Practice, ...]:
+        return self.practices_by_category.get(category, ())
+
+    def get_university_events(self, university_id) -> Tuple[Event, ...]:
+        return self.events_by_university.get(university_id, ())
+
+    def get_university_by_name(self, name: str) -> Optional[University]:
+        return self.university_by_name.get(name)
@@ -0,0 +1,217 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Optional
+
+import httpx
+
+logger = logging.getLogger("JarqynBot.Sources")
+
+ChangeCallback = Callable[[], Awaitable[None]]
+
+class ContentSource(ABC):
+    """Where the editorial document comes from.
+
+    fetch() returns the raw document bytes, or None when the source can tell
+    the content is unchanged since the previous fetch. Sources that can detect
+    changes themselves set `supports_watch` and implement watch(), which calls
+    `on_change` whenever the document changes and keeps watching after errors.
+    """
+
+    supports_watch = False
+
+    @abstractmethod
+    async def fetch(self, conditional: bool = True) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    async def write(self, data: dict) -> None:
+        ...
+
+    async def watch(self, on_change: ChangeCallback) -> None:
+        """Only called when `supports_watch` is set"""
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+class HttpSource(ContentSource):
+    """JSON document behind an HTTP endpoint (npoint), fetched with conditional requests"""
+
+    # Fail fast on connect, allow slower reads of the whole document
+    timeout = httpx.Timeout(connect=3.0, read=10.0, write=10.0, pool=5.0)
+    limits = httpx.Limits(max_connections=10, max_keepalive_connections=5, keepalive_expiry=60.0)
+
+    def __init__(self, url: str):
+        self.url = url
+        self._client: Optional[httpx.AsyncClient] = None
+        self._etag: Optional[str] = None
+        self._last_modified: Optional[str] = None
+
+    def get_client(self) -> httpx.AsyncClient:
+        """Return the shared keep-alive HTTP client, creating it on first use"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=self.timeout, limits=self.limits)
+        return self._client
+
+    async def fetch(self, conditional: bool = True) -> Optional[bytes]:
+        headers = {}
+        if conditional:
+            if self._etag:
+                headers["If-None-Match"] = self._etag
+            if self._last_modified:
+                headers["If-Modified-Since"] = self._last_modified
+        response = await self.get_client().get(self.url, headers=headers)
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+        self._etag = response.headers.get("ETag")
+        self._last_modified = response.headers.get("Last-Modified")
+        return response.content
+
+    async def write(self, data: dict) -> None:
+        response = await self.get_client().post(self.url, json=data)
+        response.raise_for_status()
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+class FileSource(ContentSource):
+    """Local JSON file, watched for changes by polling its modification time"""
+
+    supports_watch = True
+
+    def __init__(self, path: str, poll_interval: float = 1.0):
+        self.path = path
+        self.poll_interval = poll_interval
+        self._seen_stat: Optional[tuple] = None
+
+    def _stat(self) -> Optional[tuple]:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    async def fetch(self, conditional: bool = True) -> Optional[bytes]:
+        stat = self._stat()
+        if conditional and stat is not None and stat == self._seen_stat:
+            return None
+        def read():
+            with open(self.path, "rb") as f:
+                return f.read()
+        raw = await asyncio.to_thread(read)
+        self._seen_stat = stat
+        return raw
+
+    async def write(self, data: dict) -> None:
+        def write_file():
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        await asyncio.to_thread(write_file)
+
+    async def watch(self, on_change: ChangeCallback) -> None:
+        last = self._stat()
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                current = self._stat()
+                if current != last:
+                    logger.info("Content file %s changed", self.path)
+                    await on_change()
+                    last = current
+            except Exception as e:
+                # A dead watch would freeze the snapshot until restart, so keep polling
+                logger.error(f"Error watching content file {self.path}: {str(e)}", exc_info=True)
+
+class SQLiteSource(ContentSource):
+    """Document stored as a JSON row in a SQLite table, e.g. written by an admin tool.
+
+    Changes are detected with PRAGMA data_version, which increases whenever
+    another connection commits to the database file.
+    """
+
+    supports_watch = True
+
+    def __init__(self, path: str, table: str = "content", key: str = "document", poll_interval: float = 1.0):
+        self.path = path
+        self.table = table
+        self.key = key
+        self.poll_interval = poll_interval
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = asyncio.Lock()
+        self._updated_at: Optional[float] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} (key TEXT PRIMARY KEY, body TEXT NOT NULL, updated_at REAL NOT NULL)")
+            self._conn.commit()
+        return self._conn
+
+    async def _run(self, func):
+        async with self._lock:
+            return await asyncio.to_thread(lambda: func(self._connect()))
+
+    async def fetch(self, conditional: bool = True) -> Optional[bytes]:
+        row = await self._run(lambda conn: conn.execute(
+            f"SELECT body, updated_at FROM {self.table} WHERE key = ?", (self.key,)).fetchone())
+        if row is None:
+            raise LookupError(f"No '{self.key}' row in {self.path}:{self.table}")
+        body, updated_at = row
+        if conditional and updated_at == self._updated_at:
+            return None
+        self._updated_at = updated_at
+        return body.encode("utf-8")
+
+    async def write(self, data: dict) -> None:
+        body = json.dumps(data, ensure_ascii=False)
+        def upsert(conn):
+            with conn:
+                conn.execute(
+                    f"INSERT INTO {self.table} (key, body, updated_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT (key) DO UPDATE SET body = excluded.body, updated_at = excluded.updated_at",
+                    (self.key, body, time.time()))
+        await self._run(upsert)
+
+    async def watch(self, on_change: ChangeCallback) -> None:
+        data_version = lambda conn: conn.execute("PRAGMA data_version").fetchone()[0]
+        last = None
+        while True:
+            try:
+                current = await self._run(data_version)
+                # The first reading is the baseline; it is not a change
+                if last is not None and current != last:
+                    logger.info("Content table %s:%s changed", self.path, self.table)
+                    await on_change()
+                last = current
+            except Exception as e:
+                # A dead watch would freeze the snapshot until restart, so keep polling
+                logger.error(f"Error watching content table {self.path}:{self.table}: {str(e)}", exc_info=True)
+            await asyncio.sleep(self.poll_interval)
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+def create_source(url: str) -> ContentSource:
+    """Create a content source: an http(s) URL, "file:<path>" or "sqlite:<path>" """
+    if url.startswith(("http://", "https://")):
+        return HttpSource(url)
+    scheme, _, location = url.partition(":")
+    if scheme == "file":
+        return FileSource(location)
+    if scheme == "sqlite":
+        return SQLiteSource(location)
+    raise ValueError(f"Unsupported content source: {url}")
@@ -0,0 +1,316 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from logger import logger
+from config import STORAGE_URL
+
+class StorageError(Exception):
+    """Custom exception for local storage operations"""
+    pass
+
+class Storage(ABC):
+    """Interface for bot-owned state: users, delivery status, job checkpoints,
+    per-user conversation state and cached Telegram file_ids.
+
+    Editorial content stays in the remote document (see db.py); everything the
+    bot writes itself goes through a Storage backend.
+    """
+
+    @abstractmethod
+    async def add_users(self, chat_ids: Iterable[int]) -> int:
+        """Insert chat IDs that are not stored yet; returns the number inserted"""
+
+    @abstractmethod
+    async def get_users(self, subscribed_only: bool = True) -> List[int]:
+        ...
+
+    @abstractmethod
+    async def set_subscribed(self, chat_id: int, subscribed: bool) -> None:
+        ...
+
+    @abstractmethod
+    async def set_delivery_statuses(self, broadcast_id: str, statuses: Iterable[Tuple[int, str]]) -> None:
+        """Record (chat_id, status) pairs for a broadcast"""
+
+    @abstractmethod
+    async def get_deliveries(self, broadcast_id: str, status: Optional[str] = None) -> List[Tuple[int, str]]:
+        ...
+
+    @abstractmethod
+    async def create_broadcast(self, broadcast_id: str, payload: dict, chat_ids: Iterable[int]) -> bool:
+        """Persist a broadcast and a pending delivery per chat; returns False if it already exists"""
+
+    @abstractmethod
+    async def get_unfinished_broadcasts(self) -> List[Tuple[str, dict]]:
+        """Get (broadcast_id, payload) for broadcasts that are not completed, oldest first"""
+
+    @abstractmethod
+    async def complete_broadcast(self, broadcast_id: str) -> None:
+        ...
+
+    @abstractmethod
+    async def get_checkpoint(self, name: str, default: Any = None) -> Any:
+        ...
+
+    @abstractmethod
+    async def set_checkpoint(self, name: str, value: Any) -> None:
+        """Store a JSON-serializable value under a name"""
+
+    @abstractmethod
+    async def get_user_data(self, user_id: int) -> Dict[str, str]:
+        """Get a user's stored user_data as {key: JSON-encoded value}"""
+
+    @abstractmethod
+    async def update_user_data(self, upserts: Iterable[Tuple[int, str, str]], deletes: Iterable[Tuple[int, str]]) -> None:
+        """Write changed (user_id, key, JSON value) entries and remove deleted (user_id, key) entries"""
+
+    @abstractmethod
+    async def delete_user_data(self, user_id: int) -> None:
+        ...
+
+    @abstractmethod
+    async def get_conversations(self, chat_id: int) -> List[Tuple[str, str, str]]:
+        """Get (handler name, JSON key, JSON state) of the conversations stored for a chat"""
+
+    @abstractmethod
+    async def update_conversations(self, upserts: Iterable[Tuple[str, str, int, str]],
+                                   deletes: Iterable[Tuple[str, str]]) -> None:
+        """Write (name, key, chat_id, state) conversation states and remove ended (name, key) ones"""
+
+    @abstractmethod
+    async def get_file_ids(self) -> Dict[str, str]:
+        """Get every cached Telegram file_id by cache key"""
+
+    @abstractmethod
+    async def set_file_id(self, cache_key: str, file_id: str) -> None:
+        ...
+
+    @abstractmethod
+    async def delete_file_id(self, cache_key: str) -> None:
+        ...
+
+    async def close(self) -> None:
+        pass
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    chat_id INTEGER PRIMARY KEY,
+    subscribed INTEGER NOT NULL DEFAULT 1,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS deliveries (
+    broadcast_id TEXT NOT NULL,
+    chat_id INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (broadcast_id, chat_id)
+);
+CREATE INDEX IF NOT EXISTS deliveries_status ON deliveries (broadcast_id, status);
+CREATE TABLE IF NOT EXISTS broadcasts (
+    broadcast_id TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    completed_at REAL
+);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS user_data (
+    user_id INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (user_id, key)
+);
+CREATE TABLE IF NOT EXISTS conversations (
+    name TEXT NOT NULL,
+    key TEXT NOT NULL,
+    chat_id INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    PRIMARY KEY (name, key)
+);
+CREATE INDEX IF NOT EXISTS conversations_chat ON conversations (chat_id);
+CREATE TABLE IF NOT EXISTS file_ids (
+    cache_key TEXT PRIMARY KEY,
+    file_id TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+class SQLiteStorage(Storage):
+    """SQLite backend in WAL mode.
+
+    The connection lives on a single worker thread, so queries never block the
+    event loop and never run concurrently with each other.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="storage")
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+            logger.info("Opened SQLite storage at %s", self.path)
+        return self._conn
+
+    async def _run(self, func, *args):
+        def call():
+            conn = self._connect()
+            with conn:  # one transaction per call
+                return func(conn, *args)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+        except sqlite3.Error as e:
+            logger.error(f"Storage error: {str(e)}")
+            raise StorageError(f"Storage operation failed: {str(e)}")
+
+    async def add_users(self, chat_ids: Iterable[int]) -> int:
+        now = time.time()
+        rows = [(chat_id, now) for chat_id in chat_ids]
+        def insert(conn):
+            before = conn.total_changes
+            conn.executemany("INSERT OR IGNORE INTO users (chat_id, created_at) VALUES (?, ?)", rows)
+            return conn.total_changes - before
+        return await self._run(insert)
+
+    async def get_users(self, subscribed_only: bool = True) -> List[int]:
+        query = "SELECT chat_id FROM users WHERE subscribed = 1" if subscribed_only else "SELECT chat_id FROM users"
+        return await self._run(lambda conn: [row[0] for row in conn.execute(query)])
+
+    async def set_subscribed(self, chat_id: int, subscribed: bool) -> None:
+        await self._run(lambda conn: conn.execute(
+            "UPDATE users SET subscribed = ? WHERE chat_id = ?", (int(subscribed), chat_id)))
+
+    async def set_delivery_statuses(self, broadcast_id: str, statuses: Iterable[Tuple[int, str]]) -> None:
+        now = time.time()
+        rows = [(broadcast_id, chat_id, status, now) for chat_id, status in statuses]
+        await self._run(lambda conn: conn.executemany(
+            "INSERT INTO deliveries (broadcast_id, chat_id, status, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (broadcast_id, chat_id) DO UPDATE SET status = excluded.status, updated_at = excluded.updated_at",
+            rows))
+
+    async def get_deliveries(self, broadcast_id: str, status: Optional[str] = None) -> List[Tuple[int, str]]:
+        if status is None:
+            return await self._run(lambda conn: conn.execute(
+                "SELECT chat_id, status FROM deliveries WHERE broadcast_id = ?", (broadcast_id,)).fetchall())
+        return await self._run(lambda conn: conn.execute(
+            "SELECT chat_id, status FROM deliveries WHERE broadcast_id = ? AND status = ?",
+            (broadcast_id, status)).fetchall())
+
+    async def create_broadcast(self, broadcast_id: str, payload: dict, chat_ids: Iterable[int]) -> bool:
+        now = time.time()
+        encoded = json.dumps(payload)
+        rows = [(broadcast_id, chat_id, "pending", now) for chat_id in chat_ids]
+        def insert(conn):
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO broadcasts (broadcast_id, payload, created_at) VALUES (?, ?, ?)",
+                (broadcast_id, encoded, now))
+            if cursor.rowcount == 0:
+                return False
+            conn.executemany(
+                "INSERT OR IGNORE INTO deliveries (broadcast_id, chat_id, status, updated_at) VALUES (?, ?, ?, ?)", rows)
+            return True
+        return await self._run(insert)
+
+    async def get_unfinished_broadcasts(self) -> List[Tuple[str, dict]]:
+        rows = await self._run(lambda conn: conn.execute(
+            "SELECT broadcast_id, payload FROM broadcasts WHERE completed_at IS NULL ORDER BY created_at").fetchall())
+        return [(broadcast_id, json.loads(payload)) for broadcast_id, payload in rows]
+
+    async def complete_broadcast(self, broadcast_id: str) -> None:
+        await self._run(lambda conn: conn.execute(
+            "UPDATE broadcasts SET completed_at = ? WHERE broadcast_id = ?", (time.time(), broadcast_id)))
+
+    async def get_checkpoint(self, name: str, default: Any = None) -> Any:
+        row = await self._run(lambda conn: conn.execute(
+            "SELECT value FROM checkpoints WHERE name = ?", (name,)).fetchone())
+        return json.loads(row[0]) if row else default
+
+    async def set_checkpoint(self, name: str, value: Any) -> None:
+        encoded = json.dumps(value)
+        await self._run(lambda conn: conn.execute(
+            "INSERT INTO checkpoints (name, value, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at",
+            (name, encoded, time.time())))
+
+    async def get_user_data(self, user_id: int) -> Dict[str, str]:
+        return await self._run(lambda conn: dict(conn.execute(
+            "SELECT key, value FROM user_data WHERE user_id = ?", (user_id,))))
+
+    async def update_user_data(self, upserts: Iterable[Tuple[int, str, str]], deletes: Iterable[Tuple[int, str]]) -> None:
+        upserts, deletes = list(upserts), list(deletes)
+        def write(conn):
+            conn.executemany(
+                "INSERT INTO user_data (user_id, key, value) VALUES (?, ?, ?) "
+                "ON CONFLICT (user_id, key) DO UPDATE SET value = excluded.value", upserts)
+            conn.executemany("DELETE FROM user_data WHERE user_id = ? AND key = ?", deletes)
+        await self._run(write)
+
+    async def delete_user_data(self, user_id: int) -> None:
+        await self._run(lambda conn: conn.execute("DELETE FROM user_data WHERE user_id = ?", (user_id,)))
+
+    async def get_conversations(self, chat_id: int) -> List[Tuple[str, str, str]]:
+        return await self._run(lambda conn: conn.execute(
+            "SELECT name, key, state FROM conversations WHERE chat_id = ?", (chat_id,)).fetchall())
+
+    async def update_conversations(self, upserts: Iterable[Tuple[str, str, int, str]],
+                                   deletes: Iterable[Tuple[str, str]]) -> None:
+        upserts, deletes = list(upserts), list(deletes)
+        def write(conn):
+            conn.executemany(
+                "INSERT INTO conversations (name, key, chat_id, state) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (name, key) DO UPDATE SET state = excluded.state", upserts)
+            conn.executemany("DELETE FROM conversations WHERE name = ? AND key = ?", deletes)
+        await self._run(write)
+
+    async def get_file_ids(self) -> Dict[str, str]:
+        return await self._run(lambda conn: dict(conn.execute("SELECT cache_key, file_id FROM file_ids")))
+
+    async def set_file_id(self, cache_key: str, file_id: str) -> None:
+        await self._run(lambda conn: conn.execute(
+            "INSERT INTO file_ids (cache_key, file_id, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (cache_key) DO UPDATE SET file_id = excluded.file_id, updated_at = excluded.updated_at",
+            (cache_key, file_id, time.time())))
+
+    async def delete_file_id(self, cache_key: str) -> None:
+        await self._run(lambda conn: conn.execute("DELETE FROM file_ids WHERE cache_key = ?", (cache_key,)))
+
+    async def close(self) -> None:
+        def close_conn():
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        await asyncio.get_running_loop().run_in_executor(self._executor, close_conn)
+
+def create_storage(url: str) -> Storage:
+    """Create a storage backend from a URL such as "sqlite:data/bot.sqlite3" """
+    scheme, _, location = url.partition(":")
+    if scheme == "sqlite":
+        return SQLiteStorage(location or ":memory:")
+    raise StorageError(f"Unsupported storage backend: {url}")
+
+async def migrate_users(storage: Storage, users: Iterable[int]) -> None:
+    """Import the legacy `users` array from the remote document once"""
+    if await storage.get_checkpoint("users_migrated"):
+        return
+    added = await storage.add_users(users)
+    await storage.set_checkpoint("users_migrated", True)
+    logger.info("Migrated %s users from the remote document to local storage", added)
+
+storage = create_storage(STORAGE_URL)
@@ -0,0 +1,16 @@
+"""config.py and language.py read env.json and language.json from the working
+directory when they are imported, so the tests run from a temporary one with a
+minimal env.json, entered before any test module is collected."""
+import json
+import os
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def pytest_sessionstart(session):
+    workdir = tempfile.mkdtemp(prefix="jarqyndos-tests-")
+    with open(os.path.join(workdir, "env.json"), "w") as f:
+        json.dump({"TOKEN": "0:test", "NPOINT_URL": "http://127.0.0.1:1/",
+                   "STORAGE_URL": "sqlite::memory:", "METRICS_PORT": None}, f)
+    os.symlink(os.path.join(ROOT, "language.json"), os.path.join(workdir, "language.json"))
+    os.chdir(workdir)
@@ -0,0 +1,109 @@
+import asyncio
+
+from telegram.error import Forbidden, RetryAfter
+
+from broadcast import Broadcaster, PerChatLimiter, TokenBucket
+
+class FakeClock:
+    """Time that only moves when someone sleeps, so waits are instant.
+
+    Rates in these tests are powers of two, so every wait is exact in floating point.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+        await asyncio.sleep(0)
+
+def acquire_times(bucket: TokenBucket, clock: FakeClock, count: int):
+    async def run():
+        moments = []
+        for _ in range(count):
+            await bucket.acquire()
+            moments.append(clock.now)
+        return moments
+    return asyncio.run(run())
+
+def test_capacity_is_available_at_once():
+    clock = FakeClock()
+    bucket = TokenBucket(10, capacity=5, clock=clock, sleep=clock.sleep)
+    assert acquire_times(bucket, clock, 5) == [0.0] * 5
+    assert clock.sleeps == []
+
+def test_tokens_after_the_burst_come_at_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(16, capacity=2, clock=clock, sleep=clock.sleep)
+    assert acquire_times(bucket, clock, 6) == [0.0, 0.0, 1 / 16, 2 / 16, 3 / 16, 4 / 16]
+
+def test_idle_time_refills_up_to_capacity():
+    clock = FakeClock()
+    bucket = TokenBucket(8, capacity=3, clock=clock, sleep=clock.sleep)
+    acquire_times(bucket, clock, 3)
+    clock.now += 60
+    assert acquire_times(bucket, clock, 4) == [60.0] * 3 + [60.125]
+
+def test_capacity_defaults_to_rate():
+    assert TokenBucket(25).capacity == 25
+
+def test_pause_blocks_and_empties_the_bucket():
+    clock = FakeClock()
+    bucket = TokenBucket(64, capacity=10, clock=clock, sleep=clock.sleep)
+    bucket.pause(5)
+    bucket.pause(2)
+    # Waits out the longer pause, then for tokens refilled from empty
+    assert acquire_times(bucket, clock, 2) == [5 + 1 / 64, 5 + 2 / 64]
+
+def test_concurrent_acquires_share_the_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(16, capacity=1, clock=clock, sleep=clock.sleep)
+    async def run():
+        moments = []
+        async def acquire():
+            await bucket.acquire()
+            moments.append(clock.now)
+        await asyncio.gather(*(acquire() for _ in range(5)))
+        return moments
+    assert asyncio.run(run()) == [0.0, 1 / 16, 2 / 16, 3 / 16, 4 / 16]
+
+def test_per_chat_limiter_spaces_messages_to_one_chat():
+    clock = FakeClock()
+    limiter = PerChatLimiter(1.0, clock=clock, sleep=clock.sleep)
+    async def run():
+        for chat_id in (1, 2, 1, 1):
+            await limiter.wait(chat_id)
+    asyncio.run(run())
+    assert clock.sleeps == [1.0, 1.0]
+
+def fake_broadcaster(clock: FakeClock, rate: float = 1024) -> Broadcaster:
+    broadcaster = Broadcaster(rate=rate, concurrency=4, max_retries=0)
+    broadcaster.bucket = TokenBucket(rate, clock=clock, sleep=clock.sleep)
+    broadcaster.per_chat = PerChatLimiter(1.0, clock=clock, sleep=clock.sleep)
+    return broadcaster
+
+def test_broadcast_outcomes():
+    clock = FakeClock()
+    broadcaster = fake_broadcaster(clock)
+    throttled = set()
+    async def send(chat_id):
+        if chat_id == 2:
+            raise Forbidden("bot was blocked by the user")
+        if chat_id == 3 and chat_id not in throttled:
+            throttled.add(chat_id)
+            raise RetryAfter(7)
+        if chat_id == 4:
+            raise ValueError("bad payload")
+    outcomes = {}
+    async def on_result(chat_id, status):
+        outcomes[chat_id] = status
+    result = asyncio.run(broadcaster.broadcast([1, 2, 3, 4], send, on_result))
+    assert outcomes == {1: "sent", 2: "blocked", 3: "sent", 4: "failed"}
+    assert (result.total, result.sent, result.failed, result.blocked, result.retries) == (4, 2, 2, [2], 1)
+    # RetryAfter paused the shared bucket
+    assert clock.now >= 7
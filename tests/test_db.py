@@ -0,0 +1,181 @@
+import asyncio
+import json
+from typing import List, Optional
+
+import pytest
+
+import db
+from sources import ContentSource
+
+def document(*names: str) -> bytes:
+    return json.dumps({"bot_info": {"practices": [{"id": i, "name": name, "category": "Дыхание"} for i, name in enumerate(names)]}}).encode()
+
+class FakeSource(ContentSource):
+    """Returns the queued documents in turn, each after `gate` opens if one is set"""
+
+    def __init__(self, *documents: Optional[bytes]):
+        self.documents: List[Optional[bytes]] = list(documents)
+        self.fetches = 0
+        self.gate: Optional[asyncio.Event] = None
+
+    async def fetch(self, conditional: bool = True) -> Optional[bytes]:
+        self.fetches += 1
+        if self.gate is not None:
+            await self.gate.wait()
+        document = self.documents.pop(0)
+        if isinstance(document, Exception):
+            raise document
+        return document
+
+    async def write(self, data: dict) -> None:
+        self.documents.append(json.dumps(data).encode())
+
+@pytest.fixture
+def source(monkeypatch):
+    source = FakeSource()
+    monkeypatch.setattr(db, "source", source)
+    monkeypatch.setattr(db, "_db_cache", None)
+    monkeypatch.setattr(db, "_db_cache_timestamp", 0.0)
+    monkeypatch.setattr(db, "_refresh_task", None)
+    monkeypatch.setattr(db, "_watch_task", None)
+    monkeypatch.setattr(db, "_content_hash", None)
+    monkeypatch.setattr(db, "_snapshot_listeners", [])
+    monkeypatch.setattr(db, "_notifications", set())
+    return source
+
+def names(snapshot) -> List[str]:
+    return [practice["name"] for practice in snapshot.practices]
+
+def test_cold_callers_share_one_fetch(source):
+    async def run():
+        source.documents.append(document("Дыхание"))
+        source.gate = asyncio.Event()
+        callers = [asyncio.create_task(db.fetch_db()) for _ in range(5)]
+        await asyncio.sleep(0)
+        source.gate.set()
+        return await asyncio.gather(*callers)
+    snapshots = asyncio.run(run())
+    assert source.fetches == 1
+    assert all(snapshot is snapshots[0] for snapshot in snapshots)
+    assert names(snapshots[0]) == ["Дыхание"]
+
+def test_fresh_snapshot_is_served_without_fetching(source):
+    async def run():
+        source.documents.append(document("Дыхание"))
+        first = await db.fetch_db()
+        return first, await db.fetch_db()
+    first, second = asyncio.run(run())
+    assert second is first
+    assert source.fetches == 1
+
+def test_stale_snapshot_is_served_while_one_refresh_runs(source):
+    async def run():
+        source.documents.extend([document("Дыхание"), document("Сон")])
+        first = await db.fetch_db()
+        db._db_cache_timestamp -= db._cache_ttl
+        source.gate = asyncio.Event()
+        stale = [await db.fetch_db() for _ in range(3)]
+        source.gate.set()
+        await db._refresh_task
+        return first, stale, await db.fetch_db()
+    first, stale, refreshed = asyncio.run(run())
+    assert all(snapshot is first for snapshot in stale)
+    assert source.fetches == 2
+    assert names(refreshed) == ["Сон"]
+    assert refreshed.version > first.version
+
+def test_unchanged_content_keeps_the_snapshot(source):
+    async def run():
+        source.documents.extend([document("Дыхание"), document("Дыхание"), None])
+        first = await db.fetch_db()
+        for _ in range(2):
+            db._db_cache_timestamp -= db._cache_ttl
+            await db.fetch_db()
+            await db._refresh_task
+        return first, await db.fetch_db()
+    first, last = asyncio.run(run())
+    assert last is first
+    assert source.fetches == 3
+
+def test_cold_failure_raises(source):
+    async def run():
+        source.documents.append(OSError("unreachable"))
+        await db.fetch_db()
+    with pytest.raises(db.DatabaseError):
+        asyncio.run(run())
+
+def test_failed_refresh_keeps_serving_the_stale_snapshot(source):
+    async def run():
+        source.documents.extend([document("Дыхание"), OSError("unreachable")])
+        first = await db.fetch_db()
+        db._db_cache_timestamp -= db._cache_ttl
+        await db.fetch_db()
+        with pytest.raises(db.DatabaseError):
+            await db._refresh_task
+        return first, await db.fetch_db()
+    first, after = asyncio.run(run())
+    assert after is first
+
+def test_listeners_get_every_new_snapshot(source):
+    seen = []
+    async def listener(snapshot):
+        seen.append(names(snapshot))
+    async def run():
+        db.add_snapshot_listener(listener)
+        source.documents.extend([document("Дыхание"), document("Сон")])
+        await db.fetch_db()
+        db._db_cache_timestamp -= db._cache_ttl
+        await db.fetch_db()
+        await db._refresh_task
+        await asyncio.sleep(0)
+    asyncio.run(run())
+    assert seen == [["Дыхание"], ["Сон"]]
+
+def test_a_stopped_watch_falls_back_to_the_ttl(source, monkeypatch):
+    async def watch(on_change):
+        raise OSError("watch failed")
+    monkeypatch.setattr(source, "supports_watch", True)
+    monkeypatch.setattr(source, "watch", watch)
+    async def run():
+        source.documents.extend([document("Дыхание"), document("Сон")])
+        await db.fetch_db()
+        assert db.start_watching()
+        await asyncio.sleep(0)
+        assert db._watch_task.done()
+        db._db_cache_timestamp -= db._cache_ttl
+        await db.fetch_db()
+        await db._refresh_task
+        return await db.fetch_db()
+    assert names(asyncio.run(run())) == ["Сон"]
+
+def test_a_running_watch_keeps_the_snapshot_fresh(source, monkeypatch):
+    async def watch(on_change):
+        await asyncio.Event().wait()
+    monkeypatch.setattr(source, "supports_watch", True)
+    monkeypatch.setattr(source, "watch", watch)
+    async def run():
+        source.documents.append(document("Дыхание"))
+        first = await db.fetch_db()
+        db.start_watching()
+        db._db_cache_timestamp -= db._cache_ttl
+        second = await db.fetch_db()
+        await db.close_client()
+        return first, second
+    first, second = asyncio.run(run())
+    assert second is first
+    assert source.fetches == 1
+
+def test_pending_notifications_are_kept_until_they_finish(source):
+    async def run():
+        done = asyncio.Event()
+        async def listener(snapshot):
+            await done.wait()
+        db.add_snapshot_listener(listener)
+        source.documents.append(document("Дыхание"))
+        await db.fetch_db()
+        pending = len(db._notifications)
+        done.set()
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        return pending, len(db._notifications)
+    assert asyncio.run(run()) == (1, 0)
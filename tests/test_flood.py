@@ -0,0 +1,149 @@
+import asyncio
+import json
+from datetime import datetime, timezone
+
+from telegram import Chat, Message, Update, User
+from telegram.ext import Application, TypeHandler
+from telegram.request import BaseRequest
+
+import metrics
+from flood import ALLOWED, DUPLICATE, MUTED, THROTTLED, FloodControl
+from persistence import StoragePersistence
+from test_persistence import RecordingStorage
+
+class FakeBotAPI(BaseRequest):
+    """Answers getMe; flood control makes no other call for a throttled message"""
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        assert url.endswith("/getMe"), url
+        bot = {"id": 1, "is_bot": True, "first_name": "Bot", "username": "bot"}
+        return 200, json.dumps({"ok": True, "result": bot}).encode()
+
+def flood_control(**kwargs):
+    # 1 update/second after a burst of 3, duplicates within 1 s, muted for 60 s after 5 drops
+    return FloodControl(1, 3, 1, 5, 60, exempt=("back",), exempt_prefixes=("pg:",), **kwargs)
+
+def test_burst_then_throttle():
+    control = flood_control()
+    assert [control.check(1, f"text {i}", now=0.0) for i in range(4)] == [ALLOWED] * 3 + [THROTTLED]
+
+def test_chats_have_separate_buckets():
+    control = flood_control()
+    for i in range(3):
+        control.check(1, f"text {i}", now=0.0)
+    assert control.check(1, "more", now=0.0) == THROTTLED
+    assert control.check(2, "more", now=0.0) == ALLOWED
+
+def test_bucket_refills_at_rate():
+    control = flood_control()
+    for i in range(3):
+        control.check(1, f"text {i}", now=0.0)
+    assert control.check(1, "a", now=0.5) == THROTTLED
+    assert control.check(1, "b", now=1.0) == ALLOWED
+    assert control.check(1, "c", now=1.0) == THROTTLED
+    # Refilled up to the burst, not beyond it
+    assert [control.check(1, f"d{i}", now=100.0) for i in range(4)] == [ALLOWED] * 3 + [THROTTLED]
+
+def test_repeats_are_allowed_while_tokens_last():
+    control = flood_control()
+    assert [control.check(1, "same", now=0.0) for _ in range(3)] == [ALLOWED] * 3
+
+def test_repeats_are_duplicates_once_the_bucket_is_empty():
+    control = flood_control()
+    for _ in range(3):
+        control.check(1, "same", now=0.0)
+    assert control.check(1, "same", now=0.1) == DUPLICATE
+    assert control.check(1, "other", now=0.2) == THROTTLED
+    # Compared with the last allowed update, not the last dropped one
+    assert control.check(1, "other", now=0.3) == THROTTLED
+
+def test_navigation_may_overdraw_by_a_burst():
+    control = flood_control()
+    for i in range(3):
+        control.check(1, f"text {i}", now=0.0)
+    assert control.check(1, "text", now=0.0) == THROTTLED
+    assert [control.check(1, "back", now=0.0) for _ in range(3)] == [ALLOWED] * 3
+    assert control.check(1, "pg:psy:key:5", now=0.0) == THROTTLED
+    # The overdraft is paid back before anything else is allowed
+    assert control.check(1, "text", now=3.5) == THROTTLED
+    assert control.check(1, "text", now=4.0) == ALLOWED
+
+def test_navigation_is_never_a_duplicate():
+    control = flood_control()
+    assert control.is_navigation("back") and control.is_navigation("pg:psy:key:5")
+    assert not control.is_navigation("Back") and not control.is_navigation(None)
+    for _ in range(6):
+        control.check(1, "pg:psy:key:5", now=0.0)
+    assert control.check(1, "pg:psy:key:5", now=0.0) == THROTTLED
+
+def test_mute_after_consecutive_drops():
+    control = flood_control()
+    for i in range(3):
+        control.check(1, f"text {i}", now=0.0)
+    verdicts = [control.check(1, f"spam {i}", now=0.0) for i in range(5)]
+    assert verdicts == [THROTTLED] * 4 + [MUTED]
+    assert control.is_muted(1, now=30.0)
+    assert control.check(1, "hello", now=30.0) == MUTED
+    assert not control.is_muted(1, now=60.0)
+    assert control.check(1, "hello", now=60.0) == ALLOWED
+
+def test_allowed_update_resets_strikes():
+    control = flood_control()
+    for i in range(3):
+        control.check(1, f"text {i}", now=0.0)
+    for i in range(4):
+        control.check(1, f"spam {i}", now=0.0)
+    assert control.check(1, "wait", now=1.0) == ALLOWED
+    assert [control.check(1, f"spam {i}", now=1.0) for i in range(4)] == [THROTTLED] * 4
+    assert not control.is_muted(1, now=1.0)
+
+def test_forgotten_chats_start_with_a_full_bucket():
+    control = flood_control(max_chats=2)
+    for chat_id in (1, 2):
+        for i in range(3):
+            control.check(chat_id, f"text {i}", now=0.0)
+    control.check(3, "text", now=10.0)
+    assert [control.check(1, f"again {i}", now=10.0) for i in range(4)] == [ALLOWED] * 3 + [THROTTLED]
+
+def test_dropped_updates_are_counted_but_never_read_from_storage(tmp_path):
+    storage = RecordingStorage(str(tmp_path / "bot.sqlite3"))
+    persistence = StoragePersistence(storage)
+    # No burst: the first update of a chat is already throttled
+    control = FloodControl(1, 0, 1, 100, 60)
+    application = (Application.builder().token("1:token").request(FakeBotAPI()).get_updates_request(FakeBotAPI())
+                   .persistence(persistence).updater(None).build())
+    handled = []
+    async def handle(update, context):
+        handled.append(update.update_id)
+    # The same groups as bot.build_application
+    application.add_handler(metrics.update_counter_handler(), group=-4)
+    application.add_handler(control.handler(), group=-3)
+    application.add_handler(persistence.preload_handler(application), group=-1)
+    application.add_handler(TypeHandler(Update, handle))
+    user = User(5, "Test", False)
+    def update(update_id):
+        message = Message(update_id, datetime.now(timezone.utc), Chat(5, Chat.PRIVATE), from_user=user, text="hi")
+        return Update(update_id, message=message)
+    counted = metrics.updates_total.get(type="message")
+    async def run():
+        await application.initialize()
+        await application.process_update(update(1))
+        dropped = list(storage.calls)
+        control.rate = 0
+        await application.process_update(update(2))
+        await application.shutdown()
+        return dropped
+    assert asyncio.run(run()) == []
+    assert metrics.updates_total.get(type="message") == counted + 2
+    assert handled == [2]
+    assert storage.calls[:2] == [("get_user_data", 5), ("get_conversations", 5)]
@@ -0,0 +1,88 @@
+import asyncio
+
+from http_server import HTTPServer, Request, Response
+
+async def echo(request: Request) -> Response:
+    return Response(200, request.body or request.path.encode())
+
+async def started(**limits) -> HTTPServer:
+    server = HTTPServer("127.0.0.1", 0, **limits)
+    server.route("GET", "/ping", echo)
+    server.route("POST", "/echo", echo)
+    await server.start()
+    return server
+
+async def exchange(server: HTTPServer, data: bytes) -> bytes:
+    """Send raw bytes and read until the server closes the connection"""
+    reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+    writer.write(data)
+    await writer.drain()
+    response = await asyncio.wait_for(reader.read(), 5)
+    writer.close()
+    return response
+
+def serve(scenario, **limits):
+    async def run():
+        server = await started(**limits)
+        try:
+            return await scenario(server)
+        finally:
+            await server.stop()
+    return asyncio.run(run())
+
+def test_routes_and_keep_alive():
+    async def scenario(server):
+        return await exchange(server, b"GET /ping HTTP/1.1\r\nHost: x\r\n\r\n"
+                                      b"POST /echo HTTP/1.1\r\nContent-Length: 5\r\n\r\nhello"
+                                      b"GET /missing HTTP/1.1\r\nConnection: close\r\n\r\n")
+    response = serve(scenario)
+    assert response.count(b"HTTP/1.1 200 OK") == 2
+    assert b"/ping" in response and b"hello" in response
+    assert response.endswith(b"Not Found")
+
+def test_too_many_headers_are_rejected():
+    async def scenario(server):
+        headers = b"".join(b"X-%d: 1\r\n" % i for i in range(11))
+        return await exchange(server, b"GET /ping HTTP/1.1\r\n" + headers + b"\r\n")
+    assert serve(scenario, max_headers=10).startswith(b"HTTP/1.1 431 ")
+
+def test_oversized_headers_are_rejected():
+    async def scenario(server):
+        return await exchange(server, b"GET /ping HTTP/1.1\r\nCookie: " + b"a" * 2000 + b"\r\n\r\n")
+    assert serve(scenario, max_header_bytes=1024).startswith(b"HTTP/1.1 431 ")
+
+def test_oversized_body_is_rejected():
+    async def scenario(server):
+        return await exchange(server, b"POST /echo HTTP/1.1\r\nContent-Length: 100\r\n\r\n")
+    assert serve(scenario, max_body=10).startswith(b"HTTP/1.1 400 ")
+
+def test_slow_headers_are_cut_off():
+    async def scenario(server):
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+        writer.write(b"GET /ping HTTP/1.1\r\n")
+        try:
+            # One header line at a time, each well within any per-line timeout
+            for i in range(10):
+                writer.write(b"X-%d: 1\r\n" % i)
+                await writer.drain()
+                await asyncio.sleep(0.05)
+                if reader.at_eof():
+                    break
+            closed = await asyncio.wait_for(reader.read(), 5)
+        except (ConnectionResetError, BrokenPipeError):
+            # Closed with header lines still unread, so the kernel may reset it rather than end it
+            closed = b""
+        writer.close()
+        return closed
+    assert serve(scenario, read_timeout=0.2) == b""
+
+def test_idle_connections_are_closed():
+    async def scenario(server):
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+        writer.write(b"GET /ping HTTP/1.1\r\n\r\n")
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), 5)
+        writer.close()
+        return response
+    response = serve(scenario, idle_timeout=0.2)
+    assert response.startswith(b"HTTP/1.1 200 OK")
@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import Forbidden
+
+from broadcast import Broadcaster
+from outbox import Outbox
+from storage import SQLiteStorage
+
+class FakeBot:
+    """Records sent messages and the delivery status each chat had when its message went out"""
+
+    def __init__(self, storage, broadcast_id="b1", blocked=()):
+        self.storage = storage
+        self.broadcast_id = broadcast_id
+        self.blocked = set(blocked)
+        self.sent = []
+        self.statuses = {}
+
+    async def send_message(self, chat_id, text, reply_markup=None, parse_mode=None):
+        self.statuses[chat_id] = dict(await self.storage.get_deliveries(self.broadcast_id))[chat_id]
+        if chat_id in self.blocked:
+            raise Forbidden("bot was blocked by the user")
+        self.sent.append((chat_id, text, reply_markup, parse_mode))
+
+@pytest.fixture
+def storage(tmp_path):
+    return SQLiteStorage(str(tmp_path / "bot.sqlite3"))
+
+@pytest.fixture
+def outbox(storage):
+    return Outbox(storage, Broadcaster(rate=1024, concurrency=4, per_chat_interval=0, max_retries=0))
+
+def test_enqueue_once_then_deliver_to_everyone(storage, outbox):
+    markup = InlineKeyboardMarkup([[InlineKeyboardButton("Открыть", callback_data="show_practice_5")]])
+    bot = FakeBot(storage)
+    async def run():
+        created = [await outbox.enqueue("b1", "Новая практика", [1, 2, 3], reply_markup=markup, parse_mode="HTML"),
+                   await outbox.enqueue("b1", "again", [4])]
+        await outbox.resume(bot)
+        return created, sorted(await storage.get_deliveries("b1")), await storage.get_unfinished_broadcasts()
+    created, deliveries, unfinished = asyncio.run(run())
+    assert created == [True, False]
+    assert sorted(chat_id for chat_id, *_ in bot.sent) == [1, 2, 3]
+    assert all(sent[1:] == ("Новая практика", markup, "HTML") for sent in bot.sent)
+    assert deliveries == [(1, "sent"), (2, "sent"), (3, "sent")]
+    assert unfinished == []
+
+def test_chats_are_marked_sending_before_the_first_attempt(storage, outbox):
+    bot = FakeBot(storage)
+    async def run():
+        await outbox.enqueue("b1", "Новая практика", [1, 2])
+        await outbox.resume(bot)
+    asyncio.run(run())
+    assert bot.statuses == {1: "sending", 2: "sending"}
+
+def test_resume_skips_chats_left_sending(storage, outbox):
+    bot = FakeBot(storage)
+    async def run():
+        await outbox.enqueue("b1", "Новая практика", [1, 2, 3, 4])
+        # The previous run sent to 1, then stopped while sending to 2
+        await storage.set_delivery_statuses("b1", [(1, "sent"), (2, "sending")])
+        await outbox.resume(bot)
+        return sorted(await storage.get_deliveries("b1")), await storage.get_unfinished_broadcasts()
+    deliveries, unfinished = asyncio.run(run())
+    assert sorted(chat_id for chat_id, *_ in bot.sent) == [3, 4]
+    assert deliveries == [(1, "sent"), (2, "interrupted"), (3, "sent"), (4, "sent")]
+    assert unfinished == []
+
+def test_blocked_chats_are_unsubscribed(storage, outbox):
+    bot = FakeBot(storage, blocked={2})
+    async def run():
+        await storage.add_users([1, 2])
+        await outbox.enqueue("b1", "Новая практика", [1, 2])
+        await outbox.resume(bot)
+        return sorted(await storage.get_deliveries("b1")), await storage.get_users()
+    deliveries, subscribed = asyncio.run(run())
+    assert deliveries == [(1, "sent"), (2, "blocked")]
+    assert subscribed == [1]
+
+def test_a_broadcast_is_delivered_once_at_a_time(storage, outbox):
+    bot = FakeBot(storage)
+    async def run():
+        await outbox.enqueue("b1", "Новая практика", [1, 2, 3])
+        await asyncio.gather(outbox.resume(bot), outbox.resume(bot))
+    asyncio.run(run())
+    assert sorted(chat_id for chat_id, *_ in bot.sent) == [1, 2, 3]
@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+
+import db
+import render_cache
+from commands.partners import partners_page
+from commands.practices import practice_category_page
+from pagination import page_callback, page_of, parse_page_callback, short_key
+from render_cache import RenderCache
+from snapshot import DataSnapshot
+
+@pytest.fixture
+def snapshot(monkeypatch):
+    practices = [{"id": i, "name": f"Практика {i}", "category": "Дыхание"} for i in range(25)]
+    practices.append({"id": 25, "name": "Без категории"})
+    snapshot = DataSnapshot({"bot_info": {
+        "practices": practices,
+        "partners": [{"name": f"Партнер {i}", "description": ""} for i in range(12)],
+    }}, version=1)
+    async def fetch_db():
+        return snapshot
+    monkeypatch.setattr(db, "fetch_db", fetch_db)
+    monkeypatch.setattr(render_cache, "render_cache", RenderCache())
+    return snapshot
+
+def test_first_page():
+    page = page_of(list(range(12)), 0, 5)
+    assert list(page.items) == [0, 1, 2, 3, 4]
+    assert (page.number, page.pages) == (1, 3)
+    assert not page.has_prev and page.has_next
+
+def test_last_page_is_partial():
+    page = page_of(list(range(12)), 10, 5)
+    assert list(page.items) == [10, 11]
+    assert (page.number, page.pages) == (3, 3)
+    assert page.has_prev and not page.has_next
+
+def test_offset_past_the_end_is_clamped_to_the_last_page():
+    page = page_of(list(range(12)), 50, 5)
+    assert page.offset == 10
+    assert list(page.items) == [10, 11]
+
+def test_offset_of_exactly_full_pages_stays_on_the_last_one():
+    page = page_of(list(range(10)), 10, 5)
+    assert page.offset == 5
+    assert not page.has_next
+
+def test_negative_offset_is_the_first_page():
+    assert page_of(list(range(12)), -5, 5).offset == 0
+
+def test_empty_list_has_one_empty_page():
+    page = page_of([], 15, 5)
+    assert page.offset == 0
+    assert list(page.items) == []
+    assert (page.number, page.pages) == (1, 1)
+    assert not page.has_prev and not page.has_next
+
+def test_short_key_is_stable_and_short():
+    key = short_key("Дыхательные практики")
+    assert key == short_key("Дыхательные практики")
+    assert len(key) == 8
+    int(key, 16)
+    assert key != short_key("Медитации")
+
+def test_page_callback_round_trip():
+    data = page_callback("psy", short_key("Тревога"), 15)
+    assert len(data.encode()) <= 64
+    assert parse_page_callback(data) == ("psy", short_key("Тревога"), 15)
+
+def test_malformed_page_callbacks_are_rejected():
+    assert parse_page_callback("pg:psy:key") is None
+    assert parse_page_callback("pg:psy:key:five") is None
+    assert parse_page_callback("xx:psy:key:5") is None
+    assert parse_page_callback("show_practice_5") is None
+
+def test_negative_callback_offset_is_zero():
+    assert parse_page_callback("pg:psy:key:-10") == ("psy", "key", 0)
+
+def test_practices_without_a_category_get_no_page(snapshot):
+    assert snapshot.practice_categories == ("Дыхание",)
+    assert list(snapshot.practice_category_by_key.values()) == ["Дыхание"]
+
+def test_pages_at_offsets_the_bot_sends(snapshot):
+    async def run():
+        return [await partners_page("", 5), await practice_category_page(short_key("Дыхание"), 10)]
+    partners, practices = asyncio.run(run())
+    assert "Партнер 5" in partners[0] and "Партнер 4" not in partners[0]
+    assert "11. <strong>Практика 10</strong>" in practices[0]
+
+def test_misaligned_offsets_are_rejected_before_caching(snapshot):
+    key = short_key("Дыхание")
+    async def run():
+        return [await partners_page("", offset) for offset in range(1, 5)] + \
+               [await practice_category_page(key, offset) for offset in (1, 9, 11, 25)]
+    assert asyncio.run(run()) == [None] * 8
+    assert render_cache.render_cache.get_stats()["entries"] == 0
+
+def test_offsets_past_the_end_share_the_last_page(snapshot):
+    key = short_key("Дыхание")
+    async def run():
+        return ([await partners_page("", offset) for offset in (10, 50, 500)],
+                [await practice_category_page(key, offset) for offset in (20, 100)])
+    partners, practices = asyncio.run(run())
+    assert partners[0] == partners[1] == partners[2]
+    assert practices[0] == practices[1]
+    assert render_cache.render_cache.get_stats()["entries"] == 2
@@ -0,0 +1,166 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from persistence import StoragePersistence, conversation_states
+from storage import SQLiteStorage, StorageError
+
+class RecordingStorage(SQLiteStorage):
+    """SQLite storage that records reads and writes, and can fail the next writes"""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.calls = []
+        self.failures = 0
+
+    async def get_user_data(self, user_id):
+        self.calls.append(("get_user_data", user_id))
+        return await super().get_user_data(user_id)
+
+    async def get_conversations(self, chat_id):
+        self.calls.append(("get_conversations", chat_id))
+        return await super().get_conversations(chat_id)
+
+    async def update_user_data(self, upserts, deletes):
+        upserts, deletes = sorted(upserts), sorted(deletes)
+        self.calls.append(("update_user_data", upserts, deletes))
+        if self.failures:
+            self.failures -= 1
+            raise StorageError("disk full")
+        await super().update_user_data(upserts, deletes)
+
+    async def update_conversations(self, upserts, deletes):
+        upserts, deletes = sorted(upserts), sorted(deletes)
+        self.calls.append(("update_conversations", upserts, deletes))
+        await super().update_conversations(upserts, deletes)
+
+    def writes(self):
+        return [call for call in self.calls if call[0].startswith("update")]
+
+class States(dict):
+    """Stands in for the TrackingDict PTB keeps a conversation's states in"""
+
+    def update_no_track(self, mapping):
+        self.update(mapping)
+
+@pytest.fixture
+def storage(tmp_path):
+    return RecordingStorage(str(tmp_path / "bot.sqlite3"))
+
+@pytest.fixture
+def persistence(storage):
+    return StoragePersistence(storage)
+
+def test_nothing_is_read_at_startup(storage, persistence):
+    async def run():
+        return (await persistence.get_user_data(), await persistence.get_conversations("main"))
+    assert asyncio.run(run()) == ({}, {})
+    assert storage.calls == []
+
+def test_user_data_is_loaded_once_per_user(storage, persistence):
+    async def run():
+        await storage.update_user_data([(1, "nav_stack", "[0, 3]"), (1, "search_query", '"сон"')], [])
+        storage.calls.clear()
+        user_data = {"search_query": "дыхание"}
+        # PTB calls this for every update, before flood control; only the preload reads
+        await persistence.refresh_user_data(1, user_data)
+        assert storage.calls == []
+        await persistence.load_user_data(1, user_data)
+        await persistence.load_user_data(1, user_data)
+        return user_data
+    user_data = asyncio.run(run())
+    # What the update already set in memory wins over the stored value
+    assert user_data == {"nav_stack": [0, 3], "search_query": "дыхание"}
+    assert storage.calls == [("get_user_data", 1)]
+
+def test_only_changed_user_data_keys_are_written(storage, persistence):
+    async def run():
+        await persistence.load_user_data(1, {})
+        await persistence.update_user_data(1, {"nav_stack": [0], "search_query": "сон"})
+        await persistence.flush()
+        await persistence.update_user_data(1, {"nav_stack": [0], "search_query": "сон"})
+        await persistence.flush()
+        await persistence.update_user_data(1, {"nav_stack": [0, 3]})
+        await persistence.flush()
+        return await storage.get_user_data(1)
+    stored = asyncio.run(run())
+    assert storage.writes() == [
+        ("update_user_data", [(1, "nav_stack", "[0]"), (1, "search_query", '"сон"')], []),
+        ("update_user_data", [(1, "nav_stack", "[0, 3]")], [(1, "search_query")]),
+    ]
+    assert stored == {"nav_stack": "[0, 3]"}
+
+def test_changes_of_one_run_are_written_in_one_batch(storage, persistence):
+    async def run():
+        await asyncio.gather(persistence.update_user_data(1, {"a": 1}), persistence.update_user_data(2, {"b": 2}),
+                             persistence.update_conversation("main", (1, 1), 3),
+                             persistence.update_conversation("main", (2, 2), 0))
+        await persistence.flush()
+    asyncio.run(run())
+    assert storage.writes() == [
+        ("update_user_data", [(1, "a", "1"), (2, "b", "2")], []),
+        ("update_conversations", [("main", "[1, 1]", 1, "3"), ("main", "[2, 2]", 2, "0")], []),
+    ]
+
+def test_conversations_are_loaded_per_chat(storage, persistence):
+    async def run():
+        await persistence.update_conversation("main", (1, 1), 3)
+        await persistence.update_conversation("main", (2, 2), 5)
+        await persistence.update_conversation("other", (1, 1), 1)
+        await persistence.flush()
+        await persistence.update_conversation("main", (2, 2), None)
+        await persistence.flush()
+        # A new process: states are filled in as chats send their first update
+        restarted = StoragePersistence(storage)
+        conversations = {"main": States()}
+        for chat_id in (1, 1, 2):
+            await restarted.load_conversations(conversations, chat_id)
+        return conversations
+    conversations = asyncio.run(run())
+    assert conversations == {"main": {(1, 1): 3}}
+    assert [call for call in storage.calls if call[0] == "get_conversations"] == \
+        [("get_conversations", 1), ("get_conversations", 2)]
+
+def test_loaded_states_do_not_replace_newer_ones(storage, persistence):
+    async def run():
+        await persistence.update_conversation("main", (1, 1), 3)
+        await persistence.flush()
+        conversations = {"main": States({(1, 1): 7})}
+        await StoragePersistence(storage).load_conversations(conversations, 1)
+        return conversations
+    assert asyncio.run(run()) == {"main": {(1, 1): 7}}
+
+def test_failed_writes_are_retried(storage, persistence):
+    async def run():
+        storage.failures = 1
+        await persistence.update_user_data(1, {"nav_stack": [0]})
+        await persistence.flush()
+        await persistence.update_user_data(1, {"nav_stack": [0], "search_query": "сон"})
+        await persistence.flush()
+        return await storage.get_user_data(1)
+    stored = asyncio.run(run())
+    assert stored == {"nav_stack": "[0]", "search_query": json.dumps("сон", ensure_ascii=False)}
+    # flush() retries what the failed background write kept; the next change is written on its own
+    assert storage.writes() == [
+        ("update_user_data", [(1, "nav_stack", "[0]")], []),
+        ("update_user_data", [(1, "nav_stack", "[0]")], []),
+        ("update_user_data", [(1, "search_query", '"сон"')], []),
+    ]
+
+def test_dropped_user_data_is_deleted(storage, persistence):
+    async def run():
+        await persistence.update_user_data(1, {"nav_stack": [0]})
+        await persistence.flush()
+        await persistence.update_user_data(1, {"nav_stack": [0, 3]})
+        await persistence.drop_user_data(1)
+        await persistence.flush()
+        return await storage.get_user_data(1)
+    assert asyncio.run(run()) == {}
+
+def test_conversation_states_needs_the_application_dict():
+    conversations = {"main": {}}
+    assert conversation_states(SimpleNamespace(_conversation_handler_conversations=conversations)) is conversations
+    with pytest.raises(RuntimeError):
+        conversation_states(SimpleNamespace())
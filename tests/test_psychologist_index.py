@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+import db
+import render_cache
+from commands.psychologists import filter_key, psychologists_page
+from pagination import short_key
+from psychologist_index import PsychologistIndex, parse_price, split_specialties
+from render_cache import RenderCache
+from snapshot import DataSnapshot
+
+PSYCHOLOGISTS = (
+    {"name": "A", "specialty": "Тревога, депрессия", "price": "15000"},
+    {"name": "B", "specialty": "тревога; выгорание", "price": 8000},
+    {"name": "C", "specialty": "Депрессия", "price": 0},
+    {"name": "D", "specialty": "ТРЕВОГА / отношения", "price": 20000},
+    {"name": "E", "specialty": "Тревога", "price": "договорная"},
+    {"name": "F", "specialty": None, "price": 30000},
+    {"name": "G", "specialty": "Отношения", "price": 10000},
+)
+
+def names(records):
+    return [record["name"] for record in records]
+
+def test_parse_price():
+    assert parse_price("15000") == 15000
+    assert parse_price(8000) == 8000
+    assert parse_price(0) is None
+    assert parse_price("договорная") is None
+    assert parse_price(None) is None
+
+def test_split_specialties_drops_duplicates_and_blanks():
+    assert split_specialties("Тревога, тревога;  / выгорание") == ["Тревога", "выгорание"]
+    assert split_specialties(None) == []
+
+def test_specialties_most_common_first():
+    index = PsychologistIndex(PSYCHOLOGISTS)
+    assert index.specialties == ("Тревога", "Депрессия", "Отношения", "Выгорание")
+
+def test_specialty_search_is_case_insensitive_and_in_directory_order():
+    index = PsychologistIndex(PSYCHOLOGISTS)
+    assert names(index.search("тревога")) == ["A", "B", "D", "E"]
+    assert names(index.search(" ТРЕВОГА ")) == ["A", "B", "D", "E"]
+    assert index.count("Тревога") == 4
+    assert index.count() == len(PSYCHOLOGISTS)
+    assert names(index.search()) == names(PSYCHOLOGISTS)
+
+def test_unknown_specialty_finds_nothing():
+    index = PsychologistIndex(PSYCHOLOGISTS)
+    assert index.search("гипноз") == ()
+    assert index.count("гипноз") == 0
+
+def test_price_band_includes_low_and_excludes_high():
+    index = PsychologistIndex(PSYCHOLOGISTS)
+    assert names(index.search(low=10000, high=20000)) == ["G", "A"]
+    assert names(index.search(low=20000, high=30000)) == ["D"]
+    assert names(index.search(low=30000)) == ["F"]
+    assert names(index.search(high=10000)) == ["B"]
+
+def test_price_band_leaves_out_unpriced_psychologists():
+    index = PsychologistIndex(PSYCHOLOGISTS)
+    assert names(index.search("Тревога", low=0)) == ["B", "A", "D"]
+    assert names(index.search(low=0)) == ["B", "G", "A", "D", "F"]
+
+def test_specialty_and_price_band_together():
+    index = PsychologistIndex(PSYCHOLOGISTS)
+    result = index.search("тревога", low=10000, high=30000)
+    assert names(result) == ["A", "D"]
+    assert len(result) == 2
+    assert names(result[1:]) == ["D"]
+    assert result[-1]["name"] == "D"
+
+def test_empty_band():
+    index = PsychologistIndex(PSYCHOLOGISTS)
+    assert len(index.search(low=40000)) == 0
+    assert len(index.search(low=20000, high=10000)) == 0
+
+@pytest.fixture
+def snapshot(monkeypatch):
+    snapshot = DataSnapshot({"bot_info": {"psychologists": list(PSYCHOLOGISTS)}}, version=1)
+    async def fetch_db():
+        return snapshot
+    monkeypatch.setattr(db, "fetch_db", fetch_db)
+    monkeypatch.setattr(render_cache, "render_cache", RenderCache())
+    return snapshot
+
+def listed(rendered):
+    return [name for name in "ABCDEFG" if f"<strong>{name} " in rendered[0]]
+
+def test_pages_of_the_filters_the_bot_sends(snapshot):
+    async def run():
+        return [await psychologists_page(key, offset) for key, offset in
+                (("", 0), ("", 5), (filter_key("Тревога", 0), 0), (filter_key(None, 2), 0))]
+    first, second, anxiety, band = asyncio.run(run())
+    assert (listed(first), listed(second)) == (list("ABCDE"), list("FG"))
+    assert listed(anxiety) == list("ABDE")
+    assert listed(band) == list("AG")
+
+def test_unknown_filters_and_offsets_are_rejected_before_caching(snapshot):
+    keys = [f"{short_key('Тревога')}.9", "x.1", ".two", f"{short_key('Неизвестно')}.0"]
+    async def run():
+        return [await psychologists_page(key, 0) for key in keys] + [await psychologists_page("", 3)]
+    assert asyncio.run(run()) == [None] * 5
+    assert render_cache.render_cache.get_stats()["entries"] == 1  # the specialty list, nothing per key
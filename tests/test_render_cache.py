@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+import db
+import render_cache
+from render_cache import RenderCache
+from commands.universities import university_page
+from snapshot import DataSnapshot
+
+def counting(value):
+    calls = []
+    def render():
+        calls.append(1)
+        return value
+    return render, calls
+
+def test_hits_and_misses():
+    cache = RenderCache()
+    render, calls = counting("menu")
+    assert [cache.get_or_render("menu", None, 1, render) for _ in range(3)] == ["menu"] * 3
+    assert len(calls) == 1
+    stats = cache.get_stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 1, 1)
+    assert stats["hit_ratio"] == pytest.approx(2 / 3)
+
+def test_arguments_and_locales_are_separate_entries():
+    cache = RenderCache()
+    assert cache.get_or_render("page", 0, 1, lambda: "first") == "first"
+    assert cache.get_or_render("page", 5, 1, lambda: "second") == "second"
+    assert cache.get_or_render("page", 0, 1, lambda: "other", locale="kk") == "other"
+    assert cache.get_or_render("page", 0, 1, lambda: "unused") == "first"
+
+def test_none_is_cached_too():
+    cache = RenderCache()
+    render, calls = counting(None)
+    cache.get_or_render("partners", 0, 1, render)
+    cache.get_or_render("partners", 0, 1, render)
+    assert len(calls) == 1
+
+def test_a_new_snapshot_version_drops_every_entry():
+    cache = RenderCache()
+    cache.get_or_render("menu", None, 1, lambda: "old")
+    cache.get_or_render("page", 0, 1, lambda: "old page")
+    assert cache.get_or_render("menu", None, 2, lambda: "new") == "new"
+    stats = cache.get_stats()
+    assert (stats["entries"], stats["invalidations"]) == (1, 1)
+
+def test_least_recently_used_entries_are_evicted():
+    cache = RenderCache(max_entries=2)
+    cache.get_or_render("a", None, 1, lambda: "a")
+    cache.get_or_render("b", None, 1, lambda: "b")
+    cache.get_or_render("a", None, 1, lambda: "unused")
+    cache.get_or_render("c", None, 1, lambda: "c")
+    assert cache.get_or_render("a", None, 1, lambda: "unused") == "a"
+    assert cache.get_or_render("b", None, 1, lambda: "b again") == "b again"
+    assert cache.get_stats()["evictions"] == 2
+
+@pytest.fixture
+def snapshot(monkeypatch):
+    snapshot = DataSnapshot({"bot_info": {"universities": [
+        {"id": "u1", "name": "КазНУ", "description": "Описание", "instagram": "@kaznu",
+         "link": {"url": "https://kaznu.kz", "title": ""}},
+    ]}}, version=1)
+    async def fetch_db():
+        return snapshot
+    monkeypatch.setattr(db, "fetch_db", fetch_db)
+    monkeypatch.setattr(render_cache, "render_cache", RenderCache())
+    return snapshot
+
+def test_unknown_universities_take_no_cache_entries(snapshot):
+    async def run():
+        found = await university_page("КазНУ")
+        missing = [await university_page(f"garbage {i}") for i in range(100)]
+        return found, missing
+    found, missing = asyncio.run(run())
+    assert "КазНУ" in found
+    assert missing == [None] * 100
+    assert render_cache.render_cache.get_stats()["entries"] == 1
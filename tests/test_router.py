@@ -0,0 +1,69 @@
+import asyncio
+from types import SimpleNamespace
+
+from commands.routes import state_routers
+from config import MAIN_MENU, SEARCH
+from language import textjson
+from router import StateRouter, normalize
+
+def handler(name):
+    async def handle(update, context):
+        return name
+    handle.__name__ = name
+    return handle
+
+default, back, menu, open_university, open_partners = (handler(name) for name in
+                                                        ("default", "back", "menu", "university", "partners"))
+
+def section():
+    return StateRouter(default, {"Назад ↩️": back, "Вернуться в главное меню 🏠": menu}, state="test")
+
+def main_menu():
+    return StateRouter(default, {"Узнать о JARQYN 🧑‍🤝‍🧑": open_university, "Наши партнеры 🤝": open_partners},
+                       state="test", first_word=True)
+
+def test_normalize():
+    assert normalize("Назад ↩️") == "назад"
+    assert normalize("  Узнать о JARQYN 🧑‍🤝‍🧑 ") == "узнать о jarqyn"
+    assert normalize("Практики 🧘‍♀️") == "практики"
+
+def test_buttons_and_typed_variants():
+    router = section()
+    for text in ("Назад ↩️", "Назад", "назад", "НАЗАД", "  назад ↩  ", "назад↩️"):
+        assert router.resolve(text) is back, text
+    assert router.resolve("вернуться в главное меню") is menu
+
+def test_other_text_goes_to_the_default():
+    router = section()
+    assert router.resolve("Назад пожалуйста") is default
+    assert router.resolve("дыхание") is default
+    assert router.resolve("назад " * 50) is default
+
+def test_first_word_routes_like_the_old_main_menu():
+    router = main_menu()
+    assert router.resolve("Узнать") is open_university
+    assert router.resolve("Узнать что-нибудь") is open_university
+    assert router.resolve("Наши") is open_partners
+    assert router.resolve("узнать о jarqyn") is open_university
+    assert router.resolve("Привет") is default
+
+def test_a_button_text_wins_over_another_buttons_alias():
+    first, second = handler("first"), handler("second")
+    router = StateRouter(default, {"Практики 🧘": first, "практики": second})
+    assert router.resolve("Практики 🧘") is first
+    assert router.resolve("практики") is second
+
+def test_the_bot_routes_every_main_menu_button_and_its_first_word():
+    router = state_routers[MAIN_MENU]
+    for text in vars(textjson.main_menu).values():
+        assert router.resolve(text) is not router.default, text
+        assert router.resolve(text.split(" ")[0]) is router.resolve(text), text
+    # Search queries are free text; only the navigation buttons are routed
+    search = state_routers[SEARCH]
+    assert search.resolve("Назад к дыханию") is search.default
+    assert search.resolve(textjson.common.back_button) is not search.default
+
+def test_call_dispatches_to_the_resolved_handler():
+    router = section()
+    update = SimpleNamespace(message=SimpleNamespace(text="назад"), effective_chat=SimpleNamespace(id=1))
+    assert asyncio.run(router(update, None)) == "back"
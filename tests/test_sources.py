@@ -0,0 +1,106 @@
+import asyncio
+import json
+import sqlite3
+import time
+
+import pytest
+
+from sources import ContentSource, FileSource, HttpSource, SQLiteSource, create_source
+
+def test_content_source_is_abstract():
+    with pytest.raises(TypeError):
+        ContentSource()
+
+def test_create_source():
+    assert isinstance(create_source("https://api.npoint.io/abc"), HttpSource)
+    assert isinstance(create_source("file:content.json"), FileSource)
+    assert isinstance(create_source("sqlite:content.sqlite3"), SQLiteSource)
+    with pytest.raises(ValueError):
+        create_source("ftp://example.com/content.json")
+
+def test_file_source_skips_unchanged_files(tmp_path):
+    source = FileSource(str(tmp_path / "content.json"))
+    async def run():
+        await source.write({"bot_info": {"start_text": "Привет"}})
+        first = await source.fetch()
+        unchanged = await source.fetch()
+        forced = await source.fetch(conditional=False)
+        return first, unchanged, forced
+    first, unchanged, forced = asyncio.run(run())
+    assert json.loads(first) == {"bot_info": {"start_text": "Привет"}}
+    assert unchanged is None
+    assert forced == first
+
+async def watch_until(source, changes: int, edit, on_change):
+    """Run source.watch, calling `edit` until `on_change` has been called `changes` times"""
+    calls = []
+    async def counted():
+        calls.append(time.monotonic())
+        await on_change(len(calls))
+    watch = asyncio.create_task(source.watch(counted))
+    try:
+        for attempt in range(200):
+            if len(calls) >= changes:
+                break
+            await edit(attempt)
+            await asyncio.sleep(0.02)
+    finally:
+        watch.cancel()
+    return len(calls)
+
+def test_file_watch_keeps_going_after_a_failed_change(tmp_path):
+    path = tmp_path / "content.json"
+    path.write_text("{}")
+    source = FileSource(str(path), poll_interval=0.01)
+    async def edit(attempt):
+        path.write_text(json.dumps({"edit": attempt}) + " " * attempt)
+    async def on_change(count):
+        if count == 1:
+            raise RuntimeError("refresh failed")
+    calls = asyncio.run(watch_until(source, 3, edit, on_change))
+    assert calls >= 3
+
+def test_sqlite_source_reads_rows_written_elsewhere(tmp_path):
+    path = str(tmp_path / "content.sqlite3")
+    source = SQLiteSource(path)
+    async def run():
+        with pytest.raises(LookupError):
+            await source.fetch()
+        await source.write({"bot_info": {"start_text": "Привет"}})
+        first = await source.fetch()
+        unchanged = await source.fetch()
+        await source.close()
+        return first, unchanged
+    first, unchanged = asyncio.run(run())
+    assert json.loads(first) == {"bot_info": {"start_text": "Привет"}}
+    assert unchanged is None
+
+def test_sqlite_watch_sees_other_writers_and_survives_errors(tmp_path):
+    path = str(tmp_path / "content.sqlite3")
+    source = SQLiteSource(path, poll_interval=0.01)
+    failures = []
+    async def run():
+        await source.write({})
+        run_query = source._run
+        async def flaky(func):
+            # The first poll after the baseline fails as a locked or corrupt database would
+            if not failures:
+                failures.append(True)
+                raise sqlite3.OperationalError("database is locked")
+            return await run_query(func)
+        writer = sqlite3.connect(path)
+        async def edit(attempt):
+            if attempt == 1:
+                source._run = flaky
+            with writer:
+                writer.execute("UPDATE content SET body = ?, updated_at = ?", (json.dumps({"edit": attempt}), time.time()))
+        async def on_change(count):
+            pass
+        try:
+            return await watch_until(source, 2, edit, on_change)
+        finally:
+            writer.close()
+            await source.close()
+    calls = asyncio.run(run())
+    assert failures
+    assert calls >= 2
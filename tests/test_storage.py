@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+from storage import SQLiteStorage, Storage, StorageError, create_storage, migrate_users
+
+@pytest.fixture
+def storage(tmp_path):
+    return SQLiteStorage(str(tmp_path / "data" / "bot.sqlite3"))
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+def test_storage_is_abstract():
+    with pytest.raises(TypeError):
+        Storage()
+
+def test_create_storage():
+    assert isinstance(create_storage("sqlite::memory:"), SQLiteStorage)
+    with pytest.raises(StorageError):
+        create_storage("postgres://localhost/bot")
+
+def test_users_and_subscriptions(storage):
+    async def scenario():
+        added = [await storage.add_users([1, 2, 3]), await storage.add_users([3, 4])]
+        await storage.set_subscribed(2, False)
+        return added, sorted(await storage.get_users()), sorted(await storage.get_users(subscribed_only=False))
+    added, subscribed, everyone = run(scenario())
+    assert added == [3, 1]
+    assert subscribed == [1, 3, 4]
+    assert everyone == [1, 2, 3, 4]
+
+def test_broadcasts_and_deliveries(storage):
+    async def scenario():
+        created = [await storage.create_broadcast("b1", {"text": "Новая практика"}, [1, 2]),
+                   await storage.create_broadcast("b1", {"text": "again"}, [3])]
+        await storage.set_delivery_statuses("b1", [(1, "sent")])
+        pending = await storage.get_deliveries("b1", "pending")
+        everything = sorted(await storage.get_deliveries("b1"))
+        unfinished = await storage.get_unfinished_broadcasts()
+        await storage.complete_broadcast("b1")
+        return created, pending, everything, unfinished, await storage.get_unfinished_broadcasts()
+    created, pending, everything, unfinished, after = run(scenario())
+    assert created == [True, False]
+    assert pending == [(2, "pending")]
+    assert everything == [(1, "sent"), (2, "pending")]
+    assert unfinished == [("b1", {"text": "Новая практика"})]
+    assert after == []
+
+def test_checkpoints(storage):
+    async def scenario():
+        missing = await storage.get_checkpoint("last_practice_id", 0)
+        await storage.set_checkpoint("last_practice_id", 5)
+        await storage.set_checkpoint("last_practice_id", 7)
+        return missing, await storage.get_checkpoint("last_practice_id")
+    assert run(scenario()) == (0, 7)
+
+def test_user_data_and_conversations(storage):
+    async def scenario():
+        await storage.update_user_data([(1, "nav_stack", "[0]"), (1, "search_query", '"сон"'), (2, "x", "1")], [])
+        await storage.update_user_data([(1, "nav_stack", "[0, 3]")], [(1, "search_query")])
+        await storage.update_conversations([("main", "[1, 1]", 1, "3"), ("main", "[2, 2]", 2, "0")], [])
+        await storage.update_conversations([], [("main", "[2, 2]")])
+        user_data = await storage.get_user_data(1)
+        await storage.delete_user_data(1)
+        return user_data, await storage.get_user_data(1), await storage.get_conversations(1), \
+            await storage.get_conversations(2)
+    user_data, deleted, first, second = run(scenario())
+    assert user_data == {"nav_stack": "[0, 3]"}
+    assert deleted == {}
+    assert first == [("main", "[1, 1]", "3")]
+    assert second == []
+
+def test_file_ids(storage):
+    async def scenario():
+        await storage.set_file_id("practice:1", "AAA")
+        await storage.set_file_id("practice:1", "BBB")
+        await storage.set_file_id("practice:2", "CCC")
+        await storage.delete_file_id("practice:2")
+        return await storage.get_file_ids()
+    assert run(scenario()) == {"practice:1": "BBB"}
+
+def test_sqlite_errors_become_storage_errors(storage):
+    async def scenario():
+        await storage._run(lambda conn: conn.execute("SELECT * FROM missing"))
+    with pytest.raises(StorageError):
+        run(scenario())
+
+def test_data_survives_reopening(tmp_path):
+    path = str(tmp_path / "bot.sqlite3")
+    async def scenario():
+        first = SQLiteStorage(path)
+        await first.add_users([1])
+        await first.close()
+        return await SQLiteStorage(path).get_users()
+    assert run(scenario()) == [1]
+
+def test_legacy_users_are_migrated_once(storage):
+    async def scenario():
+        await migrate_users(storage, [1, 2])
+        await migrate_users(storage, [3])
+        return sorted(await storage.get_users()), await storage.get_checkpoint("users_migrated")
+    assert run(scenario()) == ([1, 2], True)
@@ -0,0 +1,120 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import db
+import render_cache
+import text_search
+from commands import search
+from render_cache import RenderCache
+from snapshot import DataSnapshot
+from text_search import ContentSearchIndex, fingerprint, snapshot_documents, stem, terms
+
+def test_russian_forms_share_a_stem():
+    assert stem("дыхания") == stem("дыханием") == "дыхан"
+
+def test_kazakh_forms_share_a_stem():
+    assert stem("балаларға") == stem("балалар") == "бала"
+
+def test_stems_keep_at_least_three_letters():
+    assert stem("сна") == "сна"
+
+def test_terms_drop_stop_words_and_punctuation():
+    assert terms("Дыхание и сон, для студентов!") == [stem("дыхание"), stem("сон"), stem("студентов")]
+    assert terms("и в на") == []
+    assert terms(None) == []
+
+def test_terms_fold_case_and_yo():
+    assert terms("ЁЛКА") == terms("елка")
+
+def test_fingerprint_is_stable():
+    assert fingerprint("текст") == fingerprint("текст")
+    assert fingerprint("текст") != fingerprint("текст.")
+
+def build(documents):
+    index = ContentSearchIndex()
+    index.update(((("practice", key), text, {"id": key}) for key, text in documents))
+    return index
+
+def ids(hits):
+    return [hit.record["id"] for hit in hits]
+
+def test_more_occurrences_rank_higher():
+    index = build([(1, "дыхание сон отдых"), (2, "дыхание дыхание дыхание отдых"), (3, "сон отдых")])
+    assert ids(index.search("дыхание", 8)) == [2, 1]
+
+def test_rarer_terms_weigh_more():
+    index = build([(1, "тревога сон"), (2, "тревога медитация"), (3, "тревога отдых"), (4, "сон отдых")])
+    # Both documents match one term each; "медитация" is in one document, "тревога" in three
+    assert ids(index.search("тревога медитация", 8))[0] == 2
+
+def test_shorter_documents_rank_higher_for_the_same_count():
+    index = build([(1, "стресс экзамен"), (2, "стресс экзамен студент тело внимание отдых медитация")])
+    assert ids(index.search("стресс", 8)) == [1, 2]
+
+def test_inflected_query_finds_other_forms():
+    index = build([(1, "Упражнения для дыхания"), (2, "Сон")])
+    assert ids(index.search("дыханием", 8)) == [1]
+
+def test_limit_and_no_match():
+    index = build([(i, "тревога") for i in range(5)])
+    assert len(index.search("тревога", 3)) == 3
+    assert index.search("гипноз", 3) == []
+    assert ContentSearchIndex().search("тревога", 3) == []
+
+def test_update_reports_changes():
+    index = build([(1, "сон"), (2, "отдых")])
+    stats = index.update([(("practice", 1), "сон", {"id": 1}), (("practice", 3), "тревога", {"id": 3})])
+    assert stats == {"added": 1, "changed": 0, "removed": 1, "unchanged": 1}
+    assert ids(index.search("отдых", 8)) == []
+    assert ids(index.search("тревога", 8)) == [3]
+
+def test_synced_leaves_the_original_unchanged():
+    index = build([(1, "сон"), (2, "отдых")])
+    copy, stats = index.synced([(("practice", 1), "тревога", {"id": 1, "new": True}),
+                                (("practice", 2), "отдых", {"id": 2, "new": True})])
+    assert stats == {"added": 0, "changed": 1, "removed": 0, "unchanged": 1}
+    assert ids(index.search("сон", 8)) == [1]
+    assert ids(index.search("тревога", 8)) == []
+    assert index.search("отдых", 8)[0].record == {"id": 2}
+    assert ids(copy.search("сон", 8)) == []
+    assert ids(copy.search("тревога", 8)) == [1]
+    assert copy.search("отдых", 8)[0].record == {"id": 2, "new": True}
+
+class FakeMessage:
+    def __init__(self):
+        self.replies = []
+
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+
+@pytest.fixture
+def snapshot(monkeypatch):
+    snapshot = DataSnapshot({"bot_info": {"practices": [
+        {"id": 1, "name": "Квадратное дыхание", "category": "Дыхание", "content": "Дыхание на четыре счета"},
+        {"id": 2, "name": "Сканирование тела", "category": "Медитации", "content": "Внимание к телу перед сном"},
+    ]}}, version=3)
+    index = ContentSearchIndex()
+    index.update(snapshot_documents(snapshot))
+    index.version = snapshot.version
+    async def fetch_db():
+        return snapshot
+    monkeypatch.setattr(db, "fetch_db", fetch_db)
+    monkeypatch.setattr(text_search, "content_index", index)
+    monkeypatch.setattr(search, "search_cache", RenderCache(max_entries=2))
+    monkeypatch.setattr(render_cache, "render_cache", RenderCache())
+    return snapshot
+
+def test_results_are_cached_apart_from_the_menus(snapshot):
+    async def run(query):
+        message = FakeMessage()
+        await search.show_results(SimpleNamespace(message=message), None, query)
+        return message.replies[0]
+    replies = [asyncio.run(run(query)) for query in ("дыхание", "дыхание", "тело", "гипноз", "тревога")]
+    assert "Квадратное дыхание" in replies[0] and replies[0] == replies[1]
+    assert "Сканирование тела" in replies[2]
+    stats = search.search_cache.get_stats()
+    assert (stats["hits"], stats["misses"], stats["entries"], stats["evictions"]) == (1, 4, 2, 2)
+    # Typed queries take no room in the cache of menu and listing renders
+    assert render_cache.render_cache.get_stats()["entries"] == 0
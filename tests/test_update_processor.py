@@ -0,0 +1,105 @@
+import asyncio
+from datetime import datetime, timezone
+
+from telegram import Chat, InlineQuery, Message, Update, User
+
+from update_processor import ChatOrderedUpdateProcessor, chat_key
+
+USER = User(7, "Test", False)
+
+def message(update_id, chat_id):
+    chat = Chat(chat_id, Chat.PRIVATE)
+    return Update(update_id, message=Message(update_id, datetime.now(timezone.utc), chat, from_user=USER, text="hi"))
+
+class Recorder:
+    """Handlers that log when they start and finish, and wait for their update's gate to open"""
+
+    def __init__(self):
+        self.log = []
+        self.gates = {}
+
+    def gate(self, update_id):
+        return self.gates.setdefault(update_id, asyncio.Event())
+
+    async def handle(self, update_id):
+        self.log.append(("start", update_id))
+        await self.gate(update_id).wait()
+        self.log.append(("end", update_id))
+
+async def settle():
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+def test_chat_key():
+    assert chat_key(message(1, 42)) == 42
+    inline = Update(2, inline_query=InlineQuery("q", USER, "calm", ""))
+    assert chat_key(inline) == ("user", 7)
+    assert chat_key(Update(3)) is None
+    assert chat_key("not an update") is None
+
+def test_updates_of_one_chat_run_one_at_a_time_in_order():
+    async def run():
+        processor = ChatOrderedUpdateProcessor(4)
+        recorder = Recorder()
+        tasks = [asyncio.create_task(processor.process_update(message(i, 1), recorder.handle(i))) for i in (1, 2, 3)]
+        await settle()
+        assert recorder.log == [("start", 1)]
+        assert processor.running == 1 and processor.waiting == 2
+        for i in (1, 2, 3):
+            recorder.gate(i).set()
+            await settle()
+        await asyncio.gather(*tasks)
+        assert recorder.log == [("start", 1), ("end", 1), ("start", 2), ("end", 2), ("start", 3), ("end", 3)]
+        assert processor._chats == {}
+        assert processor.running == 0 and processor.waiting == 0
+    asyncio.run(run())
+
+def test_a_busy_chat_does_not_hold_up_others():
+    async def run():
+        processor = ChatOrderedUpdateProcessor(2)
+        recorder = Recorder()
+        tasks = [asyncio.create_task(processor.process_update(message(i, 1), recorder.handle(i))) for i in (1, 2, 3)]
+        tasks.append(asyncio.create_task(processor.process_update(message(4, 2), recorder.handle(4))))
+        await settle()
+        # The backlog of chat 1 holds a single processing slot
+        assert recorder.log == [("start", 1), ("start", 4)]
+        recorder.gate(4).set()
+        await settle()
+        assert recorder.log[-1] == ("end", 4)
+        for i in (1, 2, 3):
+            recorder.gate(i).set()
+        await asyncio.gather(*tasks)
+    asyncio.run(run())
+
+def test_slots_bound_how_many_chats_run_at_once():
+    async def run():
+        processor = ChatOrderedUpdateProcessor(2)
+        recorder = Recorder()
+        tasks = [asyncio.create_task(processor.process_update(message(i, i), recorder.handle(i))) for i in (1, 2, 3)]
+        await settle()
+        assert recorder.log == [("start", 1), ("start", 2)]
+        recorder.gate(1).set()
+        await settle()
+        assert ("start", 3) in recorder.log
+        recorder.gate(2).set()
+        recorder.gate(3).set()
+        await asyncio.gather(*tasks)
+    asyncio.run(run())
+
+def test_a_cancelled_waiting_update_is_dropped():
+    async def run():
+        processor = ChatOrderedUpdateProcessor(4)
+        recorder = Recorder()
+        first = asyncio.create_task(processor.process_update(message(1, 1), recorder.handle(1)))
+        dropped = recorder.handle(2)
+        second = asyncio.create_task(processor.process_update(message(2, 1), dropped))
+        await settle()
+        second.cancel()
+        await settle()
+        assert dropped.cr_frame is None  # closed without running
+        assert processor.waiting == 0
+        recorder.gate(1).set()
+        await first
+        assert recorder.log == [("start", 1), ("end", 1)]
+        assert processor._chats == {}
+    asyncio.run(run())
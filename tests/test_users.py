@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+
+import db
+from storage import SQLiteStorage
+from users import UserRegistry
+
+@pytest.fixture
+def legacy(monkeypatch):
+    """Legacy users of the remote document, returned once `ready` is set"""
+    class Legacy:
+        users = [101, 102]
+        calls = 0
+        ready: asyncio.Event = None
+        error: Exception = None
+    async def get_users():
+        Legacy.calls += 1
+        if Legacy.ready is not None:
+            await Legacy.ready.wait()
+        if Legacy.error is not None:
+            raise Legacy.error
+        return Legacy.users
+    monkeypatch.setattr(db, "get_users", get_users)
+    return Legacy
+
+@pytest.fixture
+def paths(tmp_path):
+    return str(tmp_path / "bot.sqlite3"), str(tmp_path / "data" / "users.journal")
+
+def read_journal(path):
+    with open(path) as f:
+        return sorted(int(line) for line in f if line.strip())
+
+def test_add_journals_new_users_once(paths, legacy):
+    async def run():
+        registry = UserRegistry(SQLiteStorage(paths[0]), paths[1])
+        added = [await registry.add(1), await registry.add(2), await registry.add(1)]
+        journal = read_journal(paths[1])
+        await registry.close()
+        return added, journal, registry.pending_count
+    added, journal, pending = asyncio.run(run())
+    assert added == [True, True, False]
+    assert journal == [1, 2]
+    assert pending == 0
+
+def test_journal_is_replayed_after_a_crash(paths, legacy):
+    async def run():
+        registry = UserRegistry(SQLiteStorage(paths[0]), paths[1])
+        await registry.add(1)
+        await registry.add(2)
+        # No close(): the process died before the next flush
+        restarted = UserRegistry(SQLiteStorage(paths[0]), paths[1])
+        await restarted.load()
+        return restarted.pending_count, await restarted.add(1), sorted(await restarted.get_users())
+    pending, added_again, users = asyncio.run(run())
+    assert pending == 2
+    assert not added_again
+    assert users == [1, 2, 101, 102]
+
+def test_flush_writes_pending_users_and_empties_the_journal(paths, legacy):
+    legacy.users = []
+    async def run():
+        storage = SQLiteStorage(paths[0])
+        registry = UserRegistry(storage, paths[1])
+        for chat_id in (1, 2, 3):
+            await registry.add(chat_id)
+        flushed = await registry.flush()
+        return flushed, read_journal(paths[1]), sorted(await storage.get_users()), await registry.flush()
+    flushed, journal, stored, again = asyncio.run(run())
+    assert flushed == 3
+    assert journal == []
+    assert stored == [1, 2, 3]
+    assert again == 0
+
+def test_legacy_import_runs_in_the_background(paths, legacy):
+    async def run():
+        storage = SQLiteStorage(paths[0])
+        registry = UserRegistry(storage, paths[1])
+        legacy.ready = asyncio.Event()
+        await registry.load()
+        added = await registry.add(7)
+        listing = asyncio.create_task(registry.get_users())
+        await asyncio.sleep(0.01)
+        waiting = not listing.done()
+        legacy.ready.set()
+        users = sorted(await listing)
+        return added, waiting, users, await storage.get_checkpoint("users_migrated")
+    added, waiting, users, migrated = asyncio.run(run())
+    assert added
+    # A broadcast's listing waits for the legacy users
+    assert waiting
+    assert users == [7, 101, 102]
+    assert migrated is True
+
+def test_legacy_import_runs_once(paths, legacy):
+    async def run():
+        for _ in range(2):
+            registry = UserRegistry(SQLiteStorage(paths[0]), paths[1])
+            await registry.get_users()
+            await registry.close()
+    asyncio.run(run())
+    assert legacy.calls == 1
+
+def test_failed_legacy_import_is_retried_on_the_next_start(paths, legacy):
+    async def run():
+        storage = SQLiteStorage(paths[0])
+        legacy.error = OSError("unreachable")
+        registry = UserRegistry(storage, paths[1])
+        users = await registry.get_users()
+        migrated = await storage.get_checkpoint("users_migrated")
+        await registry.close()
+        legacy.error = None
+        restarted = UserRegistry(storage, paths[1])
+        return users, migrated, sorted(await restarted.get_users())
+    users, migrated, retried = asyncio.run(run())
+    assert users == []
+    assert migrated is None
+    assert retried == [101, 102]
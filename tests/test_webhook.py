@@ -0,0 +1,39 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import config
+from http_server import Request
+from webhook import SECRET_HEADER, WebhookServer
+
+UPDATE = {"update_id": 1, "message": {"message_id": 1, "date": 0, "chat": {"id": 7, "type": "private"},
+                                       "text": "/start"}}
+
+def webhook() -> WebhookServer:
+    application = SimpleNamespace(bot=None, update_queue=asyncio.Queue())
+    return WebhookServer(application, "/telegram", "secret", port=0)
+
+def post(server: WebhookServer, body: bytes, token: str = "secret"):
+    headers = {SECRET_HEADER: token} if token is not None else {}
+    return asyncio.run(server.handle_update(Request("POST", "/telegram", {}, headers, body)))
+
+def test_listens_on_localhost_by_default():
+    assert webhook().http.host == "127.0.0.1"
+    assert config.WEBHOOK_LISTEN == "127.0.0.1"
+
+def test_updates_with_the_secret_are_queued():
+    server = webhook()
+    assert post(server, json.dumps(UPDATE).encode()).status == 200
+    update = server.application.update_queue.get_nowait()
+    assert (update.update_id, update.message.text) == (1, "/start")
+
+def test_wrong_or_missing_secret_is_forbidden():
+    server = webhook()
+    assert post(server, json.dumps(UPDATE).encode(), token="guess").status == 403
+    assert post(server, json.dumps(UPDATE).encode(), token=None).status == 403
+    assert server.application.update_queue.empty()
+
+def test_malformed_updates_are_rejected():
+    server = webhook()
+    assert post(server, b"{not json").status == 400
+    assert server.application.update_queue.empty()
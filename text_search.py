@@ -0,0 +1,252 @@
+import asyncio
+import hashlib
+import html
+import heapq
+import math
+import re
+import time
+from functools import lru_cache
+from typing import Dict, Hashable, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from logger import logger
+from practice_search import normalize
+from snapshot import DataSnapshot
+
+# Words too common to tell documents apart, in Russian and Kazakh
+_STOP_WORDS = frozenset("""
+    а без более бы был была были было быть в вам вас весь во вот все всего всех вы где да даже для до его ее ей
+    если есть еще же за и из или им их к как ко когда кто ли между меня мне мы на над не него нее нет ни них но
+    о об от по под при про с со так также то того тоже только у уже чем что чтобы это эти этот я
+    және мен бен пен да де та те бұл осы ол сол олар біз сіз сен мен үшін деп емес еді бар жоқ әр не
+""".split())
+
+_KAZAKH_LETTERS = frozenset("әғқңөұүһі")
+
+# Inflectional endings, longest first; a stem keeps at least _MIN_STEM letters
+_RUSSIAN_ENDINGS = tuple(sorted("""
+    иями ями ами иях ием ией иям ого его ому ему ыми ими ться тся ешь ать ять еть ить уть ость ости
+    ой ей ий ый ая яя ое ее ые ие ых их ую юю ом ем ам ям ах ях ов ев ию ии ия ет ют ут ит ат ят ла ло ли ть
+    а я о е ы и у ю ь й
+""".split(), key=len, reverse=True))
+_KAZAKH_ENDINGS = tuple(sorted("""
+    ның нің дың дің тың тің ға ге қа ке на не ны ні ды ді ты ті да де та те нда нде
+    нан нен дан ден тан тен мен бен пен сы сі ым ім ың ің ы і
+""".split(), key=len, reverse=True))
+_KAZAKH_PLURALS = ("лар", "лер", "дар", "дер", "тар", "тер")
+# A plural suffix, maybe followed by a case ending, marks a Kazakh word written without Kazakh letters
+_KAZAKH_PLURAL_FORM = re.compile(r"(?:лар|лер|дар|дер|тар|тер)(?:ға|ге|да|де|дан|ден|дың|дің|ды|ді|ы|і|мен)?$")
+_MIN_STEM = 3
+
+def _strip(word: str, endings: Tuple[str, ...]) -> str:
+    for ending in endings:
+        if word.endswith(ending) and len(word) - len(ending) >= _MIN_STEM:
+            return word[:-len(ending)]
+    return word
+
+@lru_cache(maxsize=65536)
+def stem(word: str) -> str:
+    """Crude stem of a normalized word: one Russian ending, or a Kazakh case ending and then a plural suffix.
+
+    Both sides of a search go through the same function, so "дыхания" and
+    "дыханием" meet at "дыхан" and "балаларға" and "балалар" at "бала";
+    the stems need not be words.
+    """
+    if _KAZAKH_LETTERS.intersection(word) or _KAZAKH_PLURAL_FORM.search(word):
+        return _strip(_strip(word, _KAZAKH_ENDINGS), _KAZAKH_PLURALS)
+    return _strip(word, _RUSSIAN_ENDINGS)
+
+@lru_cache(maxsize=65536)
+def _term(word: str) -> str:
+    return "" if word in _STOP_WORDS or len(word) < 2 else stem(word)
+
+# Same words as normalize() splits text into; finding them is cheaper than substituting the gaps in long texts
+_WORDS = re.compile(r"[^\W_]+")
+
+def terms(text) -> List[str]:
+    """Stems of the words of `text` that are not stop words, in order"""
+    if not isinstance(text, str):
+        return []
+    return [term for term in map(_term, _WORDS.findall(text.casefold().replace("ё", "е"))) if term]
+
+_TAG = re.compile(r"<[^>]+>")
+_WORD = re.compile(r"\w+")
+
+def snippet(text: str, query_terms: Set[str], width: int = 160) -> str:
+    """HTML-escaped excerpt of `text` without markup, around the first word matching one of `query_terms`"""
+    plain = " ".join(html.unescape(_TAG.sub(" ", text or "")).split())
+    start = 0
+    for match in _WORD.finditer(plain):
+        if stem(normalize(match.group())) in query_terms:
+            start = max(0, match.start() - width // 4)
+            break
+    excerpt = plain[start:start + width]
+    if start + width < len(plain):
+        excerpt = excerpt[:excerpt.rfind(" ")] if " " in excerpt else excerpt
+        excerpt += "…"
+    if start > 0:
+        excerpt = "…" + excerpt[excerpt.find(" ") + 1:]
+    return html.escape(excerpt)
+
+class Hit(NamedTuple):
+    kind: str  # "practice", "university" or "event"
+    record: dict
+    score: float
+
+def fingerprint(text: str) -> bytes:
+    """Digest of a document's text that stays the same across processes, unlike hash()"""
+    return hashlib.blake2s(text.encode(), digest_size=16).digest()
+
+class _Document:
+    __slots__ = ("fingerprint", "length", "counts", "record")
+
+    def __init__(self, fingerprint: bytes, counts: Dict[str, int], record: dict, length: Optional[int] = None):
+        self.fingerprint = fingerprint
+        self.length = sum(counts.values()) if length is None else length
+        self.counts = counts
+        self.record = record
+
+class ContentSearchIndex:
+    """Inverted index with BM25 ranking over practices, universities and events.
+
+    Documents are keyed by (kind, id) and remember a fingerprint of their
+    text, so syncing with a new snapshot only tokenizes the documents that
+    were added or changed and only removes the postings of the ones that
+    changed or disappeared; the rest merely pick up the new snapshot's record.
+    `synced` does the same into a copy, so the index being searched is never
+    modified while the next one is built.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.version: Optional[int] = None
+        self._documents: Dict[Tuple[str, Hashable], _Document] = {}
+        self._postings: Dict[str, Dict[Tuple[str, Hashable], int]] = {}
+        self._total_length = 0
+        # Per document: k1 * (1 - b + b * length / average length), recomputed after every update
+        self._norms: Dict[Tuple[str, Hashable], float] = {}
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def update(self, documents: Iterable[Tuple[Tuple[str, Hashable], str, dict]]) -> Dict[str, int]:
+        """Make the index hold exactly `documents`, given as ((kind, id), text, record); returns what changed"""
+        stats = {"added": 0, "changed": 0, "removed": 0, "unchanged": 0}
+        seen = set()
+        for key, text, record in documents:
+            seen.add(key)
+            digest = fingerprint(text)
+            document = self._documents.get(key)
+            if document is not None and document.fingerprint == digest:
+                # A new _Document rather than a new record on the old one, which a copy may share
+                self._documents[key] = _Document(digest, document.counts, record, document.length)
+                stats["unchanged"] += 1
+                continue
+            stats["changed" if document is not None else "added"] += 1
+            if document is not None:
+                self._remove(key, document)
+            counts: Dict[str, int] = {}
+            for term in terms(text):
+                counts[term] = counts.get(term, 0) + 1
+            document = self._documents[key] = _Document(digest, counts, record)
+            self._total_length += document.length
+            for term, count in counts.items():
+                self._postings.setdefault(term, {})[key] = count
+        for key in [key for key in self._documents if key not in seen]:
+            self._remove(key, self._documents[key])
+            stats["removed"] += 1
+        if stats["added"] or stats["changed"] or stats["removed"]:
+            average_length = self._total_length / len(self._documents) if self._documents else 1
+            k1, b = self.k1, self.b
+            self._norms = {key: k1 * (1 - b + b * document.length / (average_length or 1))
+                           for key, document in self._documents.items()}
+        return stats
+
+    def synced(self, documents: Iterable[Tuple[Tuple[str, Hashable], str, dict]]
+               ) -> Tuple["ContentSearchIndex", Dict[str, int]]:
+        """A copy of this index updated to hold exactly `documents`, and what changed; this index is left as it is"""
+        index = ContentSearchIndex(self.k1, self.b)
+        index._documents = dict(self._documents)
+        index._postings = {term: dict(postings) for term, postings in self._postings.items()}
+        index._total_length = self._total_length
+        index._norms = self._norms
+        return index, index.update(documents)
+
+    def _remove(self, key, document: _Document) -> None:
+        del self._documents[key]
+        self._total_length -= document.length
+        for term in document.counts:
+            postings = self._postings[term]
+            del postings[key]
+            if not postings:
+                del self._postings[term]
+
+    def search(self, query: str, limit: int) -> List[Hit]:
+        """The `limit` documents with the highest BM25 score for the terms of `query`"""
+        count = len(self._documents)
+        if not count:
+            return []
+        norms = self._norms
+        scores: Dict[Tuple[str, Hashable], float] = {}
+        for term in set(terms(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            weight = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5)) * (self.k1 + 1)
+            for key, frequency in postings.items():
+                scores[key] = scores.get(key, 0.0) + weight * frequency / (frequency + norms[key])
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [Hit(key[0], self._documents[key].record, score) for key, score in best]
+
+def snapshot_documents(snapshot: DataSnapshot) -> Iterable[Tuple[Tuple[str, Hashable], str, dict]]:
+    """Searchable documents of a snapshot: practice content, university and event descriptions, with their titles"""
+    for practice in snapshot.practices:
+        if practice.get("id") is not None:
+            yield ("practice", practice["id"]), f"{practice.get('name', '')}\n{practice.get('content', '')}", practice
+    for university in snapshot.universities:
+        if university.get("id") is not None:
+            yield (("university", university["id"]),
+                   f"{university.get('name', '')}\n{university.get('description', '')}", university)
+    for event in snapshot.events:
+        if event.get("id") is not None:
+            yield ("event", event["id"]), f"{event.get('title', '')}\n{event.get('description', '')}", event
+
+# Replaced, never modified, once a sync finishes; searches keep using the previous one until then
+content_index = ContentSearchIndex()
+_syncs: Dict[int, "asyncio.Task[ContentSearchIndex]"] = {}
+_sync_lock = asyncio.Lock()
+
+async def _sync(snapshot: DataSnapshot) -> ContentSearchIndex:
+    global content_index
+    async with _sync_lock:
+        if content_index.version is not None and content_index.version >= snapshot.version:
+            return content_index
+        started = time.perf_counter()
+        # Tokenizing ~10k documents takes about a second; a worker thread keeps the event loop serving meanwhile
+        index, stats = await asyncio.to_thread(content_index.synced, list(snapshot_documents(snapshot)))
+        index.version = snapshot.version
+        content_index = index
+        logger.info("Search index synced to snapshot %s in %.0f ms: %s", snapshot.version,
+                    (time.perf_counter() - started) * 1000, stats)
+        return index
+
+def sync(snapshot: DataSnapshot) -> "asyncio.Future[ContentSearchIndex]":
+    """Bring the content index up to date with `snapshot` in the background; at most one sync per snapshot"""
+    task = _syncs.get(snapshot.version)
+    if task is None:
+        task = _syncs[snapshot.version] = asyncio.create_task(_sync(snapshot))
+        task.add_done_callback(lambda _: _syncs.pop(snapshot.version, None))
+    # A cancelled caller must not cancel a sync other callers wait for
+    return asyncio.shield(task)
+
+async def index_for(snapshot: DataSnapshot) -> ContentSearchIndex:
+    """The content index for `snapshot`, or the previous one while that is being built.
+
+    Only waits for the build when there is no index yet, right after startup.
+    """
+    if content_index.version == snapshot.version:
+        return content_index
+    if content_index.version is None:
+        return await sync(snapshot)
+    sync(snapshot)
+    return content_index
@@ -0,0 +1,132 @@
+import contextvars
+import random
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from typing import Deque, List, Optional, Tuple
+
+from telegram import Update
+from telegram.ext import Application
+
+from logger import logger
+
+# The trace of the update being processed; None when the update is not traced
+_current: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("trace", default=None)
+
+_NO_SPAN = nullcontext()
+
+class Trace:
+    """Timed spans recorded while one update was processed"""
+
+    __slots__ = ("update_id", "chat_id", "started", "duration", "spans")
+
+    def __init__(self, update_id: int, chat_id: Optional[int]):
+        self.update_id = update_id
+        self.chat_id = chat_id
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        # (name, offset from the start of the update, duration) in seconds
+        self.spans: List[Tuple[str, float, float]] = []
+
+    def totals(self) -> List[Tuple[str, int, float]]:
+        """(name, count, total seconds) per span name, slowest first"""
+        totals = {}
+        for name, _, duration in self.spans:
+            count, total = totals.get(name, (0, 0.0))
+            totals[name] = (count + 1, total + duration)
+        return sorted(((name, count, total) for name, (count, total) in totals.items()),
+                      key=lambda item: item[2], reverse=True)
+
+    def summary(self) -> str:
+        """e.g. "handler:handle_contacts 41.0 ms, api:sendMessage 38.2 ms, fetch_db 0.0 ms x2" """
+        parts = []
+        for name, count, total in self.totals():
+            parts.append(f"{name} {total * 1000:.1f} ms" + (f" x{count}" if count > 1 else ""))
+        return ", ".join(parts)
+
+class _Span:
+    __slots__ = ("trace", "name", "started")
+
+    def __init__(self, trace: Trace, name: str):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        ended = time.perf_counter()
+        self.trace.spans.append((self.name, self.started - self.trace.started, ended - self.started))
+        return False
+
+def span(name: str, detail: Optional[str] = None):
+    """Time a block as part of the current update's trace, e.g. span("api", "sendMessage").
+
+    Outside a traced update this returns a shared no-op context manager, so
+    instrumented code costs one context variable lookup while tracing is off.
+    """
+    trace = _current.get()
+    if trace is None:
+        return _NO_SPAN
+    return _Span(trace, f"{name}:{detail}" if detail else name)
+
+def current() -> Optional[Trace]:
+    return _current.get()
+
+class Tracer:
+    """Decides which updates are traced and keeps the most recent traces.
+
+    Off by default. While on, `sample_rate` of updates are traced; finished
+    traces slower than `log_threshold` seconds are logged with their spans.
+    """
+
+    def __init__(self, keep: int = 200):
+        self.sample_rate = 0.0
+        self.log_threshold = 0.0
+        self.recent: Deque[Trace] = deque(maxlen=keep)
+        self._random = random.Random()
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+
+    def enable(self, sample_rate: float = 1.0, log_threshold: float = 0.0) -> None:
+        self.sample_rate = sample_rate
+        self.log_threshold = log_threshold
+
+    def disable(self) -> None:
+        self.sample_rate = 0.0
+
+    def sampled(self) -> bool:
+        return self.sample_rate >= 1 or self._random.random() < self.sample_rate
+
+    @contextmanager
+    def trace(self, update: object):
+        update_id = getattr(update, "update_id", 0)
+        chat = update.effective_chat if isinstance(update, Update) else None
+        trace = Trace(update_id, chat.id if chat else None)
+        token = _current.set(trace)
+        try:
+            yield trace
+        finally:
+            _current.reset(token)
+            trace.duration = time.perf_counter() - trace.started
+            self.recent.append(trace)
+            if trace.duration >= self.log_threshold:
+                logger.info("Trace of update %s for chat %s: %.1f ms (%s)", trace.update_id, trace.chat_id,
+                            trace.duration * 1000, trace.summary())
+
+    def slowest(self, count: int = 10) -> List[Trace]:
+        return sorted(self.recent, key=lambda trace: trace.duration, reverse=True)[:count]
+
+tracer = Tracer()
+
+class TracingApplication(Application):
+    """Application that traces a sample of updates while the tracer is enabled"""
+
+    async def process_update(self, update: object) -> None:
+        if not tracer.sample_rate or not tracer.sampled():
+            return await super().process_update(update)
+        with tracer.trace(update):
+            return await super().process_update(update)
@@ -0,0 +1,87 @@
+import asyncio
+import time
+from contextlib import nullcontext
+from typing import Awaitable, Dict, Hashable, List, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+import metrics
+
+_NO_LOCK = nullcontext()
+
+def chat_key(update: object) -> Optional[Hashable]:
+    """The chat whose updates must stay in order, or None for updates not tied to one (e.g. inline queries)"""
+    if not isinstance(update, Update):
+        return None
+    if update.effective_chat is not None:
+        return update.effective_chat.id
+    if update.effective_user is not None:
+        return ("user", update.effective_user.id)
+    return None
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Processes updates of different chats concurrently, and those of one chat one at a time in arrival order.
+
+    The ConversationHandler state and the nav_stack in user_data assume a
+    chat's updates never overlap, so each chat has a lock that its updates
+    take in the order they were fetched. Only then does an update wait for
+    one of `max_concurrent_updates` processing slots, so a chat with a
+    backlog holds at most one slot and cannot stall the others.
+
+    The base class semaphore, taken before any of this, only bounds how many
+    updates may be waiting at once (`max_pending_updates`).
+    """
+
+    def __init__(self, max_concurrent_updates: int, max_pending_updates: int = 4096):
+        super().__init__(max(max_pending_updates, max_concurrent_updates, 2))
+        self.concurrency = max_concurrent_updates
+        self._slots = asyncio.Semaphore(max_concurrent_updates)
+        # Per chat: its lock and the number of updates holding or waiting for it
+        self._chats: Dict[Hashable, List] = {}
+        self.running = 0
+        self.waiting = 0
+
+    async def do_process_update(self, update: object, coroutine: Awaitable) -> None:
+        key = chat_key(update)
+        entry = None
+        if key is not None:
+            entry = self._chats.get(key)
+            if entry is None:
+                entry = self._chats[key] = [asyncio.Lock(), 0]
+            entry[1] += 1
+        received = time.perf_counter()
+        self._set_waiting(self.waiting + 1)
+        started = False
+        try:
+            async with entry[0] if entry is not None else _NO_LOCK:
+                async with self._slots:
+                    started = True
+                    self._set_waiting(self.waiting - 1)
+                    metrics.update_wait_duration.observe(time.perf_counter() - received)
+                    self.running += 1
+                    metrics.updates_in_progress.set(self.running)
+                    try:
+                        await coroutine
+                    finally:
+                        self.running -= 1
+                        metrics.updates_in_progress.set(self.running)
+        finally:
+            if not started:
+                # Cancelled while waiting: the update is dropped, close its coroutine unawaited
+                self._set_waiting(self.waiting - 1)
+                coroutine.close()
+            if entry is not None:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._chats[key]
+
+    def _set_waiting(self, waiting: int) -> None:
+        self.waiting = waiting
+        metrics.updates_waiting.set(waiting)
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
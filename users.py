@@ -0,0 +1,129 @@
+import asyncio
+import os
+from typing import List, Optional, Set
+
+import db
+from logger import logger
+from config import USERS_JOURNAL
+from storage import Storage, storage, migrate_users
+
+class UserRegistry:
+    """In-memory set of known users with write-behind persistence.
+
+    New chat IDs are added to memory and appended to a local journal, then
+    written to storage in batches by flush(). The journal is replayed on
+    startup, so users registered between flushes survive a crash or redeploy.
+    The one-time import of the remote document's legacy users runs in the
+    background, so neither load() nor add() waits for the content backend.
+    """
+
+    def __init__(self, storage: Storage, journal_path: str):
+        self.storage = storage
+        self.journal_path = journal_path
+        self._known: Set[int] = set()
+        self._pending: Set[int] = set()
+        self._journal = None
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+        self._flush_lock = asyncio.Lock()
+        self._migration: Optional[asyncio.Task] = None
+
+    async def load(self) -> None:
+        """Seed the registry from storage and replay the local journal; start the legacy import if it is due"""
+        async with self._load_lock:
+            if self._loaded:
+                return
+            if not await self.storage.get_checkpoint("users_migrated"):
+                self._migration = asyncio.create_task(self._migrate())
+            self._known.update(await self.storage.get_users(subscribed_only=False))
+            journal_dir = os.path.dirname(self.journal_path)
+            if journal_dir:
+                os.makedirs(journal_dir, exist_ok=True)
+            if os.path.exists(self.journal_path):
+                with open(self.journal_path, "r") as f:
+                    for line in f:
+                        line = line.strip()
+                        if line.lstrip("-").isdigit():
+                            self._pending.add(int(line))
+                self._pending -= self._known
+                self._known |= self._pending
+                logger.info("Replayed %s pending users from journal", len(self._pending))
+            self._journal = open(self.journal_path, "a")
+            self._loaded = True
+
+    async def _migrate(self) -> None:
+        try:
+            legacy = await db.get_users()
+            await migrate_users(self.storage, legacy)
+            self._known.update(legacy)
+        except Exception as e:
+            # The checkpoint is not set, so the next start tries again
+            logger.error(f"Failed to migrate legacy users: {str(e)}")
+
+    async def add(self, chat_id: int) -> bool:
+        """Register a chat ID; returns True if it was not known before"""
+        if not self._loaded:
+            await self.load()
+        if chat_id in self._known:
+            return False
+        self._known.add(chat_id)
+        self._pending.add(chat_id)
+        self._journal.write(f"{chat_id}\n")
+        self._journal.flush()
+        return True
+
+    async def get_users(self) -> List[int]:
+        """Get subscribed chat IDs, including ones not yet flushed"""
+        if not self._loaded:
+            await self.load()
+        if self._migration is not None:
+            # A broadcast must reach the legacy users too
+            await asyncio.shield(self._migration)
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Failed to flush users before listing: {str(e)}")
+        return list(set(await self.storage.get_users()) | self._pending)
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    async def flush(self) -> int:
+        """Write all pending users to storage in one transaction; returns the number written"""
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            batch = set(self._pending)
+            added = await self.storage.add_users(batch)
+            self._pending -= batch
+            self._rewrite_journal()
+            logger.info("Flushed %s pending users (%s new in storage)", len(batch), added)
+            return len(batch)
+
+    def _rewrite_journal(self) -> None:
+        # Keep only users registered while the flush was in progress
+        tmp_path = self.journal_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.writelines(f"{chat_id}\n" for chat_id in self._pending)
+            f.flush()
+            os.fsync(f.fileno())
+        self._journal.close()
+        os.replace(tmp_path, self.journal_path)
+        self._journal = open(self.journal_path, "a")
+
+    async def close(self) -> None:
+        """Flush pending users and close the journal"""
+        if self._migration is not None and not self._migration.done():
+            self._migration.cancel()
+        self._migration = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Failed to flush users on shutdown, kept in journal: {str(e)}")
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        self._loaded = False
+
+registry = UserRegistry(storage, USERS_JOURNAL)
@@ -0,0 +1,93 @@
+import asyncio
+import hmac
+import json
+import secrets
+import signal
+from typing import Optional
+from urllib.parse import urlsplit
+
+from telegram import Update
+from telegram.ext import Application
+
+from logger import logger
+from http_server import HTTPServer, Request, Response, create_ssl_context
+
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+
+class WebhookServer:
+    """Receives updates pushed by Telegram and feeds them into the Application queue.
+
+    Requests without the expected secret token are rejected before the body is
+    parsed, so only Telegram can inject updates.
+    """
+
+    def __init__(self, application: Application, path: str, secret_token: str, listen: str = "127.0.0.1",
+                 port: int = 8443, cert: Optional[str] = None, key: Optional[str] = None):
+        self.application = application
+        self.path = path
+        self.secret_token = secret_token
+        ssl_context = create_ssl_context(cert, key) if cert and key else None
+        self.http = HTTPServer(listen, port, ssl_context=ssl_context)
+        self.http.route("POST", path, self.handle_update)
+
+    async def handle_update(self, request: Request) -> Response:
+        token = request.headers.get(SECRET_HEADER, "")
+        if not hmac.compare_digest(token.encode(), self.secret_token.encode()):
+            logger.warning("Rejected webhook request with an invalid secret token")
+            return Response(403, b"Forbidden")
+        try:
+            update = Update.de_json(json.loads(request.body), self.application.bot)
+        except (ValueError, TypeError, KeyError) as e:
+            logger.warning("Rejected malformed webhook update: %s", e)
+            return Response(400, b"Bad Request")
+        await self.application.update_queue.put(update)
+        return Response(200)
+
+    async def start(self) -> None:
+        await self.http.start()
+
+    async def stop(self) -> None:
+        await self.http.stop()
+
+async def serve_webhook(application: Application, url: str, secret_token: Optional[str] = None,
+                        listen: str = "127.0.0.1", port: int = 8443, cert: Optional[str] = None,
+                        key: Optional[str] = None, stop_event: Optional[asyncio.Event] = None) -> None:
+    """Run the application in webhook mode until SIGINT/SIGTERM or `stop_event` is set.
+
+    Mirrors the lifecycle of Application.run_polling, including post_init and
+    post_shutdown, but receives updates through WebhookServer.
+    """
+    # Telegram allows 1-256 characters from A-Z, a-z, 0-9, _ and -
+    secret_token = secret_token or secrets.token_urlsafe(32)
+    server = WebhookServer(application, urlsplit(url).path or "/", secret_token, listen, port, cert, key)
+    if stop_event is None:
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop_event.set)
+
+    await application.initialize()
+    try:
+        if application.post_init:
+            await application.post_init(application)
+        await server.start()
+        certificate = open(cert, "rb") if cert else None
+        try:
+            await application.bot.set_webhook(url, certificate=certificate, secret_token=secret_token,
+                                              allowed_updates=Update.ALL_TYPES)
+        finally:
+            if certificate:
+                certificate.close()
+        await application.start()
+        logger.info("Receiving updates via webhook at %s", url)
+        await stop_event.wait()
+    finally:
+        logger.info("Stopping webhook server")
+        await server.stop()
+        if application.running:
+            await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)